@@ -0,0 +1,192 @@
+# admission.py
+# Modul ini menyediakan admission control dan backpressure untuk tahapan yang mahal (render browser,
+# panggilan LLM, generasi gambar AI, dan render kartu hasil LLM). Setiap tahapan memiliki batas
+# konkurensi dan antrean tunggu berbatas; jika antrean sudah penuh, unggahan baru ditolak lebih awal
+# (HTTP 429) dengan perkiraan Retry-After dari kedalaman antrean dan latensi tahapan yang teramati.
+#
+# Catatan: batas berlaku per proses. Dengan beberapa worker gunicorn, batas efektif di host
+# adalah batas per tahapan dikali jumlah worker.
+
+import math # Untuk membulatkan Retry-After ke atas
+import time # Untuk mengukur lama slot dipakai
+import threading # Untuk semaphore dan lock penghitung
+from contextlib import contextmanager
+
+import metrics # Instrumentasi span dan ekspor Prometheus
+import log_setup # Logging terpusat non-blocking (antrean + JSON dengan ID pekerjaan)
+
+log_setup.configure_logging()
+
+# Nama tahapan yang dibatasi
+STAGE_BROWSER = "browser"
+STAGE_LLM = "llm"
+STAGE_IMAGE_GENERATION = "image_generation"
+STAGE_CARD = "card"
+# Bobot sampel terbaru pada rata-rata bergerak eksponensial (EWMA) latensi
+LATENCY_SMOOTHING = 0.3
+# Perkiraan latensi (detik) sebelum ada pengamatan, per tahapan
+DEFAULT_LATENCY_SECONDS = {STAGE_BROWSER: 10.0, STAGE_LLM: 8.0, STAGE_IMAGE_GENERATION: 15.0, STAGE_CARD: 2.0}
+# Batas bawah dan atas Retry-After (detik)
+MIN_RETRY_AFTER = 1
+MAX_RETRY_AFTER = 600
+
+REJECTED_TOTAL = metrics.REGISTRY.register(metrics.Counter(
+    f"{metrics.METRIC_PREFIX}_admission_rejected_total",
+    "Jumlah unggahan yang ditolak (429) berdasarkan penyebabnya.",
+    label_names=("reason",)
+))
+
+
+class ServerBusyError(Exception):
+    """Dimunculkan ketika unggahan baru harus ditolak karena antrean tahapan atau pekerjaan penuh."""
+
+    def __init__(self, message, retry_after, reason):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+def _clamp_retry_after(seconds):
+    return int(min(MAX_RETRY_AFTER, max(MIN_RETRY_AFTER, math.ceil(seconds))))
+
+
+class LatencyTracker:
+    """Rata-rata bergerak eksponensial dari durasi yang teramati, dengan nilai awal jika belum ada sampel."""
+
+    def __init__(self, initial_seconds):
+        self._value = None
+        self._initial = initial_seconds
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            if self._value is None:
+                self._value = seconds
+            else:
+                self._value = LATENCY_SMOOTHING * seconds + (1 - LATENCY_SMOOTHING) * self._value
+
+    @property
+    def seconds(self):
+        with self._lock:
+            return self._initial if self._value is None else self._value
+
+
+class StageLimiter:
+    """
+    Batas konkurensi satu tahapan dengan antrean tunggu berbatas.
+
+    Pekerjaan yang sudah diterima selalu menunggu slot (tidak pernah ditolak di tengah jalan);
+    batas antrean dipakai oleh AdmissionController untuk menolak unggahan baru lebih awal.
+    """
+
+    def __init__(self, name, max_concurrent, max_waiting):
+        """
+        Args:
+            name (str): Nama tahapan.
+            max_concurrent (int): Jumlah eksekusi bersamaan maksimum (minimal 1).
+            max_waiting (int): Jumlah eksekusi yang boleh menunggu slot sebelum unggahan baru ditolak.
+        """
+        self.name = name
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_waiting = max(0, max_waiting)
+        self.latency = LatencyTracker(DEFAULT_LATENCY_SECONDS.get(name, 5.0))
+        self._semaphore = threading.Semaphore(self.max_concurrent)
+        self._lock = threading.Lock()
+        self._active = 0
+        self._waiting = 0
+
+    @contextmanager
+    def slot(self):
+        """Menunggu slot tahapan ini, lalu menjalankan blok di dalamnya. Lama menunggu dicatat sebagai span."""
+        with self._lock:
+            self._waiting += 1
+        try:
+            with metrics.span(f"admission.{self.name}.wait"):
+                self._semaphore.acquire()
+        finally:
+            with self._lock:
+                self._waiting -= 1
+        with self._lock:
+            self._active += 1
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.latency.observe(time.perf_counter() - started)
+            with self._lock:
+                self._active -= 1
+            self._semaphore.release()
+
+    def wrap(self, func):
+        """Mengembalikan fungsi yang menjalankan `func` di dalam slot tahapan ini."""
+        def limited(*args, **kwargs):
+            with self.slot():
+                return func(*args, **kwargs)
+        return limited
+
+    def is_full(self):
+        """True jika antrean tunggu sudah mencapai batas (semua slot terpakai dan max_waiting menunggu)."""
+        with self._lock:
+            return self._active >= self.max_concurrent and self._waiting >= self.max_waiting
+
+    def retry_after(self):
+        """Perkiraan detik sampai antrean tahapan ini cukup longgar untuk satu pekerjaan baru."""
+        with self._lock:
+            backlog = self._waiting + self._active - self.max_concurrent + 1
+        return _clamp_retry_after(max(backlog, 1) / self.max_concurrent * self.latency.seconds)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "active": self._active,
+                "waiting": self._waiting,
+                "max_concurrent": self.max_concurrent,
+                "max_waiting": self.max_waiting,
+                "latency_seconds": round(self.latency.seconds, 3),
+            }
+
+
+class AdmissionController:
+    """Kumpulan StageLimiter per tahapan ditambah perkiraan antrean pekerjaan untuk Retry-After."""
+
+    def __init__(self, stage_limits, max_waiting, job_workers=1):
+        """
+        Args:
+            stage_limits (dict): Nama tahapan -> jumlah eksekusi bersamaan maksimum.
+            max_waiting (int): Batas antrean tunggu per tahapan.
+            job_workers (int): Jumlah worker job queue, untuk memperkirakan waktu tunggu antrean pekerjaan.
+        """
+        self.limiters = {name: StageLimiter(name, limit, max_waiting) for name, limit in stage_limits.items()}
+        self.job_workers = max(1, job_workers)
+        self.job_latency = LatencyTracker(sum(DEFAULT_LATENCY_SECONDS.values()))
+
+    def limiter(self, name):
+        return self.limiters[name]
+
+    def check(self, queue_depth=0, max_queued=None):
+        """
+        Memastikan unggahan baru dapat diterima.
+
+        Args:
+            queue_depth (int): Jumlah pekerjaan yang sedang mengantre di job queue.
+            max_queued (int, optional): Batas antrean job queue.
+
+        Raises:
+            ServerBusyError: Jika antrean salah satu tahapan atau antrean pekerjaan sudah penuh.
+        """
+        full_stages = [limiter for limiter in self.limiters.values() if limiter.is_full()]
+        if full_stages:
+            retry_after = max(limiter.retry_after() for limiter in full_stages)
+            names = ", ".join(limiter.name for limiter in full_stages)
+            REJECTED_TOTAL.inc(reason="stage")
+            raise ServerBusyError(f"Antrean tahapan penuh: {names}.", retry_after, "stage")
+        if max_queued is not None and queue_depth >= max_queued:
+            REJECTED_TOTAL.inc(reason="queue")
+            raise ServerBusyError(f"Antrean pekerjaan penuh ({queue_depth} pekerjaan mengantre).", self.queue_retry_after(queue_depth), "queue")
+
+    def queue_retry_after(self, queue_depth):
+        """Perkiraan detik sampai pekerjaan yang sedang mengantre habis diproses oleh worker job queue."""
+        return _clamp_retry_after((queue_depth + 1) / self.job_workers * self.job_latency.seconds)
+
+    def snapshot(self):
+        return {name: limiter.snapshot() for name, limiter in self.limiters.items()}
@@ -1,206 +1,263 @@
 # app.py
 # Modul utama aplikasi Flask yang mengorkestrasi seluruh alur konversi ePub ke gambar dan pemrosesan AI.
 
-from flask import Flask, render_template, request, send_from_directory, jsonify
+from flask import Flask, render_template, request, send_file, jsonify, Response
+from werkzeug.utils import safe_join # Untuk memastikan path gambar tetap berada di folder output
 import os # Untuk operasi sistem file seperti membuat direktori, menghapus file
 import logging # Untuk mencatat informasi, peringatan, dan error
-import shutil # Untuk operasi file tingkat tinggi, seperti menghapus direktori (shutil.rmtree)
-import random # Untuk memilih gambar fallback secara acak
-import re # Untuk operasi regex, digunakan dalam membersihkan prompt
 import time # Untuk mengukur waktu proses
-import openpyxl # Untuk membaca dan menulis file Excel (.xlsx)
-from openpyxl import Workbook, load_workbook # Import spesifik dari openpyxl
+import json # Untuk serialisasi data event SSE
+import importlib # Untuk preload dependensi berat (opsional)
+import hmac # Untuk membandingkan token admin tanpa kebocoran waktu
+import contextlib # Untuk sesi profiling opsional
 
 # Import modul-modul inti proyek yang telah dikembangkan
-import epub_processor # Modul untuk ekstraksi konten ePub dan chunking teks
 import image_renderer # Modul untuk rendering gambar (halaman ePub dan gambar hasil LLM)
-import llm_integrator # Modul untuk berinteraksi dengan Google Gemini API dan Hugging Face API
-
-from bs4 import BeautifulSoup # Digunakan untuk membersihkan teks HTML dari ePub sebelum dikirim ke LLM
-
-from PIL import Image # Digunakan oleh Pillow untuk membuat gambar default jika diperlukan
-
-# Import untuk ROUGE Score
-from rouge_score import rouge_scorer # <--- PASTIKAN INI ADA DI SINI
+import conversion # Alur konversi inti ePub yang dijalankan sebagai graf tahapan konkuren
+from job_queue import JobQueue, QueueFullError, STATUS_DONE, STATUS_FAILED # Antrean pekerjaan konversi asinkron
+from performance_log import PerformanceLogStore, STAGE_COLUMNS # Penyimpanan log kinerja append-only (SQLite)
+from rouge_evaluator import RougeEvaluator # Penilaian ROUGE batch di latar belakang
+import metrics # Instrumentasi span, histogram latensi, dan ekspor Prometheus
+from workspace import WorkspaceManager, default_scratch_root # Ruang kerja per pekerjaan dan eviction output
+from upload_spool import SpoolingRequest # Unggahan ditulis per chunk langsung ke file spool unik
+import image_delivery # Pengiriman gambar dengan URL ber-hash konten, cache immutable, dan X-Sendfile
+import profiling # Profiling opt-in per pekerjaan (cProfile + tracemalloc)
+import admission # Batas konkurensi per tahapan dan penolakan dini (429) saat antrean penuh
+from search_index import SearchIndex # Indeks teks penuh (SQLite FTS5) buku yang sudah diproses
+import prompt_compaction # Anggaran token default untuk konteks LLM
+import asset_optimizer # Cache gambar ePub yang sudah diperkecil
+import render_service # Render worker terpisah lewat broker tugas render (opsional)
+import log_setup # Logging terpusat non-blocking (antrean + JSON dengan ID pekerjaan)
 
 # Konfigurasi dasar logging untuk aplikasi
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+log_setup.configure_logging()
 
 # Inisialisasi aplikasi Flask
 app = Flask(__name__)
+# File unggahan di-spool langsung ke UPLOAD_FOLDER saat request di-parse (lihat upload_spool.py)
+app.request_class = SpoolingRequest
 
 # --- Konfigurasi Folder Aplikasi ---
 # Folder untuk menyimpan file ePub yang diunggah oleh pengguna
 UPLOAD_FOLDER = 'uploads'
 # Folder untuk menyimpan semua gambar yang dihasilkan (baik halaman ePub maupun gambar hasil AI)
 GENERATED_IMAGES_FOLDER = 'generated_images'
-# Nama file untuk log kinerja dalam format Excel
+# Nama file untuk log kinerja dalam format Excel (hanya dibuat saat diunduh)
 PERFORMANCE_LOG_FILE = 'performance_log.xlsx' 
+# Nama file database SQLite yang menjadi sumber utama log kinerja (append-only)
+PERFORMANCE_LOG_DB_FILE = 'performance_log.sqlite3'
+# Nama file database SQLite untuk job queue (disimpan di UPLOAD_FOLDER agar bertahan saat restart)
+JOB_QUEUE_DB_FILE = 'jobs.sqlite3'
+# Jumlah worker latar belakang dan batas jumlah pekerjaan yang boleh mengantre
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_QUEUE_MAX_SIZE = int(os.getenv("JOB_QUEUE_MAX_SIZE", "20"))
+# Batas konkurensi per tahapan mahal (per proses) dan panjang antrean tunggu setiap tahapan
+BROWSER_CONCURRENCY = int(os.getenv("BROWSER_CONCURRENCY", "2"))
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "4"))
+IMAGE_GENERATION_CONCURRENCY = int(os.getenv("IMAGE_GENERATION_CONCURRENCY", "2"))
+CARD_CONCURRENCY = int(os.getenv("CARD_CONCURRENCY", "2"))
+STAGE_QUEUE_MAX_SIZE = int(os.getenv("STAGE_QUEUE_MAX_SIZE", "4"))
+# Jumlah prompt maksimum per unggahan /upload/batch
+MAX_BATCH_PROMPTS = int(os.getenv("MAX_BATCH_PROMPTS", "10"))
+# Anggaran token (perkiraan lokal) untuk konteks buku di prompt Gemini, setelah boilerplate dibuang
+LLM_CONTEXT_TOKEN_BUDGET = int(os.getenv("LLM_CONTEXT_TOKEN_BUDGET", str(prompt_compaction.DEFAULT_CONTEXT_TOKEN_BUDGET)))
+# Indeks teks penuh buku yang sudah diproses (0 untuk menonaktifkan) dan nama file database-nya
+SEARCH_INDEX_ENABLED = os.getenv("SEARCH_INDEX", "1") != "0"
+SEARCH_INDEX_DB_FILE = 'search_index.sqlite3'
+# Jumlah baris maksimum per respons /performance-log
+PERFORMANCE_LOG_MAX_PAGE_SIZE = 500
+# Ukuran maksimum unggahan (MB); request yang lebih besar ditolak dengan 413 sebelum body dibaca
+MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", "200"))
+# Interval keep-alive (detik) untuk stream Server-Sent Events progres pekerjaan
+SSE_KEEPALIVE_SECONDS = 15
+# Umur maksimum satu koneksi SSE (detik); setelahnya stream ditutup dan EventSource tersambung ulang dengan Last-Event-ID
+SSE_MAX_STREAM_SECONDS = int(os.getenv("SSE_MAX_STREAM_SECONDS", "3600"))
+# Serahkan pengiriman file gambar ke web server: "" (dilayani Flask), "x-sendfile", atau "x-accel-redirect"
+IMAGE_SENDFILE_MODE = os.getenv("IMAGE_SENDFILE_MODE", "").strip().lower()
+# Lokasi internal nginx yang memetakan ke GENERATED_IMAGES_FOLDER (untuk mode x-accel-redirect)
+X_ACCEL_REDIRECT_PREFIX = os.getenv("X_ACCEL_REDIRECT_PREFIX", "/protected_generated_images/")
+# Batas total ukuran folder output (MB) dan umur maksimum sejak akses terakhir (jam); 0 berarti tanpa batas
+OUTPUT_QUOTA_MB = int(os.getenv("OUTPUT_QUOTA_MB", "2048"))
+OUTPUT_TTL_HOURS = float(os.getenv("OUTPUT_TTL_HOURS", "168"))
+# Umur maksimum pekerjaan selesai (beserta event-nya) di database antrean (jam); default sama dengan output
+JOB_TTL_HOURS = float(os.getenv("JOB_TTL_HOURS", str(OUTPUT_TTL_HOURS)))
+# Lokasi scratch untuk aset ePub yang diekstrak; default tmpfs (/dev/shm) jika tersedia
+WORKSPACE_SCRATCH_DIR = os.getenv("WORKSPACE_SCRATCH_DIR", "")
+# Render halaman teks sederhana dengan Pillow tanpa Chromium (0 untuk selalu memakai Playwright)
+FAST_TEXT_RENDERER = os.getenv("FAST_TEXT_RENDERER", "1") != "0"
+# Broker render worker terpisah (sqlite:///<path> atau file:///<folder>); kosong berarti Chromium berjalan
+# di proses web ini. Lihat render_service.py untuk menjalankan render worker.
+RENDER_BROKER_URL = os.getenv("RENDER_BROKER_URL", "")
+RENDER_TIMEOUT_SECONDS = float(os.getenv("RENDER_TIMEOUT_SECONDS", str(render_service.DEFAULT_RENDER_TIMEOUT)))
+# Perkecil gambar ePub yang jauh lebih lebar dari viewport sebelum dirender (0 untuk menonaktifkan),
+# dengan cache hasil downscale berdasarkan hash konten yang dibatasi ukurannya (MB)
+OPTIMIZE_EPUB_IMAGES = os.getenv("OPTIMIZE_EPUB_IMAGES", "1") != "0"
+IMAGE_CACHE_MAX_MB = int(os.getenv("IMAGE_CACHE_MAX_MB", "500"))
+IMAGE_CACHE_FOLDER = os.path.join(UPLOAD_FOLDER, 'image_cache')
+# Mulai generasi latar belakang AI bersamaan dengan panggilan Gemini (0 untuk menunggu respons LLM dulu)
+SPECULATIVE_BACKGROUND = os.getenv("SPECULATIVE_BACKGROUND", "1") != "0"
+# Token admin untuk endpoint /admin/* dan profiling paksa lewat header; kosong berarti fitur admin nonaktif
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+# Proporsi unggahan yang diprofil secara acak (0.0-1.0) dan jumlah profil yang disimpan
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_MAX_KEEP = int(os.getenv("PROFILE_MAX_KEEP", "50"))
+# Folder artefak profil per pekerjaan (di UPLOAD_FOLDER, tidak dilayani sebagai file publik)
+PROFILES_FOLDER = os.path.join(UPLOAD_FOLDER, 'profiles')
+if IMAGE_SENDFILE_MODE not in image_delivery.SENDFILE_MODES:
+    logging.warning(f"IMAGE_SENDFILE_MODE '{IMAGE_SENDFILE_MODE}' tidak dikenal. Gambar dilayani langsung oleh Flask.")
+    IMAGE_SENDFILE_MODE = image_delivery.SENDFILE_NONE
 
 # Mengatur konfigurasi Flask untuk folder-folder yang digunakan
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['GENERATED_IMAGES_FOLDER'] = GENERATED_IMAGES_FOLDER
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_MB * 1024 * 1024
 
 # Memastikan folder-folder yang dibutuhkan ada. Jika belum ada, akan dibuat secara otomatis.
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(GENERATED_IMAGES_FOLDER, exist_ok=True)
-# Sub-direktori untuk menyimpan aset ePub yang diekstrak sementara
-os.makedirs(os.path.join(UPLOAD_FOLDER, 'epub_extracts'), exist_ok=True)
 # Folder untuk menyimpan gambar latar belakang fallback yang sudah didesain
 os.makedirs(os.path.join(app.root_path, 'static', 'images', 'fallback_ai_bgs'), exist_ok=True)
 # Folder untuk menyimpan font kustom yang digunakan oleh Pillow
 os.makedirs(os.path.join(app.root_path, 'fonts'), exist_ok=True)
 
 
-# Inisialisasi konfigurasi Google Gemini API saat aplikasi Flask dimulai.
-# Kunci API (GOOGLE_API_KEY) harus diatur sebagai variabel lingkungan sebelum menjalankan aplikasi.
-try:
-    llm_integrator.configure_gemini()
-except ValueError as e:
-    # Jika kunci API tidak ditemukan, catat error. Fitur LLM tidak akan berfungsi.
-    logging.error(f"Gagal mengkonfigurasi Gemini API saat startup: {e}. Pastikan GOOGLE_API_KEY diatur di variabel lingkungan Anda.")
+# Penyimpanan log kinerja append-only. File Excel lama (jika ada) diimpor satu kali lalu diganti namanya.
+performance_log_store = PerformanceLogStore(os.path.join(UPLOAD_FOLDER, PERFORMANCE_LOG_DB_FILE))
+legacy_excel_log_path = os.path.join(UPLOAD_FOLDER, PERFORMANCE_LOG_FILE)
+if os.path.exists(legacy_excel_log_path) and performance_log_store.count() == 0:
+    try:
+        imported_rows = performance_log_store.import_xlsx(legacy_excel_log_path)
+        os.replace(legacy_excel_log_path, legacy_excel_log_path + '.migrated')
+        logging.info(f"{imported_rows} baris log kinerja diimpor dari '{legacy_excel_log_path}'.")
+    except Exception as e:
+        logging.error(f"Gagal mengimpor log kinerja Excel lama '{legacy_excel_log_path}': {e}", exc_info=True)
+
+# Render worker membaca aset ePub dari folder scratch (base_url) dan menulis gambar ke folder output lewat
+# path di tugas render. Scratch default (/dev/shm, mode 0700) hanya dapat dibaca proses di host ini,
+# sehingga dengan render worker terpisah folder scratch bersama wajib ditentukan secara eksplisit.
+if RENDER_BROKER_URL and not WORKSPACE_SCRATCH_DIR:
+    raise RuntimeError(
+        "RENDER_BROKER_URL memerlukan WORKSPACE_SCRATCH_DIR: folder scratch yang dapat diakses render worker "
+        "dengan path yang sama (misalnya NFS), bersama folder generated_images."
+    )
+
+# Ruang kerja per pekerjaan: scratch privat untuk aset ePub yang diekstrak (base_url Playwright)
+# dan folder output unik, dengan eviction latar belakang terhadap kuota dan TTL
+workspace_manager = WorkspaceManager(
+    GENERATED_IMAGES_FOLDER,
+    WORKSPACE_SCRATCH_DIR or default_scratch_root(os.path.join(UPLOAD_FOLDER, 'epub_extracts')),
+    quota_bytes=OUTPUT_QUOTA_MB * 1024 * 1024,
+    ttl_seconds=int(OUTPUT_TTL_HOURS * 3600)
+)
+logging.info(f"Folder scratch pekerjaan: '{workspace_manager.scratch_root}'.")
+
+# Admission control: tahapan mahal dibatasi per proses; unggahan baru ditolak (429) jika antreannya penuh
+admission_controller = admission.AdmissionController(
+    {
+        admission.STAGE_BROWSER: BROWSER_CONCURRENCY,
+        admission.STAGE_LLM: LLM_CONCURRENCY,
+        admission.STAGE_IMAGE_GENERATION: IMAGE_GENERATION_CONCURRENCY,
+        admission.STAGE_CARD: CARD_CONCURRENCY,
+    },
+    max_waiting=STAGE_QUEUE_MAX_SIZE,
+    job_workers=JOB_WORKERS
+)
+
+# Rendering Chromium dapat diserahkan ke render worker terpisah agar kapasitasnya diskalakan sendiri
+remote_renderer = None
+if RENDER_BROKER_URL:
+    try:
+        remote_renderer = render_service.RemoteRenderer(render_service.open_broker(RENDER_BROKER_URL), timeout=RENDER_TIMEOUT_SECONDS)
+        logging.info(f"Rendering Chromium diserahkan ke render worker lewat broker '{RENDER_BROKER_URL}'.")
+    except ValueError as e:
+        logging.warning(f"{e} Chromium dijalankan di proses web.")
 
+# Teks setiap buku yang berhasil diproses disimpan di indeks FTS5 agar dapat dicari tanpa ekstraksi ulang
+search_index = SearchIndex(os.path.join(UPLOAD_FOLDER, SEARCH_INDEX_DB_FILE))
 
-# --- Fungsi Bantu (Helper Functions) ---
+# ROUGE Score dihitung di luar jalur request oleh worker latar belakang, lalu ditulis kembali ke log kinerja
+rouge_evaluator = RougeEvaluator(performance_log_store)
 
-def extract_background_color_from_prompt(prompt):
-    """
-    Mengekstrak permintaan warna latar belakang dari prompt pengguna.
-    
-    Args:
-        prompt (str): Prompt asli yang diberikan oleh pengguna.
-        
-    Returns:
-        tuple: (modified_prompt, requested_color_rgb)
-               - modified_prompt (str): Prompt setelah permintaan warna dihapus.
-               - requested_color_rgb (tuple): Nilai RGB warna (tuple 3 int) jika ditemukan, None jika tidak.
-    """
-    # Peta warna dasar yang dikenali dari prompt ke nilai RGB
-    color_map = {
-        "merah": (255, 0, 0), "biru": (0, 0, 255), "hijau": (0, 128, 0),
-        "kuning": (255, 255, 0), "hitam": (0, 0, 0), "putih": (255, 255, 255),
-        "oranye": (255, 165, 0), "ungu": (128, 0, 128), "abu-abu": (128, 128, 128),
-        "coklat": (165, 42, 42),
-    }
-    
-    prompt_lower = prompt.lower() # Konversi prompt ke huruf kecil untuk pencarian
-    found_color = None # Inisialisasi warna yang ditemukan
-
-    # Iterasi melalui peta warna untuk mencari permintaan warna dalam prompt
-    for color_name, rgb_value in color_map.items():
-        if f"background berwarna {color_name}" in prompt_lower or \
-           f"latar belakang {color_name}" in prompt_lower or \
-           f"background {color_name}" in prompt_lower:
-            found_color = rgb_value
-            logging.info(f"Permintaan warna latar belakang terdeteksi: {color_name} -> {rgb_value}")
-            break # Hentikan pencarian setelah warna pertama ditemukan
-    
-    # Jika warna ditemukan, hapus frasa permintaan warna dari prompt asli
-    # Ini penting agar LLM tidak mencoba menginterpretasikan permintaan warna sebagai instruksi teks
-    if found_color:
-        for color_name in color_map.keys():
-            # Menggunakan regex untuk menghapus frasa permintaan warna (case-insensitive)
-            prompt = re.sub(r"background berwarna " + re.escape(color_name), "", prompt, flags=re.IGNORECASE).strip()
-            prompt = re.sub(r"latar belakang " + re.escape(color_name), "", prompt, flags=re.IGNORECASE).strip()
-            prompt = re.sub(r"background " + re.escape(color_name), "", prompt, flags=re.IGNORECASE).strip()
-        prompt = re.sub(r'\s+', ' ', prompt).strip() # Hapus spasi ganda yang mungkin muncul setelah penghapusan
-    
-    return prompt, found_color
 
-def hitung_rouge_score(reference_text, generated_text):
+# Gemini API dikonfigurasi secara lazy pada panggilan pertama (lihat llm_integrator.get_gemini_response),
+# sehingga impor aplikasi tidak memuat SDK Gemini/gRPC. Di sini hanya diperiksa keberadaan kuncinya.
+# Kunci API (GOOGLE_API_KEY) harus diatur sebagai variabel lingkungan sebelum menjalankan aplikasi.
+if not os.getenv("GOOGLE_API_KEY"):
+    logging.error("GOOGLE_API_KEY tidak diatur. Fitur LLM tidak akan berfungsi sampai variabel lingkungan ini diatur.")
+
+# Dependensi berat yang diimpor secara lazy oleh modul-modul aplikasi
+HEAVY_MODULES = [
+    "google.generativeai", "requests", "playwright.sync_api", "bs4", "ebooklib.epub",
+    "arabic_reshaper", "bidi.algorithm", "rouge_score.rouge_scorer", "openpyxl",
+]
+
+def preload_heavy_dependencies():
     """
-    Menghitung ROUGE-1 F1 Score antara teks referensi dan teks yang dihasilkan.
-    
-    Catatan: Dalam implementasi saat ini, 'reference_text' adalah prompt LLM.
-    Untuk evaluasi ROUGE yang akurat, 'reference_text' seharusnya adalah ringkasan/terjemahan
-    yang dibuat oleh manusia (human-written reference).
+    Mengimpor semua dependensi berat sekaligus. Dipakai saat aplikasi di-preload di proses master
+    gunicorn (PRELOAD_HEAVY_MODULES=1), sehingga modul-modul tersebut dimuat sekali dan dibagi
+    ke worker hasil fork melalui copy-on-write.
     """
-    if not reference_text or not generated_text:
-        return 0.0 # Mengembalikan 0 jika salah satu teks kosong
-    scorer = rouge_scorer.RougeScorer(['rouge1'], use_stemmer=True)
-    score = scorer.score(reference_text, generated_text)
-    rouge1_f1 = score['rouge1'].fmeasure
-    return round(rouge1_f1, 4) # Bulatkan ke 4 angka di belakang koma
+    for module_name in HEAVY_MODULES:
+        try:
+            importlib.import_module(module_name)
+        except ImportError as e:
+            logging.warning(f"Gagal melakukan preload modul '{module_name}': {e}")
+
+if os.getenv("PRELOAD_HEAVY_MODULES") == "1":
+    preload_heavy_dependencies()
 
-def log_performance_data(timestamp, epub_filename, llm_prompt, llm_response_text, rouge_score, total_duration, num_epub_pages, num_chunks, status_message):
+
+# --- Fungsi Bantu (Helper Functions) ---
+
+def log_performance_data(timestamp, epub_filename, llm_prompt, llm_response_text, total_duration, num_epub_pages, num_chunks, status_message, stage_timings=None, reference_text=None, prompt_compaction_stats=None):
     """
-    Mencatat data kinerja setiap proses konversi ke file Excel.
+    Mencatat data kinerja setiap proses konversi ke penyimpanan log append-only.
+    Jika ada respons LLM yang valid, baris dijadwalkan untuk dinilai ROUGE oleh worker latar belakang.
     
     Args:
         timestamp (str): Waktu proses dicatat.
         epub_filename (str): Nama file ePub yang diproses.
         llm_prompt (str): Prompt LLM asli yang diberikan pengguna.
-        llm_response_text (str): Respons teks parsial dari LLM.
-        rouge_score (float): ROUGE-1 F1 Score.
+        llm_response_text (str): Respons teks lengkap dari LLM.
         total_duration (float): Total durasi proses dalam detik.
         num_epub_pages (int): Jumlah halaman ePub yang diekstrak.
         num_chunks (int): Jumlah chunk teks yang dihasilkan.
         status_message (str): Pesan status akhir proses.
+        stage_timings (dict, optional): Durasi per tahapan (detik), berdasarkan nama tahapan.
+        reference_text (str, optional): Teks referensi manusia untuk evaluasi ROUGE.
+        prompt_compaction_stats (dict, optional): Statistik pemadatan konteks LLM ('context_tokens' dan 'tokens_saved').
     """
-    excel_path = os.path.join(app.config['UPLOAD_FOLDER'], PERFORMANCE_LOG_FILE)
-
-    if os.path.exists(excel_path):
-        workbook = load_workbook(excel_path) # Muat workbook yang sudah ada
-        sheet = workbook.active # Ambil sheet aktif
-    else:
-        workbook = Workbook() # Buat workbook baru jika belum ada
-        sheet = workbook.active
-        # Tambahkan header jika workbook baru dibuat
-        sheet.append(["Timestamp", "ePub Filename", "LLM Prompt", "LLM Response (Partial)", "ROUGE-1 F1 Score", "Total Duration (s)", "Num ePub Pages", "Num Chunks", "Status Message"])
-
-    # Tambahkan baris data baru
-    sheet.append([
-        timestamp,
-        epub_filename,
-        llm_prompt,
-        llm_response_text[:100] + "..." if llm_response_text and len(llm_response_text) > 100 else llm_response_text,
-        rouge_score,
-        total_duration,
-        num_epub_pages,
-        num_chunks,
-        status_message
-    ])
-    
+    prompt_compaction_stats = prompt_compaction_stats or {}
+    # Beberapa tahapan dapat dicatat pada kolom yang sama (misalnya page_text dan text_chunks); durasinya dijumlahkan
+    stage_values = {}
+    for stage, duration in (stage_timings or {}).items():
+        if stage in STAGE_COLUMNS:
+            column = STAGE_COLUMNS[stage]
+            stage_values[column] = round(stage_values.get(column, 0.0) + duration, 3)
+    # Hanya respons LLM yang sebenarnya yang dinilai; tanpa prompt atau respons, skornya 0.0 seperti sebelumnya
+    scorable = bool(llm_prompt) and conversion.is_valid_llm_response(llm_response_text) and llm_response_text not in ("N/A", conversion.NO_AI_RESPONSE)
     try:
-        workbook.save(excel_path) # Simpan perubahan ke file Excel
-        logging.info(f"Data kinerja dicatat ke: {excel_path}")
+        row_id = performance_log_store.append(
+            **stage_values,
+            timestamp=timestamp,
+            epub_filename=epub_filename,
+            llm_prompt=llm_prompt,
+            llm_response_partial=llm_response_text[:100] + "..." if llm_response_text and len(llm_response_text) > 100 else llm_response_text,
+            rouge1_f1=None if scorable else 0.0, # Diisi oleh rouge_evaluator
+            llm_response=llm_response_text if scorable else None,
+            reference_text=reference_text or None,
+            total_duration=total_duration,
+            num_epub_pages=num_epub_pages,
+            num_chunks=num_chunks,
+            context_tokens=prompt_compaction_stats.get("context_tokens"),
+            tokens_saved=prompt_compaction_stats.get("tokens_saved"),
+            status_message=status_message
+        )
+        logging.info(f"Data kinerja dicatat ke: {performance_log_store.db_path}")
+        if scorable:
+            rouge_evaluator.enqueue(row_id)
     except Exception as e:
-        # Tangani error jika file Excel terkunci atau ada masalah izin
-        logging.error(f"Gagal menyimpan log kinerja ke '{excel_path}': {e}", exc_info=True)
-        logging.error("PENTING: Pastikan file Excel tidak sedang terbuka di program lain!")
-
-def read_performance_log():
-    """
-    Membaca semua data log kinerja dari file Excel dan mengembalikannya sebagai list of dicts.
-    """
-    data = []
-    excel_path = os.path.join(app.config['UPLOAD_FOLDER'], PERFORMANCE_LOG_FILE)
-    logging.info(f"Mencoba membaca log kinerja dari: {excel_path}")
-
-    if os.path.exists(excel_path):
-        try:
-            workbook = openpyxl.load_workbook(excel_path)
-            sheet = workbook.active
-            headers = [cell.value for cell in sheet[1]] # Ambil header dari baris pertama
-            
-            # Pastikan ada baris data selain header
-            if sheet.max_row > 1:
-                for row_idx, row in enumerate(sheet.iter_rows(min_row=2, values_only=True)): 
-                    # Buat dictionary untuk setiap baris data
-                    data.append(dict(zip(headers, row)))
-                logging.info(f"Berhasil membaca {len(data)} baris dari log kinerja.")
-            else:
-                logging.info("File log kinerja ada, tetapi tidak ada data selain header.")
-            
-        except Exception as e:
-            # Tangani error jika file Excel rusak atau terkunci saat dibaca
-            logging.error(f"Gagal membaca log kinerja dari '{excel_path}': {e}", exc_info=True)
-            logging.warning("Pastikan file Excel tidak rusak atau tidak sedang terbuka.")
-            data = [] # Kosongkan data jika ada error saat membaca
-    else:
-        logging.info("File log kinerja tidak ditemukan, mengembalikan log kosong.")
-    return data
-
+        logging.error(f"Gagal mencatat log kinerja ke '{performance_log_store.db_path}': {e}", exc_info=True)
 
 # --- Rute Aplikasi Flask ---
 
@@ -208,189 +265,139 @@ def read_performance_log():
 def index():
     """
     Rute utama untuk menampilkan halaman indeks aplikasi.
-    Membaca log kinerja saat halaman dimuat untuk ditampilkan di UI.
+    Log kinerja tidak disematkan di halaman; frontend mengambilnya secara bertahap dari /performance-log.
     """
-    performance_logs = read_performance_log() # Baca log untuk ditampilkan saat halaman dimuat
-    return render_template('index.html', performance_logs=performance_logs)
+    return render_template('index.html')
 
-@app.route('/upload', methods=['POST'])
-def upload_file():
+def generated_image_url(full_path):
     """
-    Menangani unggahan file ePub, memprosesnya, dan mengembalikan hasil ke frontend.
-    Ini adalah alur kerja inti aplikasi.
+    Mengubah path gambar lokal di dalam GENERATED_IMAGES_FOLDER menjadi URL yang bisa diakses web.
+    URL memuat hash konten file, sehingga dapat di-cache browser tanpa batas waktu.
     """
-    start_time = time.time() # Mulai hitung waktu proses end-to-end
-    
-    # Validasi dasar file yang diunggah
-    if 'epub_file' not in request.files:
-        logging.error("Tidak ada bagian file dalam permintaan.")
-        return jsonify({"error": "Tidak ada file yang diunggah."}), 400
-    
-    file = request.files['epub_file']
-    llm_prompt = request.form.get('llm_prompt', '').strip() 
-    
-    # Ambil nilai checkbox untuk menentukan apakah halaman ePub asli harus dirender
-    render_epub_pages = request.form.get('render_epub_pages') == 'true' 
-    
-    if file.filename == '':
-        logging.warning("Tidak ada file yang dipilih oleh pengguna.")
-        return jsonify({"error": "Tidak ada file yang dipilih."}), 400
-    
-    if file and file.filename.lower().endswith('.epub'):
-        original_filename = file.filename
-        clean_filename_prefix = image_renderer.clean_filename(os.path.splitext(original_filename)[0])
-        
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], original_filename)
-        
-        # Buat subfolder unik untuk setiap sesi unggahan di generated_images
-        unique_output_subfolder_name = clean_filename_prefix + '_' + str(os.getpid()) + '_' + os.urandom(4).hex() 
-        unique_output_full_path = os.path.join(app.config['GENERATED_IMAGES_FOLDER'], unique_output_subfolder_name)
-        
-        # Direktori sementara untuk ekstraksi aset ePub (untuk base_url Playwright)
-        epub_extract_temp_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'epub_extracts', clean_filename_prefix + '_' + str(os.getpid()))
-
-        # Inisialisasi variabel-variabel untuk hasil dan logging (PENTING: Semua inisialisasi di sini)
-        llm_response_text = "N/A" # Default value
-        llm_response_image_url = None 
-        image_urls = [] # URL gambar halaman ePub asli
-        rouge_score = 0.0 # ROUGE score awal
-        num_epub_pages_extracted = 0 # Jumlah halaman ePub yang diekstrak
-        num_chunks_generated = 0 # Jumlah chunk yang dihasilkan
-        llm_prompt_original = llm_prompt # Simpan prompt asli untuk logging
-        requested_bg_color_rgb = None # Warna latar belakang yang diminta untuk gambar LLM
-        generated_ai_background_path = None # Path gambar latar belakang AI yang digenerate/fallback
-        
-        status_message = "Processing successful" # Pesan status default untuk log
-
-        # Daftar path ke gambar latar belakang fallback yang sudah didesain
-        fallback_bg_dir = os.path.join(app.root_path, 'static', 'images', 'fallback_ai_bgs')
-        fallback_bg_images = [os.path.join(fallback_bg_dir, f) for f in os.listdir(fallback_bg_dir) if f.lower().endswith(('.png', '.jpg', '.jpeg', '.gif'))]
+    subfolder_name = os.path.basename(os.path.dirname(full_path))
+    return f"/generated_images/{subfolder_name}/{image_delivery.content_hash(full_path)}/{os.path.basename(full_path)}"
 
+def process_conversion_job(job_id, params, report):
+    """
+    Handler job queue: menjalankan konversi satu file ePub yang sudah diunggah di worker latar belakang.
 
-        try:
-            # Simpan file ePub yang diunggah
-            file.save(filepath)
-            logging.info(f"File '{original_filename}' berhasil diunggah ke '{filepath}'")
-            # Buat folder output unik dan folder ekstraksi sementara
-            os.makedirs(unique_output_full_path, exist_ok=True) 
-            os.makedirs(epub_extract_temp_dir, exist_ok=True) 
-
-            # --- Ekstraksi Konten ePub (HTML, CSS, Gambar Internal) ---
-            logging.info(f"Mulai mengekstrak konten dari '{filepath}' ke '{epub_extract_temp_dir}'...")
-            html_contents, extracted_asset_paths = epub_processor.extract_epub_content(filepath, epub_extract_temp_dir)
-            num_epub_pages_extracted = len(html_contents) # Catat jumlah halaman HTML yang diekstrak
-            if not html_contents:
-                logging.warning(f"Tidak ada konten HTML yang diekstrak dari '{original_filename}'.")
-                raise ValueError("Tidak ada konten yang dapat diekstrak dari ePub ini.")
-
-            # --- Rendering Gambar Konten ePub Asli (Menggunakan Playwright) ---
-            if render_epub_pages: 
-                logging.info(f"Mulai merender {num_epub_pages_extracted} bagian HTML menjadi gambar menggunakan Playwright...")
-                generated_full_paths = image_renderer.render_html_to_images(
-                    html_contents, 
-                    unique_output_full_path,
-                    clean_filename_prefix,
-                    base_url=f"file:///{epub_extract_temp_dir.replace(os.sep, '/')}/" # base_url untuk Playwright
-                )
-                
-                # Konversi path gambar lokal menjadi URL yang bisa diakses web
-                for full_path in generated_full_paths:
-                    image_filename_only = os.path.basename(full_path)
-                    subfolder_and_filename = os.path.join(os.path.basename(unique_output_full_path), image_filename_only).replace("\\", "/")
-                    image_urls.append(f"/generated_images/{subfolder_and_filename}")
-            else:
-                logging.info("Rendering gambar halaman ePub asli dilewati sesuai permintaan pengguna.")
-                image_urls = [] # Pastikan list URL gambar kosong jika rendering dilewati
-
-            # --- Pemrosesan LLM dan Generasi Gambar AI ---
-            if llm_prompt: 
-                # Ekstrak permintaan warna latar belakang dari prompt asli pengguna
-                llm_prompt_cleaned_for_llm, requested_bg_color_rgb = extract_background_color_from_prompt(llm_prompt_original)
-
-                logging.info(f"Mulai memproses prompt LLM: '{llm_prompt_cleaned_for_llm}'")
-                
-                full_epub_text = " ".join([BeautifulSoup(html, 'html.parser').get_text(separator=' ', strip=True) for html in html_contents])
-                
-                # --- Implementasi Chunking ---
-                chunks = epub_processor.split_text_into_chunks(full_epub_text, max_len=1500) 
-                num_chunks_generated = len(chunks) 
-                logging.info(f"Teks ePub dipecah menjadi {num_chunks_generated} chunk.")
-
-                # --- Pemilihan Konteks untuk LLM (RAG Dasar) ---
-                num_chunks_for_context = min(5, len(chunks)) 
-                context_for_llm = "\n\n".join(chunks[:num_chunks_for_context])
-                logging.info(f"Menggunakan {num_chunks_for_context} chunk sebagai konteks untuk LLM.")
-                
-                final_llm_prompt = f"Teks dari buku ePub (bagian awal) adalah:\n\n---\n{context_for_llm}\n---\n\nBerdasarkan teks di atas, {llm_prompt_cleaned_for_llm}\n\nJANGAN sertakan format HTML, Markdown, atau styling apapun dalam respons Anda. Hanya berikan teks murni."
-                
-                llm_response_text = llm_integrator.get_gemini_response(final_llm_prompt) 
-                logging.info(f"Respons LLM diterima: {llm_response_text[:100]}...")
-
-                # --- Hitung ROUGE Score ---
-                rouge_score = hitung_rouge_score(llm_prompt_cleaned_for_llm, llm_response_text)
-                logging.info(f"ROUGE-1 F1 Score (Prompt vs Response): {rouge_score}")
-
-
-                # --- GENERASI GAMBAR AI (LATAR BELAKANG) atau FALLBACK ---
-                if not requested_bg_color_rgb: # Hanya coba generate AI jika tidak ada warna spesifik yang diminta
-                    image_gen_prompt = f"Minimalist abstract background, simple elegant shapes, soft warm colors, digital art. Related to the theme of: '{llm_response_text[:200].replace('\n', ' ')}' --v 5.2 --style raw" 
-                    
-                    ai_image_output_filename = f"{clean_filename_prefix}_ai_bg.png"
-                    ai_image_full_path = os.path.join(unique_output_full_path, ai_image_output_filename)
-
-                    logging.info(f"Mulai generasi gambar AI untuk latar belakang: '{image_gen_prompt[:100]}...'")
-                    generated_ai_background_path = llm_integrator.generate_image_from_text(
-                        image_gen_prompt, ai_image_full_path
-                    )
-                    
-                    if not generated_ai_background_path:
-                        logging.warning("Gagal generate gambar AI. Mencoba menggunakan gambar latar belakang fallback yang sudah didesain.")
-                        if fallback_bg_images: # <--- Penggunaan fallback_bg_images
-                            generated_ai_background_path = random.choice(fallback_bg_images)
-                            logging.info(f"Menggunakan gambar fallback: {os.path.basename(generated_ai_background_path)}")
-                        else:
-                            logging.warning("Tidak ada gambar latar belakang fallback yang ditemukan. Membuat gambar default polos.")
-                            temp_default_bg_path = os.path.join(unique_output_full_path, "default_plain_bg.png")
-                            Image.new('RGB', (800, 400), (240, 240, 240)).save(temp_default_bg_path) 
-                            generated_ai_background_path = temp_default_bg_path
-                else:
-                    logging.info(f"Warna latar belakang spesifik diminta ({requested_bg_color_rgb}). Melewatkan generasi gambar AI.")
-
-
-                # --- Render Respons LLM ke Gambar yang Didesain dengan Pillow ---
-                if llm_response_text and llm_response_text != "Tidak ada respons yang dihasilkan dari model.":
-                    llm_image_filename = f"{clean_filename_prefix}_llm_result.png"
-                    llm_image_full_path = os.path.join(unique_output_full_path, llm_image_filename)
-                    
-                    logging.info(f"Merender respons LLM ke gambar yang didesain: '{llm_image_filename}'")
-                    
-                    font_for_pillow_render = os.path.join(app.root_path, 'fonts', 'NotoSansArabic-Regular.ttf')
-
-                    rendered_llm_image_path = image_renderer.render_llm_text_to_designed_image(
-                        llm_response_text, 
-                        llm_image_full_path, 
-                        font_path=font_for_pillow_render,
-                        ai_background_path=generated_ai_background_path, 
-                        requested_bg_color=requested_bg_color_rgb 
-                    )
-
-                    if rendered_llm_image_path:
-                        llm_response_image_url = f"/generated_images/{os.path.basename(unique_output_full_path)}/{os.path.basename(rendered_llm_image_path)}".replace("\\", "/")
-                        logging.info(f"Respons LLM berhasil dirender ke gambar: {llm_response_image_url}")
-                    else:
-                        logging.error("Gagal merender gambar hasil LLM dengan Pillow.")
-                        llm_response_image_url = None
-                else:
-                    logging.warning("Respons LLM kosong atau tidak valid, tidak merender gambar hasil LLM.")
-                    llm_response_text = "Tidak ada respons dari AI." 
+    Args:
+        job_id (str): ID pekerjaan di job queue.
+        params (dict): Parameter pekerjaan yang disimpan oleh rute /upload.
+        report (callable): Fungsi untuk melaporkan progres dan hasil parsial ke job queue.
 
-            # --- Pembersihan File Sementara ---
-            os.remove(filepath) 
-            logging.info(f"File ePub '{original_filename}' dihapus dari folder unggahan.")
-            
-            if os.path.exists(epub_extract_temp_dir):
-                shutil.rmtree(epub_extract_temp_dir) 
-                logging.info(f"Folder ekstraksi sementara '{epub_extract_temp_dir}' dihapus.")
+    Returns:
+        dict: Hasil akhir yang dikembalikan ke frontend melalui /jobs/<job_id>.
+    """
+    start_time = time.time() # Mulai hitung waktu proses end-to-end
+
+    filepath = params["epub_path"]
+    original_filename = params["original_filename"]
+    clean_filename_prefix = params["clean_filename_prefix"]
+    llm_prompt_original = params["llm_prompt"] # Simpan prompt asli untuk logging
+    llm_prompts = params.get("llm_prompts") # Daftar prompt dari /upload/batch (menggantikan llm_prompt)
+    # Pekerjaan multi-prompt dicatat sebagai satu baris log dengan semua prompt bernomor
+    logged_prompt = "\n".join(f"{index}. {prompt}" for index, prompt in enumerate(llm_prompts, start=1)) if llm_prompts else llm_prompt_original
+    render_epub_pages = params["render_epub_pages"]
+
+    # Ruang kerja unik untuk pekerjaan ini: subfolder output di generated_images dan
+    # folder scratch privat untuk ekstraksi aset ePub (untuk base_url Playwright)
+    workspace = workspace_manager.allocate(params["output_subfolder"])
+    unique_output_full_path = workspace.output_dir
+    epub_extract_temp_dir = workspace.scratch_dir
+    keep_output = False # Output hanya disimpan jika pekerjaan berhasil
+
+    # Inisialisasi variabel-variabel untuk hasil dan logging (PENTING: Semua inisialisasi di sini)
+    llm_response_text = "N/A" # Default value
+    llm_response_image_url = None 
+    image_urls = [] # URL gambar halaman ePub asli
+    num_epub_pages_extracted = 0 # Jumlah halaman ePub yang diekstrak
+    num_chunks_generated = 0 # Jumlah chunk yang dihasilkan
+    prompt_compaction_stats = None # Token konteks LLM dan token boilerplate yang dihemat
+    status_message = "Processing successful" # Pesan status default untuk log
+
+    # Daftar path ke gambar latar belakang fallback yang sudah didesain
+    fallback_bg_dir = os.path.join(app.root_path, 'static', 'images', 'fallback_ai_bgs')
+    fallback_bg_images = [os.path.join(fallback_bg_dir, f) for f in os.listdir(fallback_bg_dir) if f.lower().endswith(('.png', '.jpg', '.jpeg', '.gif'))]
+
+    def on_stage_progress(stage_name, stage_result, completed_count, total_count):
+        # Laporkan progres dan hasil parsial yang sudah bisa ditampilkan di frontend
+        progress = {"stage": stage_name, "completed_stages": completed_count, "total_stages": total_count}
+        if stage_name == 'llm':
+            report(progress, llm_response_text=stage_result)
+        elif stage_name == 'llm_card' and stage_result:
+            report(progress, llm_image_url=generated_image_url(stage_result))
+        elif stage_name == 'llm_batch':
+            report(progress, llm_results=[{"prompt": prompt, "response_text": answer} for prompt, answer in zip(llm_prompts, stage_result)])
+        else:
+            report(progress)
+
+    def on_page_rendered(page_number, image_path):
+        # Kirim event per halaman agar frontend bisa menampilkan thumbnail segera setelah ditulis
+        job_queue.publish(job_id, 'page', {"page": page_number, "url": generated_image_url(image_path)})
+
+    # Profiling opt-in: cProfile di semua thread pekerjaan ini dan snapshot tracemalloc
+    profile_session = contextlib.nullcontext()
+    if params.get("profile"):
+        profiling.prune_profiles(PROFILES_FOLDER, PROFILE_MAX_KEEP - 1)
+        profile_session = profiling.ProfileSession(os.path.join(PROFILES_FOLDER, job_id), label=original_filename, reason=params["profile"])
+
+    if OPTIMIZE_EPUB_IMAGES and render_epub_pages:
+        asset_optimizer.prune_cache(IMAGE_CACHE_FOLDER, IMAGE_CACHE_MAX_MB * 1024 * 1024)
+
+    # Kumpulkan durasi semua span (tahapan dan fungsi) pekerjaan ini, termasuk jika gagal
+    with profile_session, metrics.SpanCollector() as span_collector:
+        try:
+            # Buat folder output unik dan folder scratch untuk ekstraksi
+            workspace.create()
+
+            # --- Jalankan graf tahapan konversi (ekstraksi, rendering, LLM, gambar AI) secara konkuren ---
+            conversion_result = conversion.convert_epub(
+                filepath,
+                unique_output_full_path,
+                epub_extract_temp_dir,
+                clean_filename_prefix,
+                llm_prompt=llm_prompt_original,
+                render_epub_pages=render_epub_pages,
+                font_path=os.path.join(app.root_path, 'fonts', 'NotoSansArabic-Regular.ttf'),
+                fallback_bg_images=fallback_bg_images,
+                progress_callback=on_stage_progress,
+                page_callback=on_page_rendered,
+                renderer=remote_renderer.render_html_to_images if remote_renderer else None,
+                fast_text_renderer=FAST_TEXT_RENDERER,
+                page_range=params.get("page_range"),
+                render_preset=params.get("render_preset"),
+                admission_controller=admission_controller,
+                llm_prompts=llm_prompts,
+                pack_prompts=params.get("pack_prompts", False),
+                collect_page_text=SEARCH_INDEX_ENABLED,
+                context_token_budget=LLM_CONTEXT_TOKEN_BUDGET,
+                optimize_images=OPTIMIZE_EPUB_IMAGES,
+                image_cache_dir=IMAGE_CACHE_FOLDER,
+                speculative_background=SPECULATIVE_BACKGROUND,
+                book_title=os.path.splitext(original_filename)[0]
+            )
+            llm_response_text = conversion_result["llm_response_text"]
+            num_epub_pages_extracted = conversion_result["num_epub_pages"]
+            num_chunks_generated = conversion_result["num_chunks"]
+            prompt_compaction_stats = conversion_result.get("prompt_compaction")
+            if prompt_compaction_stats:
+                metrics.LLM_CONTEXT_TOKENS_TOTAL.inc(prompt_compaction_stats["context_tokens"], kind="sent")
+                metrics.LLM_CONTEXT_TOKENS_TOTAL.inc(prompt_compaction_stats["tokens_saved"], kind="saved")
+            if conversion_result.get("speculative_background"):
+                metrics.SPECULATIVE_BACKGROUND_TOTAL.inc(outcome=conversion_result["speculative_background"]["outcome"])
+
+            # Konversi path gambar lokal menjadi URL yang bisa diakses web
+            image_urls = [generated_image_url(full_path) for full_path in conversion_result["image_paths"]]
+            if conversion_result["llm_image_path"]:
+                llm_response_image_url = generated_image_url(conversion_result["llm_image_path"])
+                logging.info(f"Respons LLM berhasil dirender ke gambar: {llm_response_image_url}")
+
+            if SEARCH_INDEX_ENABLED:
+                index_book_text(job_id, original_filename, workspace.name, conversion_result)
+
+            metrics.JOBS_TOTAL.inc(status=STATUS_DONE)
+            keep_output = True
 
             # Perbarui pesan sukses yang akan ditampilkan di frontend
             final_message = f"Berhasil mengkonversi '{original_filename}'. "
@@ -401,116 +408,549 @@ def upload_file():
             else: 
                 final_message += "Rendering gambar konten ePub dilewati."
 
-            # Catat data kinerja ke file Excel
-            end_time = time.time()
-            total_duration = round(end_time - start_time, 2)
-            log_performance_data(
-                time.strftime("%Y-%m-%d %H:%M:%S"),
-                original_filename,
-                llm_prompt_original, 
-                llm_response_text,
-                rouge_score,
-                total_duration,
-                num_epub_pages_extracted,
-                num_chunks_generated,
-                status_message
-            )
-
-            # Baca ulang log kinerja setelah dicatat untuk dikirim ke frontend
-            updated_performance_logs = read_performance_log()
-
-
-            return jsonify({
+            job_result = {
                 "message": final_message, 
                 "image_urls": image_urls,
                 "llm_response_text": llm_response_text,
                 "llm_image_url": llm_response_image_url, 
-                "performance_log": updated_performance_logs 
-            }), 200
+                "archive_url": f"/generated_images/{workspace.name}/archive" if image_urls else None,
+                "stage_timings": conversion_result["stage_timings"],
+                "span_timings": span_collector.durations,
+                "prompt_compaction": prompt_compaction_stats
+            }
+            if "llm_results" in conversion_result:
+                job_result["llm_results"] = [
+                    {
+                        "prompt": item["prompt"],
+                        "response_text": item["response_text"],
+                        "image_url": generated_image_url(item["image_path"]) if item["image_path"] else None,
+                    }
+                    for item in conversion_result["llm_results"]
+                ]
+            return job_result
 
         except Exception as e:
             logging.error(f"Error saat memproses file '{original_filename}': {e}", exc_info=True)
             status_message = f"Failed: {str(e)}"
-            
-            end_time = time.time()
-            total_duration = round(end_time - start_time, 2)
-            # Pastikan semua variabel yang digunakan dalam log_performance_data terdefinisi
+            metrics.JOBS_TOTAL.inc(status=STATUS_FAILED)
+            raise Exception(f"Gagal memproses file: {str(e)}. Cek log server untuk detail.")
+
+        finally:
+            # Catat data kinerja ke penyimpanan log (baik sukses maupun gagal)
+            total_duration = round(time.time() - start_time, 2)
+            admission_controller.job_latency.observe(total_duration)
             log_performance_data(
                 time.strftime("%Y-%m-%d %H:%M:%S"),
                 original_filename,
-                llm_prompt_original if 'llm_prompt_original' in locals() else "N/A", # Menggunakan prompt asli jika tersedia
-                llm_response_text if 'llm_response_text' in locals() else "Error during processing", # Menggunakan respons LLM jika tersedia
-                rouge_score if 'rouge_score' in locals() else 0.0, # Menggunakan ROUGE score jika tersedia
+                logged_prompt, 
+                llm_response_text,
                 total_duration,
-                num_epub_pages_extracted if 'num_epub_pages_extracted' in locals() else 0, 
-                num_chunks_generated if 'num_chunks_generated' in locals() else 0, 
-                status_message
+                num_epub_pages_extracted,
+                num_chunks_generated,
+                status_message,
+                stage_timings={name[len("stage."):]: duration for name, duration in span_collector.durations.items() if name.startswith("stage.")},
+                reference_text=params.get("reference_text"),
+                prompt_compaction_stats=prompt_compaction_stats
             )
-            # Baca ulang log kinerja setelah dicatat error untuk dikirim ke frontend
-            updated_performance_logs = read_performance_log()
 
-            # Pembersihan file dan folder yang mungkin tersisa jika terjadi error
+            # --- Pembersihan File Sementara ---
+            if os.path.exists(filepath):
+                os.remove(filepath) 
+                logging.info(f"File ePub '{original_filename}' dihapus dari folder unggahan.")
+            # Hapus folder scratch; output parsial juga dihapus jika terjadi error
+            workspace_manager.finish(workspace, keep_output=keep_output)
+
+
+def index_book_text(job_id, original_filename, output_subfolder, conversion_result):
+    """
+    Menyimpan teks per halaman hasil konversi ke indeks pencarian, beserta nama file gambar halaman
+    yang dirender. Kegagalan pengindeksan hanya dicatat dan tidak menggagalkan pekerjaan.
+    """
+    image_files = {}
+    for image_path in conversion_result["image_paths"]:
+        match = image_delivery.PAGE_FILENAME_PATTERN.search(os.path.basename(image_path))
+        if match:
+            image_files[int(match.group(1))] = os.path.basename(image_path)
+    pages = [dict(page, image_file=image_files.get(page["page"])) for page in conversion_result["page_text"]]
+    try:
+        with metrics.span("search_index.add_book"):
+            search_index.add_book(job_id, original_filename, pages, output_subfolder=output_subfolder)
+    except Exception as e:
+        logging.error(f"Gagal mengindeks teks '{original_filename}' untuk pencarian: {e}", exc_info=True)
+
+
+# Inisialisasi job queue untuk konversi ePub. Worker dijalankan secara lazy pada request pertama
+# agar proses reloader Flask (debug=True) tidak ikut menjalankan pekerjaan.
+job_queue = JobQueue(
+    os.path.join(UPLOAD_FOLDER, JOB_QUEUE_DB_FILE),
+    process_conversion_job,
+    num_workers=JOB_WORKERS,
+    max_queued=JOB_QUEUE_MAX_SIZE,
+    ttl_seconds=int(JOB_TTL_HOURS * 3600)
+)
+
+metrics.REGISTRY.register(metrics.CallbackGauge(
+    f"{metrics.METRIC_PREFIX}_job_queue_depth",
+    "Jumlah pekerjaan konversi yang sedang mengantre.",
+    job_queue.queue_depth
+))
+metrics.REGISTRY.register(metrics.CallbackGauge(
+    f"{metrics.METRIC_PREFIX}_generated_output_bytes",
+    "Total ukuran folder output gambar yang tercatat (byte).",
+    lambda: workspace_manager.usage()["total_bytes"]
+))
+if remote_renderer:
+    metrics.REGISTRY.register(metrics.CallbackGauge(
+        f"{metrics.METRIC_PREFIX}_render_queue_depth",
+        "Jumlah tugas render yang menunggu render worker.",
+        remote_renderer.broker.depth
+    ))
+for admission_field, admission_doc in (("active", "Jumlah eksekusi tahapan yang sedang berjalan."), ("waiting", "Jumlah eksekusi tahapan yang menunggu slot.")):
+    metrics.REGISTRY.register(metrics.CallbackGauge(
+        f"{metrics.METRIC_PREFIX}_stage_{admission_field}",
+        admission_doc,
+        lambda field=admission_field: {(name,): state[field] for name, state in admission_controller.snapshot().items()},
+        label_names=("stage",)
+    ))
+
+@app.before_request
+def start_job_workers():
+    """Memastikan worker job queue, evaluator ROUGE, dan eviction output berjalan (dan pekerjaan yang tertunda dipulihkan) di proses ini."""
+    job_queue.start()
+    rouge_evaluator.start()
+    workspace_manager.start()
+
+def reject_if_busy():
+    """
+    Mengembalikan respons 429 jika antrean pekerjaan atau antrean salah satu tahapan mahal penuh, atau None.
+    Dipanggil sebelum request.files/request.form diakses agar body unggahan tidak dibaca sama sekali.
+    """
+    try:
+        admission_controller.check(job_queue.queue_depth(), JOB_QUEUE_MAX_SIZE)
+    except admission.ServerBusyError as e:
+        return server_busy_response(e)
+    return None
+
+@app.route('/upload', methods=['POST'])
+def upload_file():
+    """
+    Menangani unggahan file ePub dan memasukkannya ke job queue.
+    Mengembalikan ID pekerjaan secara langsung; progres dan hasil diambil melalui /jobs/<job_id>.
+    Jika server sedang sibuk, unggahan ditolak dengan 429 dan Retry-After sebelum body request dibaca.
+    """
+    busy_response = reject_if_busy()
+    if busy_response:
+        return busy_response
+    return accept_upload()
+
+def accept_upload(llm_prompts=None, pack_prompts=False):
+    """
+    Memvalidasi unggahan ePub dan parameter form, lalu memasukkannya ke job queue.
+
+    Args:
+        llm_prompts (list, optional): Daftar prompt dari /upload/batch; menggantikan field llm_prompt.
+        pack_prompts (bool): Gabungkan semua prompt dalam satu permintaan Gemini.
+    """
+    # Validasi dasar file yang diunggah
+    if 'epub_file' not in request.files:
+        logging.error("Tidak ada bagian file dalam permintaan.")
+        return jsonify({"error": "Tidak ada file yang diunggah."}), 400
+    
+    file = request.files['epub_file']
+    llm_prompt = '' if llm_prompts else request.form.get('llm_prompt', '').strip() 
+    # Teks referensi manusia (opsional) untuk evaluasi ROUGE respons LLM
+    reference_text = request.form.get('reference_text', '').strip()
+    
+    # Ambil nilai checkbox untuk menentukan apakah halaman ePub asli harus dirender
+    render_epub_pages = request.form.get('render_epub_pages') == 'true' 
+    # Rentang halaman/bab yang dirender (misalnya "1-10" atau "3-7") dan preset viewport (desktop, mobile, tablet, print)
+    page_range = request.form.get('page_range', '').strip()
+    render_preset = request.form.get('render_preset', '').strip().lower() or image_renderer.DEFAULT_RENDER_PRESET
+    try:
+        conversion.parse_page_range(page_range)
+        image_renderer.get_render_preset(render_preset)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Profiling dipaksa dengan header X-Profile: 1 dan token admin yang valid, atau dipilih oleh sampling
+    forced_profile = request.headers.get('X-Profile') == '1' and is_admin_request()
+    profile_reason = None
+    if profiling.should_profile(PROFILE_SAMPLE_RATE, forced=forced_profile):
+        profile_reason = "admin" if forced_profile else "sampled"
+    
+    if file.filename == '':
+        logging.warning("Tidak ada file yang dipilih oleh pengguna.")
+        return jsonify({"error": "Tidak ada file yang dipilih."}), 400
+    
+    if file and file.filename.lower().endswith('.epub'):
+        original_filename = file.filename
+        clean_filename_prefix = image_renderer.clean_filename(os.path.splitext(original_filename)[0])
+
+        # Nama unik untuk subfolder output dan file ePub yang menunggu diproses,
+        # agar unggahan dengan nama file yang sama tidak saling menimpa
+        unique_output_subfolder_name = clean_filename_prefix + '_' + str(os.getpid()) + '_' + os.urandom(4).hex() 
+        filepath = os.path.join(app.config['UPLOAD_FOLDER'], unique_output_subfolder_name + '.epub')
+
+        try:
+            # File sudah ditulis ke spool saat request di-parse; cukup rename (tanpa menyalin ulang).
+            # File dihapus oleh worker setelah pekerjaan selesai.
+            spool = file.stream
+            spool.claim(filepath)
+            logging.info(f"File '{original_filename}' ({spool.size} byte, sha256 {spool.hexdigest()[:12]}) berhasil diunggah ke '{filepath}'")
+
+            job_id = job_queue.submit({
+                "epub_path": filepath,
+                "original_filename": original_filename,
+                "clean_filename_prefix": clean_filename_prefix,
+                "llm_prompt": llm_prompt,
+                "llm_prompts": llm_prompts,
+                "pack_prompts": pack_prompts,
+                "reference_text": reference_text,
+                "render_epub_pages": render_epub_pages,
+                "page_range": page_range,
+                "render_preset": render_preset,
+                "output_subfolder": unique_output_subfolder_name,
+                "content_sha256": spool.hexdigest(),
+                "profile": profile_reason,
+            })
+        except QueueFullError as e:
+            # Antrean terisi oleh unggahan lain setelah pengecekan awal
+            if os.path.exists(filepath):
+                os.remove(filepath)
+            admission.REJECTED_TOTAL.inc(reason="queue")
+            return server_busy_response(admission.ServerBusyError(str(e), admission_controller.queue_retry_after(JOB_QUEUE_MAX_SIZE), "queue"))
+        except Exception as e:
+            logging.error(f"Gagal menerima unggahan '{original_filename}': {e}", exc_info=True)
             if os.path.exists(filepath):
                 os.remove(filepath)
-            if os.path.exists(unique_output_full_path):
-                shutil.rmtree(unique_output_full_path)
-            if os.path.exists(epub_extract_temp_dir):
-                shutil.rmtree(epub_extract_temp_dir)
-            
-            # Mengembalikan respons error JSON ke frontend
-            return jsonify({
-                "error": f"Gagal memproses file: {str(e)}. Cek log server untuk detail.",
-                "performance_log": updated_performance_logs 
-            }), 500
+            return jsonify({"error": f"Gagal menerima file: {str(e)}"}), 500
+
+        response_body = {
+            "message": f"File '{original_filename}' diterima dan masuk antrean.",
+            "job_id": job_id,
+            "status_url": f"/jobs/{job_id}",
+            "events_url": f"/jobs/{job_id}/events"
+        }
+        if forced_profile:
+            response_body["profile_url"] = f"/admin/profiles/{job_id}"
+        return jsonify(response_body), 202
     else:
         # Menangani unggahan file dengan format yang tidak didukung
         logging.warning(f"File '{file.filename}' yang diunggah bukan format .epub atau tidak valid.")
         return jsonify({"error": "Format file tidak didukung. Harap unggah file .epub."}), 400
 
+@app.route('/upload/batch', methods=['POST'])
+def upload_batch():
+    """
+    Menerima satu file ePub dengan beberapa prompt sekaligus (misalnya ringkasan, poin utama, dan terjemahan).
+    Ekstraksi dan chunking dilakukan sekali, prompt dikirim ke Gemini secara paralel (atau digabung dalam
+    satu permintaan dengan pack_prompts=true), dan satu kartu gambar dirender untuk setiap jawaban.
+
+    Prompt dikirim sebagai field form `prompts` yang berulang, atau satu field `prompts` berisi array JSON.
+    Hasil per prompt tersedia di `llm_results` pada /jobs/<job_id>.
+    """
+    busy_response = reject_if_busy()
+    if busy_response:
+        return busy_response
+
+    llm_prompts = request.form.getlist('prompts')
+    if len(llm_prompts) == 1 and llm_prompts[0].lstrip().startswith('['):
+        try:
+            llm_prompts = json.loads(llm_prompts[0])
+        except ValueError:
+            return jsonify({"error": "Field 'prompts' bukan array JSON yang valid."}), 400
+        if not isinstance(llm_prompts, list) or not all(isinstance(prompt, str) for prompt in llm_prompts):
+            return jsonify({"error": "Field 'prompts' harus berupa array JSON berisi string."}), 400
+    llm_prompts = [prompt.strip() for prompt in llm_prompts if prompt.strip()]
+    if not llm_prompts:
+        return jsonify({"error": "Tidak ada prompt yang diberikan."}), 400
+    if len(llm_prompts) > MAX_BATCH_PROMPTS:
+        return jsonify({"error": f"Terlalu banyak prompt ({len(llm_prompts)}). Maksimum {MAX_BATCH_PROMPTS} prompt per unggahan."}), 400
+    return accept_upload(llm_prompts=llm_prompts, pack_prompts=request.form.get('pack_prompts') == 'true')
+
+def server_busy_response(error):
+    """Respons 429 dengan header Retry-After untuk unggahan yang ditolak oleh admission control."""
+    logging.warning(f"Menolak unggahan: {error} Coba lagi dalam {error.retry_after} detik.")
+    response = jsonify({
+        "error": f"Server sedang sibuk. Silakan coba lagi dalam {error.retry_after} detik.",
+        "reason": error.reason,
+        "retry_after": error.retry_after,
+    })
+    response.status_code = 429
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+@app.errorhandler(413)
+def upload_too_large(e):
+    """Menolak unggahan yang melebihi MAX_CONTENT_LENGTH dengan respons JSON."""
+    max_upload_mb = app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)
+    logging.warning(f"Unggahan ditolak karena melebihi batas {max_upload_mb} MB.")
+    return jsonify({"error": f"Ukuran file melebihi batas {max_upload_mb} MB."}), 413
+
+# Rute untuk memantau status pekerjaan konversi
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """
+    Mengembalikan status, progres, hasil parsial, dan hasil akhir sebuah pekerjaan konversi.
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Pekerjaan tidak ditemukan."}), 404
+    return jsonify(job), 200
+
+# Rute untuk menerima event progres pekerjaan secara streaming (Server-Sent Events)
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    """
+    Mengalirkan event pekerjaan sebagai Server-Sent Events: 'progress' untuk setiap tahapan,
+    'page' untuk setiap gambar halaman yang selesai dirender, lalu 'done' atau 'failed'.
+    Mendukung header Last-Event-ID agar klien dapat tersambung ulang tanpa kehilangan event.
+    """
+    if job_queue.get(job_id) is None:
+        return jsonify({"error": "Pekerjaan tidak ditemukan."}), 404
+
+    try:
+        last_event_id = int(request.headers.get('Last-Event-ID') or request.args.get('after', 0))
+    except ValueError:
+        last_event_id = 0
+
+    def stream():
+        after_id = last_event_id
+        deadline = time.monotonic() + SSE_MAX_STREAM_SECONDS
+        # Pemeriksaan pertama tanpa menunggu, agar klien pekerjaan yang sudah selesai langsung dilayani
+        timeout = 0
+        while time.monotonic() < deadline:
+            events = job_queue.wait_for_events(job_id, after_id, timeout=timeout)
+            timeout = SSE_KEEPALIVE_SECONDS
+            if not events:
+                job = job_queue.get(job_id)
+                if job is None:
+                    return # Pekerjaan sudah dihapus dari antrean (TTL)
+                if job["status"] in (STATUS_DONE, STATUS_FAILED):
+                    # Event akhir sudah lewat dari Last-Event-ID klien: kirim ulang status akhir yang tersimpan lalu tutup
+                    yield f"event: {job['status']}\ndata: {json.dumps({'result': job['result'], 'error': job['error']})}\n\n"
+                    return
+                # Komentar SSE sebagai keep-alive agar koneksi tidak diputus proxy
+                yield ": keep-alive\n\n"
+                continue
+            for event in events:
+                after_id = event["id"]
+                yield f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+                if event["type"] in (STATUS_DONE, STATUS_FAILED):
+                    return
+
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no', # Nonaktifkan buffering di reverse proxy (nginx)
+    })
+
 # Rute untuk melayani gambar yang dihasilkan dari subfolder unik
 @app.route('/generated_images/<subfolder>/<filename>')
-def serve_generated_image(subfolder, filename):
+@app.route('/generated_images/<subfolder>/<content_hash>/<filename>')
+def serve_generated_image(subfolder, filename, content_hash=None):
     """
     Melayani file gambar yang dihasilkan dari subfolder unik.
-    Ini memungkinkan gambar diakses melalui URL di browser.
+    URL dengan hash konten yang cocok di-cache sebagai immutable; URL tanpa hash direvalidasi dengan ETag.
     """
-    full_path_to_subfolder = os.path.join(app.config['GENERATED_IMAGES_FOLDER'], subfolder)
-    # send_from_directory secara aman melayani file dari direktori yang ditentukan
-    return send_from_directory(full_path_to_subfolder, filename)
+    # safe_join mencegah path keluar dari folder gambar (misalnya '..')
+    full_path = safe_join(app.config['GENERATED_IMAGES_FOLDER'], subfolder, filename)
+    if full_path is None or not os.path.isfile(full_path):
+        return jsonify({"error": "Gambar tidak ditemukan."}), 404
+    workspace_manager.touch(subfolder) # Catat akses untuk eviction LRU
+    return image_delivery.send_image(
+        full_path,
+        f"{subfolder}/{filename}",
+        requested_hash=content_hash,
+        sendfile_mode=IMAGE_SENDFILE_MODE,
+        x_accel_prefix=X_ACCEL_REDIRECT_PREFIX
+    )
+
+# Rute untuk mengunduh semua halaman satu buku sebagai arsip ZIP/CBZ yang dibuat secara streaming
+@app.route('/generated_images/<subfolder>/archive')
+def download_generated_archive(subfolder):
+    """
+    Mengalirkan gambar satu folder output sebagai arsip ZIP (default) atau CBZ (?format=cbz).
+    Arsip dibuat saat dikirim, tanpa file sementara; halaman diurutkan sesuai nomor halaman.
+    CBZ hanya berisi halaman ePub agar dapat dibuka langsung di pembaca komik.
+    """
+    archive_format = request.args.get('format', 'zip').lower()
+    if archive_format not in ('zip', 'cbz'):
+        return jsonify({"error": "Format arsip harus 'zip' atau 'cbz'."}), 400
+    image_dir = safe_join(app.config['GENERATED_IMAGES_FOLDER'], subfolder)
+    if image_dir is None or not os.path.isdir(image_dir):
+        return jsonify({"error": "Folder gambar tidak ditemukan."}), 404
+    entries = image_delivery.list_archive_entries(image_dir, pages_only=archive_format == 'cbz')
+    if not entries:
+        return jsonify({"error": "Tidak ada gambar untuk diarsipkan."}), 404
+    workspace_manager.touch(subfolder) # Catat akses untuk eviction LRU
+
+    mimetype = 'application/vnd.comicbook+zip' if archive_format == 'cbz' else 'application/zip'
+    response = Response(image_delivery.stream_archive(entries), mimetype=mimetype, direct_passthrough=True)
+    response.headers['Content-Disposition'] = f'attachment; filename="{subfolder}.{archive_format}"'
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no' # Kirim potongan arsip segera tanpa buffering di nginx
+    return response
+
+# Rute untuk pencarian teks penuh di buku yang sudah diproses
+@app.route('/search')
+def search_books():
+    """
+    Mencari kutipan di semua buku yang sudah diproses (indeks FTS5, tanpa ekstraksi ulang).
+
+    Query string: `q` (wajib), `limit` (default 20, maksimum 50), dan `book` (ID pekerjaan, opsional).
+    Setiap hasil berisi cuplikan teks asli dengan posisi kata yang cocok (`highlights`), nomor halaman,
+    judul bab, dan `image_url` gambar halaman tersebut jika masih tersedia.
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"error": "Parameter 'q' wajib diisi."}), 400
+    try:
+        limit = int(request.args.get('limit', 20))
+    except ValueError:
+        return jsonify({"error": "Parameter 'limit' harus berupa angka."}), 400
+
+    search_start = time.perf_counter()
+    with metrics.span("search_index.search"):
+        results = search_index.search(query, limit=limit, book_id=request.args.get('book') or None)
+    for result in results:
+        image_path = None
+        if result["output_subfolder"] and result["image_file"]:
+            image_path = safe_join(app.config['GENERATED_IMAGES_FOLDER'], result["output_subfolder"], result["image_file"])
+        # Gambar halaman bisa sudah dihapus oleh eviction output; teksnya tetap dapat dicari
+        result["image_url"] = generated_image_url(image_path) if image_path and os.path.isfile(image_path) else None
+        del result["output_subfolder"], result["image_file"]
+    return jsonify({
+        "query": query,
+        "results": results,
+        "took_ms": round((time.perf_counter() - search_start) * 1000, 2),
+    })
+
+# Rute untuk membaca log kinerja secara bertahap (pagination dan pembaruan inkremental)
+@app.route('/performance-log')
+def performance_log():
+    """
+    Mengembalikan log kinerja secara bertahap.
+
+    Query parameter:
+        since (int): Hanya baris yang ditambahkan/diperbarui setelah nomor urut ini (pembaruan inkremental).
+        cursor (int): Hanya baris dengan id lebih kecil dari ini (halaman riwayat yang lebih lama).
+        limit (int): Jumlah baris maksimum per respons (default 50, maksimum PERFORMANCE_LOG_MAX_PAGE_SIZE).
+
+    Respons menyertakan ETag; klien yang mengirim If-None-Match dengan ETag yang sama menerima 304.
+    """
+    since = request.args.get('since', type=int)
+    cursor = request.args.get('cursor', type=int)
+    limit = min(max(request.args.get('limit', 50, type=int), 1), PERFORMANCE_LOG_MAX_PAGE_SIZE)
+
+    # ETag dihitung dari status penyimpanan (murah) sebelum membaca baris apa pun
+    state = performance_log_store.state()
+    etag = f"{state['generation']}-{state['last_seq']}-{state['total']}-{since}-{cursor}-{limit}"
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        if since is not None:
+            page = performance_log_store.read_since(since, limit=limit)
+        else:
+            page = performance_log_store.read_page(cursor=cursor, limit=limit)
+        response = jsonify(page)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache' # Selalu validasi ulang ke server menggunakan ETag
+    return response
+
+def is_admin_request():
+    """True jika ADMIN_TOKEN diatur dan request membawa token yang sama di header X-Admin-Token."""
+    token = request.headers.get('X-Admin-Token', '')
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token.encode('utf-8'), ADMIN_TOKEN.encode('utf-8'))
+
+# Rute admin untuk melihat daftar profil pekerjaan
+@app.route('/admin/profiles')
+def list_job_profiles():
+    """Mengembalikan metadata semua profil yang tersimpan (terbaru lebih dulu). Membutuhkan X-Admin-Token."""
+    if not ADMIN_TOKEN:
+        return jsonify({"error": "Endpoint admin nonaktif (ADMIN_TOKEN belum diatur)."}), 404
+    if not is_admin_request():
+        return jsonify({"error": "Token admin tidak valid."}), 403
+    profiles = profiling.list_profiles(PROFILES_FOLDER)
+    for meta in profiles:
+        meta["urls"] = {name: f"/admin/profiles/{meta['id']}/{name}" for name in meta.get("files", [])}
+    return jsonify({"profiles": profiles})
+
+# Rute admin untuk metadata dan artefak profil satu pekerjaan
+@app.route('/admin/profiles/<job_id>')
+@app.route('/admin/profiles/<job_id>/<filename>')
+def download_job_profile(job_id, filename=profiling.META_FILE):
+    """Mengunduh satu artefak profil (default meta.json). Membutuhkan X-Admin-Token."""
+    if not ADMIN_TOKEN:
+        return jsonify({"error": "Endpoint admin nonaktif (ADMIN_TOKEN belum diatur)."}), 404
+    if not is_admin_request():
+        return jsonify({"error": "Token admin tidak valid."}), 403
+    full_path = safe_join(PROFILES_FOLDER, job_id, filename)
+    if full_path is None or not os.path.isfile(full_path):
+        return jsonify({"error": "Profil tidak ditemukan (pekerjaan mungkin belum selesai)."}), 404
+    return send_file(os.path.abspath(full_path), as_attachment=filename != profiling.META_FILE, max_age=0)
+
+# Rute untuk metrik Prometheus
+@app.route('/metrics')
+def prometheus_metrics():
+    """
+    Mengekspor histogram latensi per span (tahapan dan fungsi) serta counter dalam format teks Prometheus.
+    """
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
 
 # Rute untuk mengunduh log kinerja
 @app.route('/download-performance-log')
 def download_performance_log():
     """
     Memungkinkan pengguna untuk mengunduh file log kinerja dalam format Excel.
+    File Excel dibuat sesuai permintaan dari penyimpanan log, tanpa disimpan ke disk.
     """
-    excel_path = os.path.join(app.config['UPLOAD_FOLDER'], PERFORMANCE_LOG_FILE)
-    if os.path.exists(excel_path):
-        return send_from_directory(app.config['UPLOAD_FOLDER'], PERFORMANCE_LOG_FILE, as_attachment=True)
-    else:
+    if performance_log_store.count() == 0:
         return "Log kinerja belum tersedia.", 404
+    try:
+        excel_buffer = performance_log_store.export_xlsx()
+    except Exception as e:
+        logging.error(f"Gagal membuat file Excel log kinerja: {e}", exc_info=True)
+        return "Gagal membuat file log kinerja.", 500
+    return send_file(
+        excel_buffer,
+        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        as_attachment=True,
+        download_name=PERFORMANCE_LOG_FILE
+    )
 
 # Rute untuk menghapus log kinerja
 @app.route('/clear-performance-log', methods=['POST'])
 def clear_performance_log():
     """
-    Menghapus file log kinerja Excel dari server.
+    Menghapus semua data log kinerja dari server.
     """
-    excel_path = os.path.join(app.config['UPLOAD_FOLDER'], PERFORMANCE_LOG_FILE)
-    if os.path.exists(excel_path):
-        try:
-            os.remove(excel_path)
-            logging.info(f"Log kinerja '{excel_path}' berhasil dihapus.")
-            # Setelah menghapus, kirim log kosong ke frontend
-            return jsonify({"message": "Log kinerja berhasil dihapus.", "performance_log": []}), 200
-        except Exception as e:
-            # Tangani error jika file terkunci atau ada masalah izin saat menghapus
-            logging.error(f"Gagal menghapus log kinerja '{excel_path}': {e}", exc_info=True)
-            # Jika gagal, baca ulang log yang ada (mungkin terkunci) dan kirim
-            return jsonify({"error": f"Gagal menghapus log: {str(e)}", "performance_log": read_performance_log()}), 500
-    else:
-        logging.info("Tidak ada log kinerja untuk dihapus.")
-        return jsonify({"message": "Tidak ada log kinerja untuk dihapus.", "performance_log": []}), 200
+    try:
+        if performance_log_store.count() == 0:
+            logging.info("Tidak ada log kinerja untuk dihapus.")
+            return jsonify({"message": "Tidak ada log kinerja untuk dihapus."}), 200
+        performance_log_store.clear()
+        logging.info(f"Log kinerja '{performance_log_store.db_path}' berhasil dihapus.")
+        return jsonify({"message": "Log kinerja berhasil dihapus."}), 200
+    except Exception as e:
+        logging.error(f"Gagal menghapus log kinerja '{performance_log_store.db_path}': {e}", exc_info=True)
+        return jsonify({"error": f"Gagal menghapus log: {str(e)}"}), 500
+
+
+# Rute untuk menambahkan referensi manusia ke satu baris log kinerja
+@app.route('/performance-log/<int:log_id>/reference', methods=['POST'])
+def set_performance_log_reference(log_id):
+    """
+    Menyimpan teks referensi manusia untuk satu baris log dan menjadwalkan penilaian ulang ROUGE.
+    Body JSON: {"reference_text": "..."}.
+    """
+    payload = request.get_json(silent=True) or {}
+    reference_text = str(payload.get('reference_text', '')).strip()
+    if not reference_text:
+        return jsonify({"error": "reference_text wajib diisi."}), 400
+    if not performance_log_store.update(log_id, reference_text=reference_text):
+        return jsonify({"error": "Baris log tidak ditemukan."}), 404
+    rouge_evaluator.enqueue(log_id)
+    return jsonify({"message": "Referensi disimpan. ROUGE Score akan dihitung ulang di latar belakang."}), 202
 
 
 # Menjalankan Aplikasi Flask
@@ -0,0 +1,151 @@
+# asset_optimizer.py
+# Modul ini memperkecil gambar ePub yang jauh lebih besar dari viewport render sebelum dibuka Chromium.
+# Gambar hasil scan atau gambar penerbit sering berukuran puluhan megapiksel, padahal hanya ditampilkan
+# selebar viewport; decoding gambar seperti itu mendominasi waktu render dan memori browser.
+# File gambar ditimpa di tempat (path dan nama sama), sehingga referensi di HTML tidak perlu diubah.
+# Hasil downscale di-cache berdasarkan hash konten sehingga buku yang sama tidak diproses ulang.
+
+import os # Untuk operasi path dan stat file
+import shutil # Untuk menyalin file dari cache
+import hashlib # Untuk kunci cache berdasarkan konten gambar
+import logging # Untuk mencatat informasi, peringatan, dan error
+import tempfile # Untuk menulis entri cache secara atomik
+
+from PIL import Image # Untuk membaca ukuran gambar dan downscale (draft/reduce)
+
+import metrics # Instrumentasi span dan histogram latensi
+import log_setup # Logging terpusat non-blocking (antrean + JSON dengan ID pekerjaan)
+
+log_setup.configure_logging()
+
+# Ekstensi yang diproses dan format Pillow untuk menyimpannya kembali (GIF dan SVG dilewati)
+OPTIMIZABLE_FORMATS = {".jpg": "JPEG", ".jpeg": "JPEG", ".png": "PNG", ".webp": "WEBP"}
+# Gambar hanya diperkecil jika lebarnya melebihi lebar target dikali rasio ini
+OVERSIZE_RATIO = 1.5
+# Kualitas penyimpanan ulang JPEG/WebP
+JPEG_QUALITY = 85
+# reducing_gap untuk Image.thumbnail: decoding JPEG dengan draft() dan reduce() bilangan bulat
+# sebelum resampling akhir, sehingga gambar besar tidak pernah didekode penuh
+REDUCING_GAP = 2.0
+
+
+def target_width_for_preset(viewport):
+    """Lebar gambar maksimum yang masih terlihat pada preset viewport (lebar CSS dikali device scale factor)."""
+    return int(viewport["width"] * viewport.get("scale", 1))
+
+
+def _hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _downscale(source_path, output_path, pil_format, max_width):
+    with Image.open(source_path) as image:
+        if getattr(image, "is_animated", False):
+            return False
+        save_kwargs = {}
+        for key in ("icc_profile", "exif", "dpi"):
+            if image.info.get(key):
+                save_kwargs[key] = image.info[key] # Orientasi EXIF dan profil warna tetap dipakai Chromium
+        # Palet dan mode khusus diubah dulu agar resampling tidak jatuh ke NEAREST
+        if image.mode not in ("RGB", "RGBA", "L", "LA", "CMYK"):
+            image = image.convert("RGBA" if "transparency" in image.info or image.mode.endswith("A") else "RGB")
+        height = max(1, round(image.height * max_width / image.width))
+        image.thumbnail((max_width, height), Image.LANCZOS, reducing_gap=REDUCING_GAP)
+        if pil_format == "JPEG":
+            if image.mode not in ("RGB", "L", "CMYK"):
+                image = image.convert("RGB")
+            save_kwargs.update(quality=JPEG_QUALITY, optimize=True, progressive=True)
+        elif pil_format == "WEBP":
+            save_kwargs.update(quality=JPEG_QUALITY)
+        else:
+            save_kwargs.update(optimize=True)
+        image.save(output_path, pil_format, **save_kwargs)
+    return True
+
+
+def optimize_images(asset_paths, max_width, cache_dir=None):
+    """
+    Memperkecil gambar yang lebarnya jauh melebihi `max_width`, di tempat (path file tidak berubah).
+
+    Args:
+        asset_paths (list): Path aset hasil epub_processor.extract_epub_content (non-gambar diabaikan).
+        max_width (int): Lebar maksimum dalam piksel perangkat (lihat target_width_for_preset).
+        cache_dir (str, optional): Folder cache hasil downscale berdasarkan hash konten. None untuk tanpa cache.
+
+    Returns:
+        dict: Statistik 'images_checked', 'images_downscaled', 'cache_hits', 'bytes_before', dan 'bytes_after'.
+    """
+    stats = {"images_checked": 0, "images_downscaled": 0, "cache_hits": 0, "bytes_before": 0, "bytes_after": 0}
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+    for path in asset_paths:
+        extension = os.path.splitext(path)[1].lower()
+        pil_format = OPTIMIZABLE_FORMATS.get(extension)
+        if pil_format is None:
+            continue
+        stats["images_checked"] += 1
+        try:
+            # Image.open hanya membaca header; gambar yang sudah kecil tidak didekode maupun di-hash
+            with Image.open(path) as image:
+                width = image.width
+            if width <= max_width * OVERSIZE_RATIO:
+                continue
+            original_size = os.path.getsize(path)
+            with metrics.span("asset_optimizer.downscale"):
+                cache_path = None
+                if cache_dir:
+                    cache_path = os.path.join(cache_dir, f"{_hash_file(path)}_{max_width}{extension}")
+                if cache_path and os.path.exists(cache_path):
+                    shutil.copyfile(cache_path, path)
+                    os.utime(cache_path) # Tandai baru dipakai untuk prune_cache
+                    stats["cache_hits"] += 1
+                else:
+                    fd, temp_path = tempfile.mkstemp(suffix=extension, dir=cache_dir or os.path.dirname(path))
+                    os.close(fd)
+                    try:
+                        if not _downscale(path, temp_path, pil_format, max_width):
+                            continue
+                        if cache_path:
+                            os.replace(temp_path, cache_path)
+                            shutil.copyfile(cache_path, path)
+                        else:
+                            os.replace(temp_path, path)
+                    finally:
+                        if os.path.exists(temp_path):
+                            os.remove(temp_path)
+            stats["images_downscaled"] += 1
+            stats["bytes_before"] += original_size
+            stats["bytes_after"] += os.path.getsize(path)
+            logging.info(f"Gambar '{os.path.basename(path)}' diperkecil dari lebar {width}px ke {max_width}px.")
+        except Exception as e:
+            # Gambar yang gagal diproses dibiarkan apa adanya; Chromium tetap bisa merendernya
+            logging.warning(f"Gagal memperkecil gambar '{path}': {e}")
+    return stats
+
+
+def prune_cache(cache_dir, max_bytes):
+    """Menghapus entri cache yang paling lama tidak dipakai sampai total ukurannya tidak melebihi `max_bytes`."""
+    if max_bytes <= 0 or not os.path.isdir(cache_dir):
+        return
+    entries = []
+    with os.scandir(cache_dir) as scanned:
+        for entry in scanned:
+            if entry.is_file(follow_symlinks=False):
+                stat = entry.stat(follow_symlinks=False)
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    if total <= max_bytes:
+        return
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except FileNotFoundError:
+            pass
+    logging.info(f"Cache gambar '{cache_dir}' dipangkas menjadi {total / (1024 * 1024):.1f} MB.")
@@ -0,0 +1,253 @@
+# batch_convert.py
+# CLI headless untuk mengkonversi banyak file ePub sekaligus (misalnya job malam), tanpa Flask.
+# Buku diproses paralel di process pool; setiap proses worker memakai satu browser Chromium bersama.
+# Progres dicatat append-only ke file JSONL sehingga batch dapat dilanjutkan: buku yang sudah
+# selesai dilewati saat perintah yang sama dijalankan ulang.
+#
+#   python batch_convert.py buku/ --output-dir batch_output --workers 4
+#   python batch_convert.py daftar_buku.txt --prompt "Ringkas buku ini dalam 5 poin."
+
+import os # Untuk operasi path
+import sys # Untuk kode keluar CLI
+import json # Untuk manifest dan file progres
+import time # Untuk mengukur durasi dan throughput
+import shutil # Untuk menghapus folder scratch
+import contextlib # Untuk sesi profiling opsional
+import hashlib # Untuk nama folder output yang stabil per buku
+import logging # Untuk mencatat informasi, peringatan, dan error
+import argparse # Untuk antarmuka baris perintah
+import tempfile # Untuk folder scratch per buku
+import multiprocessing.util # Untuk menutup browser bersama saat proses worker keluar
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import conversion # Alur konversi inti ePub yang dijalankan sebagai graf tahapan konkuren
+import image_renderer # Untuk browser bersama dan nama file yang aman
+import profiling # Profiling opt-in per buku (cProfile + tracemalloc)
+from workspace import default_scratch_root # Scratch di tmpfs jika tersedia
+import log_setup # Logging terpusat non-blocking (antrean + JSON dengan ID pekerjaan)
+
+log_setup.configure_logging()
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+FONT_PATH = os.path.join(BASE_DIR, 'fonts', 'NotoSansArabic-Regular.ttf')
+FALLBACK_BG_DIR = os.path.join(BASE_DIR, 'static', 'images', 'fallback_ai_bgs')
+
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+# Browser bersama milik proses worker ini (dibuat oleh _init_worker)
+_shared_browser = None
+
+
+def load_books(source):
+    """
+    Mengumpulkan daftar file ePub dari direktori (rekursif) atau file manifest.
+
+    Manifest berupa file teks (satu path per baris, baris kosong dan '#' diabaikan) atau
+    file JSON berisi list path. Path relatif di manifest dihitung dari lokasi manifest.
+
+    Args:
+        source (str): Path direktori atau file manifest.
+
+    Returns:
+        list: Path absolut file ePub, urut dan tanpa duplikat.
+    """
+    if os.path.isdir(source):
+        books = []
+        for root, _dirs, files in os.walk(source):
+            books.extend(os.path.join(root, name) for name in files if name.lower().endswith('.epub'))
+    else:
+        manifest_dir = os.path.dirname(os.path.abspath(source))
+        with open(source, encoding='utf-8') as f:
+            if source.lower().endswith('.json'):
+                entries = json.load(f)
+            else:
+                entries = [line.strip() for line in f if line.strip() and not line.strip().startswith('#')]
+        books = [entry if os.path.isabs(entry) else os.path.join(manifest_dir, entry) for entry in entries]
+    return sorted({os.path.abspath(book) for book in books})
+
+
+def book_key(epub_path):
+    """Kunci progres satu buku: path absolut, ukuran, dan waktu modifikasi (buku yang berubah diproses ulang)."""
+    stat = os.stat(epub_path)
+    return f"{os.path.abspath(epub_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+
+
+def book_output_name(epub_path):
+    """Nama folder output yang stabil untuk satu buku, agar proses ulang menimpa hasil parsial sebelumnya."""
+    clean_name = image_renderer.clean_filename(os.path.splitext(os.path.basename(epub_path))[0])
+    path_hash = hashlib.sha1(os.path.abspath(epub_path).encode('utf-8')).hexdigest()[:8]
+    return f"{clean_name}_{path_hash}"
+
+
+def load_progress(progress_file):
+    """
+    Membaca file progres JSONL.
+
+    Returns:
+        dict: Kunci buku -> catatan terakhir untuk buku tersebut.
+    """
+    records = {}
+    if not os.path.exists(progress_file):
+        return records
+    with open(progress_file, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue # Baris terakhir bisa terpotong jika batch sebelumnya dihentikan paksa
+            records[record["key"]] = record
+    return records
+
+
+def _init_worker(render_pages):
+    # Dipanggil sekali per proses worker: siapkan satu browser bersama untuk semua buku di proses ini
+    global _shared_browser
+    if render_pages:
+        _shared_browser = image_renderer.SharedBrowser()
+        multiprocessing.util.Finalize(None, _shared_browser.close, exitpriority=10)
+    # Proses worker keluar lewat os._exit tanpa atexit; tulis log yang masih mengantre sebelum keluar
+    multiprocessing.util.Finalize(None, log_setup.shutdown_logging, exitpriority=0)
+
+
+def convert_book(epub_path, output_root, scratch_root, llm_prompt, render_pages, fast_text_renderer=True, page_range=None, render_preset=None, profile_sample_rate=0.0, optimize_images=True):
+    """
+    Mengkonversi satu buku di proses worker. Jika terpilih untuk profiling (profile_sample_rate, 1.0 untuk
+    semua buku), artefak profil disimpan di <output_root>/profiles/<nama folder output buku>/.
+
+    Returns:
+        dict: Catatan progres (status, jumlah halaman/gambar, durasi, folder output, error).
+    """
+    started = time.time()
+    output_dir = os.path.join(output_root, book_output_name(epub_path))
+    scratch_dir = tempfile.mkdtemp(prefix="batch_", dir=scratch_root)
+    record = {"path": epub_path, "output_dir": output_dir}
+    profile_session = contextlib.nullcontext()
+    if profiling.should_profile(profile_sample_rate):
+        record["profile_dir"] = os.path.join(output_root, "profiles", book_output_name(epub_path))
+        profile_session = profiling.ProfileSession(record["profile_dir"], label=epub_path, reason="sampled" if profile_sample_rate < 1 else "cli")
+    with log_setup.job_context(book_output_name(epub_path)), profile_session:
+        _convert_book(epub_path, output_dir, scratch_dir, llm_prompt, render_pages, fast_text_renderer, page_range, render_preset, optimize_images, record)
+    record["duration"] = round(time.time() - started, 3)
+    return record
+
+
+def _convert_book(epub_path, output_dir, scratch_dir, llm_prompt, render_pages, fast_text_renderer, page_range, render_preset, optimize_images, record):
+    # Isi convert_book; hasil dan error ditulis ke `record`
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+        fallback_bg_images = []
+        if os.path.isdir(FALLBACK_BG_DIR):
+            fallback_bg_images = [os.path.join(FALLBACK_BG_DIR, f) for f in os.listdir(FALLBACK_BG_DIR) if f.lower().endswith(('.png', '.jpg', '.jpeg', '.gif'))]
+        result = conversion.convert_epub(
+            epub_path,
+            output_dir,
+            scratch_dir,
+            image_renderer.clean_filename(os.path.splitext(os.path.basename(epub_path))[0]),
+            llm_prompt=llm_prompt,
+            render_epub_pages=render_pages,
+            font_path=FONT_PATH,
+            fallback_bg_images=fallback_bg_images,
+            renderer=_shared_browser.render_html_to_images if _shared_browser else None,
+            fast_text_renderer=fast_text_renderer,
+            page_range=page_range,
+            render_preset=render_preset,
+            optimize_images=optimize_images
+        )
+        record.update({
+            "status": STATUS_DONE,
+            "num_epub_pages": result["num_epub_pages"],
+            "num_images": len(result["image_paths"]),
+            "llm_response_text": result["llm_response_text"] if llm_prompt else None,
+            "stage_timings": result["stage_timings"],
+        })
+    except Exception as e:
+        logging.error(f"Gagal mengkonversi '{epub_path}': {e}", exc_info=True)
+        record.update({"status": STATUS_FAILED, "error": str(e)})
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+
+def summarize(records, skipped, wall_seconds):
+    """Menyusun ringkasan throughput batch dari catatan buku yang diproses pada run ini."""
+    done = [r for r in records if r["status"] == STATUS_DONE]
+    total_pages = sum(r.get("num_epub_pages", 0) for r in done)
+    return {
+        "processed": len(records),
+        "done": len(done),
+        "failed": len(records) - len(done),
+        "skipped": skipped,
+        "total_pages": total_pages,
+        "wall_seconds": round(wall_seconds, 2),
+        "books_per_minute": round(len(done) / wall_seconds * 60, 2) if wall_seconds else 0.0,
+        "pages_per_second": round(total_pages / wall_seconds, 2) if wall_seconds else 0.0,
+        "mean_book_seconds": round(sum(r["duration"] for r in records) / len(records), 2) if records else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Konversi batch file ePub ke gambar tanpa server web.")
+    parser.add_argument("source", help="Direktori berisi file .epub (rekursif) atau file manifest (.txt/.json).")
+    parser.add_argument("--output-dir", default="batch_output", help="Folder induk output per buku.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="Jumlah proses worker.")
+    parser.add_argument("--prompt", default="", help="Prompt LLM opsional untuk setiap buku.")
+    parser.add_argument("--no-render-pages", action="store_true", help="Lewati rendering halaman ePub (hanya hasil LLM).")
+    parser.add_argument("--pages", help="Rentang halaman/bab yang dirender, misalnya 1-10 atau 3-7 (default: semua).")
+    parser.add_argument("--preset", default=image_renderer.DEFAULT_RENDER_PRESET, choices=sorted(image_renderer.RENDER_PRESETS), help="Preset viewport rendering halaman.")
+    parser.add_argument("--chromium-only", action="store_true", help="Render semua halaman dengan Playwright, tanpa renderer Pillow untuk halaman teks.")
+    parser.add_argument("--keep-original-images", action="store_true", help="Jangan perkecil gambar ePub yang jauh lebih lebar dari viewport sebelum dirender.")
+    parser.add_argument("--profile", action="store_true", help="Profil setiap buku (cProfile + tracemalloc) ke <output-dir>/profiles/.")
+    parser.add_argument("--profile-sample-rate", type=float, default=0.0, help="Proporsi buku yang diprofil secara acak (0.0-1.0).")
+    parser.add_argument("--progress-file", help="File progres JSONL (default: <output-dir>/progress.jsonl).")
+    parser.add_argument("--force", action="store_true", help="Proses ulang buku yang sudah selesai.")
+    args = parser.parse_args(argv)
+    try:
+        conversion.parse_page_range(args.pages)
+    except ValueError as e:
+        parser.error(str(e))
+
+    render_pages = not args.no_render_pages
+    output_root = os.path.abspath(args.output_dir)
+    os.makedirs(output_root, exist_ok=True)
+    progress_file = args.progress_file or os.path.join(output_root, "progress.jsonl")
+    scratch_root = default_scratch_root(os.path.join(output_root, ".scratch"))
+    os.makedirs(scratch_root, mode=0o700, exist_ok=True)
+
+    books = load_books(args.source)
+    progress = load_progress(progress_file)
+    pending = []
+    for epub_path in books:
+        key = book_key(epub_path)
+        if not args.force and progress.get(key, {}).get("status") == STATUS_DONE:
+            continue
+        pending.append((key, epub_path))
+    skipped = len(books) - len(pending)
+    logging.info(f"{len(books)} buku ditemukan, {skipped} sudah selesai dan dilewati, {len(pending)} akan diproses.")
+
+    records = []
+    started = time.time()
+    if pending:
+        with open(progress_file, "a", encoding="utf-8") as progress_out, \
+                ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker, initargs=(render_pages,)) as executor:
+            futures = {
+                executor.submit(convert_book, epub_path, output_root, scratch_root, args.prompt, render_pages, not args.chromium_only, args.pages, args.preset,
+                                1.0 if args.profile else args.profile_sample_rate, not args.keep_original_images): key
+                for key, epub_path in pending
+            }
+            for future in as_completed(futures):
+                record = future.result()
+                record["key"] = futures[future]
+                record["finished_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+                # Hanya proses utama yang menulis file progres; flush per buku agar batch dapat dilanjutkan
+                progress_out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                progress_out.flush()
+                records.append(record)
+                logging.info(f"[{len(records)}/{len(pending)}] {record['status']}: {record['path']} ({record['duration']} detik)")
+
+    summary = summarize(records, skipped, time.time() - started)
+    print(json.dumps(summary, indent=2))
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
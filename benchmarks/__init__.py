@@ -0,0 +1,4 @@
+# benchmarks
+# Paket benchmark untuk melacak kinerja aplikasi (waktu startup, memori, dan alur konversi).
+# Setiap modul dijalankan sebagai skrip, misalnya: python -m benchmarks.startup
+# atau python -m benchmarks.suite (benchmark alur konversi dengan ePub sintetis dari benchmarks.epub_generator).
@@ -0,0 +1,193 @@
+# benchmarks/epub_generator.py
+# Generator ePub sintetis untuk benchmark. Isi buku ditentukan sepenuhnya oleh parameter dan seed,
+# sehingga hasil benchmark antar commit dapat dibandingkan tanpa file asli di uploads/.
+#
+#   python -m benchmarks.epub_generator buku_uji.epub --chapters 20 --arabic-ratio 0.9 --images-per-chapter 1
+#   python -m benchmarks.epub_generator buku_kaya.epub --css rich --font fonts/NotoSansArabic-Regular.ttf
+
+import io # Untuk menyimpan gambar sintetis ke memori
+import os # Untuk operasi path
+import sys # Untuk kode keluar CLI
+import random # Untuk teks dan gambar yang dapat direproduksi (seed tetap)
+import argparse # Untuk antarmuka baris perintah
+
+from PIL import Image, ImageDraw # Untuk gambar sintetis yang disisipkan di bab
+
+# Kosakata untuk teks sintetis; kata Arab umum agar reshaping/bidi bekerja seperti pada buku asli
+ARABIC_WORDS = [
+    "الله", "الرحمن", "الرحيم", "الكتاب", "العلم", "الناس", "قال", "كان", "في", "من", "على", "إلى",
+    "هذا", "الذي", "التي", "بين", "عند", "كل", "بعد", "قبل", "الحمد", "الصلاة", "السلام", "رسول",
+    "الحديث", "الفقه", "اللغة", "العربية", "باب", "فصل", "مسألة", "الأول", "الثاني", "القول", "المعنى",
+    "النبي", "الصحابة", "الأمة", "الدين", "الحق", "العمل", "النية", "القلب", "الخير", "الأرض", "السماء",
+]
+LATIN_WORDS = [
+    "lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit", "sed", "do",
+    "eiusmod", "tempor", "incididunt", "ut", "labore", "et", "dolore", "magna", "aliqua", "enim",
+]
+
+# Gaya CSS yang dapat dipilih: 'none' tanpa stylesheet, 'simple' CSS RTL dasar (didukung renderer Pillow),
+# 'rich' memakai fitur tata letak yang memaksa rendering dengan Playwright
+CSS_STYLES = {
+    "none": "",
+    "simple": (
+        "body { direction: rtl; text-align: right; margin: 1em; line-height: 1.8; }\n"
+        "h1 { text-align: center; font-size: 1.6em; }\n"
+        "p { text-indent: 1.5em; margin: 0.5em 0; }\n"
+        "p.latin { direction: ltr; text-align: left; }\n"
+    ),
+    "rich": (
+        "body { direction: rtl; display: flex; flex-direction: column; }\n"
+        "h1 { position: relative; border-bottom: 2px solid #5b241c; }\n"
+        "p { float: right; width: 100%; column-count: 1; }\n"
+        "img { max-width: 100%; box-shadow: 0 0 4px #999; }\n"
+    ),
+}
+
+
+def make_paragraph(rng, words_per_paragraph, arabic_ratio):
+    """
+    Membuat satu paragraf sintetis.
+
+    Args:
+        rng (random.Random): Sumber acak dengan seed tetap.
+        words_per_paragraph (int): Jumlah kata.
+        arabic_ratio (float): Proporsi kata Arab (0.0 = Latin saja, 1.0 = Arab saja).
+
+    Returns:
+        tuple: (teks paragraf, True jika mayoritas kata Latin).
+    """
+    words = []
+    latin_count = 0
+    for _ in range(words_per_paragraph):
+        if rng.random() < arabic_ratio:
+            words.append(rng.choice(ARABIC_WORDS))
+        else:
+            words.append(rng.choice(LATIN_WORDS))
+            latin_count += 1
+    return " ".join(words) + ".", latin_count * 2 > words_per_paragraph
+
+
+def make_image(rng, size):
+    """Membuat gambar PNG sintetis (gradien dan kotak acak) dan mengembalikan byte-nya."""
+    width, height = size
+    image = Image.new("RGB", size, (rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(12):
+        x0, y0 = rng.randrange(width), rng.randrange(height)
+        x1, y1 = min(width, x0 + rng.randrange(20, width // 2 + 21)), min(height, y0 + rng.randrange(20, height // 2 + 21))
+        draw.rectangle([x0, y0, x1, y1], fill=(rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def generate_epub(output_path, chapters=10, paragraphs_per_chapter=20, words_per_paragraph=60, arabic_ratio=0.8,
+                  images_per_chapter=0, image_size=(800, 600), font_path=None, css="simple", seed=0):
+    """
+    Membuat file ePub sintetis.
+
+    Args:
+        output_path (str): Path file .epub yang dibuat.
+        chapters (int): Jumlah bab (satu dokumen spine per bab, sehingga satu gambar halaman per bab).
+        paragraphs_per_chapter (int): Jumlah paragraf per bab.
+        words_per_paragraph (int): Jumlah kata per paragraf (menentukan panjang teks).
+        arabic_ratio (float): Proporsi kata Arab terhadap kata Latin.
+        images_per_chapter (int): Jumlah gambar PNG yang disisipkan di setiap bab.
+        image_size (tuple): Ukuran (lebar, tinggi) gambar sisipan dalam piksel.
+        font_path (str, optional): File font yang disematkan dan dipakai lewat @font-face.
+        css (str): Salah satu kunci CSS_STYLES.
+        seed (int): Seed acak; parameter dan seed yang sama menghasilkan isi yang sama.
+
+    Returns:
+        dict: Ringkasan buku (jumlah bab, kata, gambar, dan ukuran file).
+    """
+    from ebooklib import epub # Dependensi aplikasi yang sama dengan epub_processor
+
+    if css not in CSS_STYLES:
+        raise ValueError(f"Gaya CSS '{css}' tidak dikenal. Pilihan: {', '.join(CSS_STYLES)}.")
+    rng = random.Random(seed)
+    book = epub.EpubBook()
+    book.set_identifier(f"benchmark-{seed}-{chapters}-{paragraphs_per_chapter}-{words_per_paragraph}")
+    book.set_title(f"كتاب الاختبار {seed}")
+    book.set_language("ar")
+    book.set_direction("rtl")
+    book.add_author("Benchmark")
+
+    stylesheet = CSS_STYLES[css]
+    if font_path:
+        font_name = os.path.basename(font_path)
+        with open(font_path, "rb") as f:
+            book.add_item(epub.EpubItem(uid="font", file_name=f"fonts/{font_name}", media_type="font/ttf", content=f.read()))
+        stylesheet = f"@font-face {{ font-family: 'BenchFont'; src: url('fonts/{font_name}'); }}\nbody {{ font-family: 'BenchFont'; }}\n" + stylesheet
+    style_item = None
+    if stylesheet:
+        style_item = epub.EpubItem(uid="style", file_name="style.css", media_type="text/css", content=stylesheet.encode("utf-8"))
+        book.add_item(style_item)
+
+    total_words = 0
+    total_images = 0
+    chapter_items = []
+    for chapter_number in range(1, chapters + 1):
+        body = [f"<h1>الباب {chapter_number}</h1>"]
+        image_positions = set(rng.sample(range(paragraphs_per_chapter), min(images_per_chapter, paragraphs_per_chapter)))
+        for paragraph_index in range(paragraphs_per_chapter):
+            text, is_latin = make_paragraph(rng, words_per_paragraph, arabic_ratio)
+            total_words += words_per_paragraph
+            body.append(f'<p class="latin">{text}</p>' if is_latin else f"<p>{text}</p>")
+            if paragraph_index in image_positions:
+                image_name = f"images/ch{chapter_number}_{paragraph_index}.png"
+                book.add_item(epub.EpubItem(uid=f"img_{chapter_number}_{paragraph_index}", file_name=image_name,
+                                            media_type="image/png", content=make_image(rng, image_size)))
+                body.append(f'<p><img src="{image_name}" alt="gambar {chapter_number}"/></p>')
+                total_images += 1
+
+        chapter = epub.EpubHtml(title=f"الباب {chapter_number}", file_name=f"chapter_{chapter_number}.xhtml", lang="ar", direction="rtl")
+        chapter.content = "<html><body>" + "\n".join(body) + "</body></html>"
+        if style_item is not None:
+            chapter.add_link(href="style.css", rel="stylesheet", type="text/css")
+        book.add_item(chapter)
+        chapter_items.append(chapter)
+
+    book.toc = chapter_items
+    book.spine = chapter_items
+    book.add_item(epub.EpubNcx())
+    book.add_item(epub.EpubNav())
+    epub.write_epub(output_path, book)
+
+    return {
+        "path": output_path,
+        "chapters": chapters,
+        "words": total_words,
+        "images": total_images,
+        "css": css,
+        "embedded_font": bool(font_path),
+        "size_bytes": os.path.getsize(output_path),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Membuat file ePub Arab sintetis untuk benchmark.")
+    parser.add_argument("output", help="Path file .epub yang dibuat.")
+    parser.add_argument("--chapters", type=int, default=10, help="Jumlah bab.")
+    parser.add_argument("--paragraphs", type=int, default=20, help="Jumlah paragraf per bab.")
+    parser.add_argument("--words", type=int, default=60, help="Jumlah kata per paragraf.")
+    parser.add_argument("--arabic-ratio", type=float, default=0.8, help="Proporsi kata Arab (0.0-1.0).")
+    parser.add_argument("--images-per-chapter", type=int, default=0, help="Jumlah gambar per bab.")
+    parser.add_argument("--image-size", default="800x600", help="Ukuran gambar sisipan, misalnya 800x600.")
+    parser.add_argument("--font", help="File font yang disematkan (@font-face).")
+    parser.add_argument("--css", default="simple", choices=sorted(CSS_STYLES), help="Gaya CSS buku.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed acak.")
+    args = parser.parse_args(argv)
+
+    width, height = (int(v) for v in args.image_size.lower().split("x"))
+    summary = generate_epub(
+        args.output, chapters=args.chapters, paragraphs_per_chapter=args.paragraphs, words_per_paragraph=args.words,
+        arabic_ratio=args.arabic_ratio, images_per_chapter=args.images_per_chapter, image_size=(width, height),
+        font_path=args.font, css=args.css, seed=args.seed
+    )
+    print(summary)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
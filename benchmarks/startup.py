@@ -0,0 +1,114 @@
+# benchmarks/startup.py
+# Benchmark waktu impor aplikasi dan memori (RSS) satu proses worker, untuk melacak dampak
+# impor lazy dependensi berat. Setiap percobaan dijalankan di proses Python baru.
+#
+#   python -m benchmarks.startup --runs 5
+#   python -m benchmarks.startup --runs 5 --output startup.json
+
+import os # Untuk path dan variabel lingkungan
+import sys # Untuk path interpreter Python
+import json # Untuk hasil benchmark
+import argparse # Untuk antarmuka baris perintah
+import tempfile # Direktori kerja sementara agar folder aplikasi tidak dibuat di repo
+import statistics # Untuk median
+import subprocess # Untuk menjalankan setiap percobaan di proses baru
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modul berat yang dicatat apakah sudah dimuat setelah impor aplikasi
+TRACKED_MODULES = [
+    "google.generativeai", "grpc", "requests", "playwright", "bs4", "ebooklib", "lxml",
+    "arabic_reshaper", "bidi", "rouge_score", "nltk", "openpyxl",
+]
+
+# Kode yang dijalankan di proses percobaan: mengukur waktu impor `app` dan RSS setelahnya
+PROBE_CODE = r"""
+import json, sys, time
+start = time.perf_counter()
+if IMPORT_APP:
+    import app
+elapsed = time.perf_counter() - start
+rss_kb = 0
+try:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                rss_kb = int(line.split()[1])
+except OSError:
+    import resource
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        rss_kb //= 1024
+print(json.dumps({
+    "import_seconds": elapsed,
+    "rss_mb": rss_kb / 1024,
+    "num_modules": len(sys.modules),
+    "heavy_modules_loaded": [m for m in TRACKED_MODULES if m in sys.modules],
+}))
+"""
+
+
+def run_probe(import_app=True, preload=False):
+    """
+    Menjalankan satu percobaan di proses Python baru.
+
+    Args:
+        import_app (bool): False untuk mengukur baseline interpreter tanpa impor aplikasi.
+        preload (bool): True untuk mengatur PRELOAD_HEAVY_MODULES=1 (perilaku preload gunicorn).
+
+    Returns:
+        dict: Hasil percobaan (import_seconds, rss_mb, num_modules, heavy_modules_loaded).
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = REPO_ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    env["PRELOAD_HEAVY_MODULES"] = "1" if preload else "0"
+    code = f"IMPORT_APP = {import_app!r}\nTRACKED_MODULES = {TRACKED_MODULES!r}\n" + PROBE_CODE
+    with tempfile.TemporaryDirectory(prefix="startup_bench_") as workdir:
+        completed = subprocess.run(
+            [sys.executable, "-c", code], cwd=workdir, env=env,
+            capture_output=True, text=True, check=True
+        )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def summarize(samples):
+    """Meringkas beberapa percobaan menjadi median/min/max untuk waktu impor dan RSS."""
+    summary = {}
+    for key in ("import_seconds", "rss_mb"):
+        values = [sample[key] for sample in samples]
+        summary[key] = {
+            "median": round(statistics.median(values), 4),
+            "min": round(min(values), 4),
+            "max": round(max(values), 4),
+        }
+    summary["num_modules"] = samples[-1]["num_modules"]
+    summary["heavy_modules_loaded"] = samples[-1]["heavy_modules_loaded"]
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark waktu startup dan RSS aplikasi.")
+    parser.add_argument("--runs", type=int, default=5, help="Jumlah percobaan per skenario.")
+    parser.add_argument("--output", help="Simpan hasil JSON ke file ini (default: cetak ke stdout).")
+    args = parser.parse_args(argv)
+
+    scenarios = {
+        "baseline_interpreter": dict(import_app=False),
+        "lazy_imports": dict(import_app=True),
+        "preload_heavy_modules": dict(import_app=True, preload=True),
+    }
+    results = {"python": sys.version.split()[0], "runs": args.runs, "scenarios": {}}
+    for name, options in scenarios.items():
+        samples = [run_probe(**options) for _ in range(args.runs)]
+        results["scenarios"][name] = summarize(samples)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,295 @@
+# benchmarks/suite.py
+# Benchmark mikro dan makro untuk alur konversi, memakai ePub sintetis dari benchmarks.epub_generator.
+# Backend LLM (Gemini dan Hugging Face) diganti stub sehingga tidak dibutuhkan API key maupun jaringan.
+# Hasil dicetak sebagai JSON agar dapat dibandingkan antar commit:
+#
+#   python -m benchmarks.suite --output hasil_baru.json
+#   python -m benchmarks.suite --only micro --chapters 40 --runs 5
+#   python -m benchmarks.suite --compare hasil_lama.json hasil_baru.json
+
+import os # Untuk path dan direktori kerja
+import sys # Untuk versi Python dan kode keluar CLI
+import json # Untuk hasil benchmark
+import time # Untuk mengukur durasi
+import shutil # Untuk membersihkan direktori kerja
+import argparse # Untuk antarmuka baris perintah
+import platform # Untuk metadata mesin
+import tempfile # Direktori kerja sementara agar folder aplikasi tidak dibuat di repo
+import statistics # Untuk median dan rata-rata
+import subprocess # Untuk membaca commit git saat ini
+
+from PIL import Image # Untuk gambar latar belakang stub Hugging Face
+
+from benchmarks.epub_generator import generate_epub
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+# Teks respons stub Gemini (deterministik)
+STUB_LLM_RESPONSE = "هذا ملخص تجريبي للكتاب.\n1. الفصل الأول يشرح المقدمة.\n2. الفصل الثاني يناقش المسائل.\n3. الخاتمة تلخص النتائج."
+# Batas waktu (detik) menunggu pekerjaan /upload selesai pada benchmark makro
+UPLOAD_TIMEOUT_SECONDS = 600
+
+
+def install_llm_stubs(llm_latency=0.0):
+    """
+    Mengganti panggilan Gemini dan Hugging Face di llm_integrator dengan stub lokal.
+
+    Args:
+        llm_latency (float): Jeda buatan (detik) per panggilan untuk mensimulasikan latensi jaringan.
+    """
+    import llm_integrator
+
+    def stub_gemini_response(prompt_text, model_name="stub"):
+        time.sleep(llm_latency)
+        return STUB_LLM_RESPONSE
+
+    def stub_generate_image(image_prompt, output_filepath, model_id="stub"):
+        time.sleep(llm_latency)
+        Image.new("RGB", (512, 512), (91, 36, 28)).save(output_filepath)
+        return output_filepath
+
+    llm_integrator.get_gemini_response = stub_gemini_response
+    llm_integrator.generate_image_from_text = stub_generate_image
+
+
+def playwright_available():
+    """Mengembalikan True jika Playwright terpasang dan Chromium dapat diluncurkan."""
+    try:
+        from playwright.sync_api import sync_playwright
+        with sync_playwright() as p:
+            p.chromium.launch(headless=True).close()
+        return True
+    except Exception:
+        return False
+
+
+def measure(func, runs, warmup=1):
+    """
+    Menjalankan func() beberapa kali dan meringkas durasinya.
+
+    Returns:
+        dict: median/mean/min/max (detik), jumlah run, dan hasil terakhir func di 'last_result'.
+    """
+    result = None
+    for _ in range(warmup):
+        result = func()
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = func()
+        durations.append(time.perf_counter() - start)
+    return {
+        "runs": runs,
+        "median_s": round(statistics.median(durations), 6),
+        "mean_s": round(statistics.mean(durations), 6),
+        "min_s": round(min(durations), 6),
+        "max_s": round(max(durations), 6),
+        "last_result": result,
+    }
+
+
+def git_commit():
+    """Commit git saat ini (atau None jika bukan repo git)."""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_micro(epub_path, workdir, runs, renderers):
+    """
+    Benchmark mikro fungsi-fungsi inti pada satu ePub sintetis.
+
+    Returns:
+        dict: Nama benchmark -> ringkasan durasi dan ukuran kerja (halaman, chunk, karakter).
+    """
+    import epub_processor
+    import image_renderer
+    import text_renderer
+    from bs4 import BeautifulSoup
+
+    results = {}
+    extract_dir = os.path.join(workdir, "extract")
+
+    def extract():
+        shutil.rmtree(extract_dir, ignore_errors=True)
+        os.makedirs(extract_dir)
+        return epub_processor.extract_epub_content(epub_path, extract_dir)
+
+    stats = measure(extract, runs)
+    html_contents, _asset_paths = stats.pop("last_result")
+    stats["pages"] = len(html_contents)
+    results["extract_epub_content"] = stats
+
+    full_text = " ".join(BeautifulSoup(html, "html.parser").get_text(separator=" ", strip=True) for html in html_contents)
+    stats = measure(lambda: epub_processor.split_text_into_chunks(full_text, max_len=1500), runs)
+    stats["chunks"] = len(stats.pop("last_result"))
+    stats["characters"] = len(full_text)
+    results["split_text_into_chunks"] = stats
+
+    base_url = f"file:///{extract_dir.replace(os.sep, '/')}/"
+    font_path = os.path.join(REPO_ROOT, "fonts", "NotoSansArabic-Regular.ttf")
+    for renderer_name in renderers:
+        output_dir = os.path.join(workdir, f"render_{renderer_name}")
+        if renderer_name == "pillow":
+            # Hanya halaman yang didukung; halaman lain dihitung tanpa meluncurkan Chromium
+            skipped = []
+            def render():
+                shutil.rmtree(output_dir, ignore_errors=True)
+                skipped.clear()
+                return text_renderer.render_html_to_images(
+                    html_contents, output_dir, "bench", base_url=base_url, font_path=font_path,
+                    fallback=lambda html, *a, **k: skipped.extend(html) or []
+                )
+        else:
+            def render():
+                shutil.rmtree(output_dir, ignore_errors=True)
+                return image_renderer.render_html_to_images(html_contents, output_dir, "bench", base_url=base_url)
+        stats = measure(render, runs)
+        stats["images"] = len(stats.pop("last_result"))
+        if renderer_name == "pillow":
+            stats["pages_sent_to_fallback"] = len(skipped)
+        stats["pages_per_second"] = round(stats["images"] / stats["median_s"], 3) if stats["median_s"] else None
+        results[f"render_html_to_images[{renderer_name}]"] = stats
+
+    card_path = os.path.join(workdir, "llm_card.png")
+    stats = measure(lambda: image_renderer.render_llm_text_to_designed_image(STUB_LLM_RESPONSE * 3, card_path, font_path=font_path), runs)
+    stats.pop("last_result")
+    results["render_llm_text_to_designed_image"] = stats
+    return results
+
+
+def run_macro(epub_path, workdir, runs, render_pages):
+    """
+    Benchmark makro alur /upload lengkap (unggah, antrean, konversi, hasil) lewat Flask test client.
+
+    Returns:
+        dict: Ringkasan durasi end-to-end per unggahan dan durasi tiap tahapan dari run terakhir.
+    """
+    # app membuat folder uploads/ dan generated_images/ relatif terhadap direktori kerja
+    app_dir = os.path.join(workdir, "app")
+    os.makedirs(app_dir, exist_ok=True)
+    previous_cwd = os.getcwd()
+    os.chdir(app_dir)
+    try:
+        import app as flask_app
+        client = flask_app.app.test_client()
+
+        def upload():
+            with open(epub_path, "rb") as f:
+                response = client.post("/upload", data={
+                    "epub_file": (f, os.path.basename(epub_path)),
+                    "llm_prompt": "لخص هذا الكتاب في ثلاث نقاط.",
+                    "render_epub_pages": "true" if render_pages else "false",
+                }, content_type="multipart/form-data")
+            if response.status_code != 202:
+                raise RuntimeError(f"/upload gagal: {response.status_code} {response.get_data(as_text=True)}")
+            status_url = response.get_json()["status_url"]
+            deadline = time.monotonic() + UPLOAD_TIMEOUT_SECONDS
+            while time.monotonic() < deadline:
+                job = client.get(status_url).get_json()
+                if job["status"] in ("done", "failed"):
+                    if job["status"] == "failed":
+                        raise RuntimeError(f"Pekerjaan gagal: {job.get('error')}")
+                    return job["result"]
+                time.sleep(0.02)
+            raise TimeoutError("Pekerjaan /upload tidak selesai dalam batas waktu benchmark.")
+
+        stats = measure(upload, runs)
+        result = stats.pop("last_result")
+        stats["images"] = len(result["image_urls"])
+        stats["stage_timings"] = result["stage_timings"]
+        return {"upload_flow": stats}
+    finally:
+        os.chdir(previous_cwd)
+
+
+def compare(old_path, new_path):
+    """
+    Membandingkan median dua file hasil benchmark.
+
+    Returns:
+        dict: Nama benchmark -> {'old_median_s', 'new_median_s', 'change_pct'} (positif = lebih lambat).
+    """
+    with open(old_path, encoding="utf-8") as f:
+        old = json.load(f)["benchmarks"]
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)["benchmarks"]
+    comparison = {}
+    for name in sorted(set(old) & set(new)):
+        old_median, new_median = old[name]["median_s"], new[name]["median_s"]
+        comparison[name] = {
+            "old_median_s": old_median,
+            "new_median_s": new_median,
+            "change_pct": round((new_median - old_median) / old_median * 100, 2) if old_median else None,
+        }
+    return comparison
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark mikro dan makro alur konversi ePub dengan backend LLM stub.")
+    parser.add_argument("--only", choices=["micro", "macro"], help="Jalankan hanya satu jenis benchmark.")
+    parser.add_argument("--runs", type=int, default=3, help="Jumlah pengukuran per benchmark (setelah 1 pemanasan).")
+    parser.add_argument("--chapters", type=int, default=10, help="Jumlah bab ePub sintetis.")
+    parser.add_argument("--paragraphs", type=int, default=20, help="Jumlah paragraf per bab.")
+    parser.add_argument("--words", type=int, default=60, help="Jumlah kata per paragraf.")
+    parser.add_argument("--arabic-ratio", type=float, default=0.8, help="Proporsi kata Arab (0.0-1.0).")
+    parser.add_argument("--images-per-chapter", type=int, default=0, help="Jumlah gambar per bab.")
+    parser.add_argument("--css", default="simple", help="Gaya CSS ePub sintetis (none, simple, rich).")
+    parser.add_argument("--font", help="File font yang disematkan di ePub sintetis.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed generator ePub.")
+    parser.add_argument("--renderer", choices=["pillow", "playwright", "both"], default="both",
+                        help="Renderer halaman untuk benchmark mikro; Playwright dilewati jika Chromium tidak tersedia.")
+    parser.add_argument("--no-render-pages", action="store_true", help="Benchmark makro tanpa rendering halaman.")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Latensi buatan (detik) untuk stub LLM.")
+    parser.add_argument("--output", help="Simpan hasil JSON ke file ini (default: cetak ke stdout).")
+    parser.add_argument("--compare", nargs=2, metavar=("LAMA", "BARU"), help="Bandingkan dua file hasil lalu keluar.")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        print(json.dumps(compare(*args.compare), indent=2))
+        return 0
+
+    install_llm_stubs(args.llm_latency)
+    workdir = tempfile.mkdtemp(prefix="epub_bench_")
+    try:
+        epub_path = os.path.join(workdir, "synthetic.epub")
+        book = generate_epub(
+            epub_path, chapters=args.chapters, paragraphs_per_chapter=args.paragraphs, words_per_paragraph=args.words,
+            arabic_ratio=args.arabic_ratio, images_per_chapter=args.images_per_chapter, font_path=args.font,
+            css=args.css, seed=args.seed
+        )
+        book.pop("path")
+
+        results = {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "book": book,
+            "skipped": [],
+            "benchmarks": {},
+        }
+        if args.only in (None, "micro"):
+            renderers = ["pillow", "playwright"] if args.renderer == "both" else [args.renderer]
+            if "playwright" in renderers and not playwright_available():
+                renderers.remove("playwright")
+                results["skipped"].append("render_html_to_images[playwright]: Chromium tidak tersedia")
+            results["benchmarks"].update(run_micro(epub_path, workdir, args.runs, renderers))
+        if args.only in (None, "macro"):
+            results["benchmarks"].update(run_macro(epub_path, workdir, args.runs, not args.no_render_pages))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
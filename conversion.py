@@ -0,0 +1,563 @@
+# conversion.py
+# Modul ini berisi alur konversi inti ePub -> gambar + hasil AI, disusun sebagai graf
+# tahapan (stage) yang dijalankan secara konkuren oleh StagePipeline.
+
+import os # Untuk operasi path
+import logging # Untuk mencatat informasi, peringatan, dan error
+import random # Untuk memilih gambar fallback secara acak
+import re # Untuk operasi regex, digunakan dalam membersihkan prompt
+import json # Untuk membaca jawaban gabungan (mode pack_prompts)
+import contextvars # Agar span panggilan Gemini paralel tercatat di pekerjaan yang sama
+from concurrent.futures import ThreadPoolExecutor # Untuk mengirim beberapa prompt secara paralel
+
+from PIL import Image # Digunakan oleh Pillow untuk membuat gambar default jika diperlukan
+
+import epub_processor # Modul untuk ekstraksi konten ePub dan chunking teks
+import image_renderer # Modul untuk rendering gambar (halaman ePub dan gambar hasil LLM)
+import text_renderer # Renderer Pillow untuk halaman teks sederhana, dengan fallback ke Playwright
+import llm_integrator # Modul untuk berinteraksi dengan Google Gemini API dan Hugging Face API
+from stage_pipeline import StagePipeline
+import metrics # Instrumentasi span dan histogram latensi
+import admission # Batas konkurensi per tahapan mahal (browser, LLM, gambar AI, kartu)
+import prompt_compaction # Membuang boilerplate dan mengisi konteks LLM sesuai anggaran token
+import asset_optimizer # Memperkecil gambar ePub yang jauh lebih besar dari viewport sebelum dirender
+import log_setup # Logging terpusat non-blocking (antrean + JSON dengan ID pekerjaan)
+
+log_setup.configure_logging()
+
+# Pesan yang dikembalikan get_gemini_response jika model tidak menghasilkan apa pun
+NO_MODEL_RESPONSE = "Tidak ada respons yang dihasilkan dari model."
+# Pesan yang ditampilkan ke pengguna jika respons LLM kosong atau tidak valid
+NO_AI_RESPONSE = "Tidak ada respons dari AI."
+# Jumlah panggilan Gemini paralel maksimum untuk satu pekerjaan multi-prompt (di bawah batas admission LLM)
+MAX_PARALLEL_PROMPTS = 4
+# Jumlah karakter awal teks tema yang dimasukkan ke prompt generasi gambar latar belakang
+BACKGROUND_THEME_CHARS = 200
+# Latar belakang spekulatif dipakai jika sekurang-kurangnya sekian bagian kata isi tema akhir (awal respons LLM)
+# sudah muncul di potongan tema spekulatif yang dikirim ke model gambar (judul buku, prompt, dan awal chunk
+# pertama, BACKGROUND_THEME_CHARS karakter); selain itu dibuang dan dibuat ulang
+SPECULATIVE_THEME_MIN_OVERLAP = 0.25
+# Kata yang lebih pendek dari ini (kata sambung, partikel) diabaikan saat membandingkan tema
+THEME_MIN_WORD_LENGTH = 4
+THEME_WORD_PATTERN = re.compile(r"[^\W\d_]+")
+
+
+def extract_background_color_from_prompt(prompt):
+    """
+    Mengekstrak permintaan warna latar belakang dari prompt pengguna.
+
+    Args:
+        prompt (str): Prompt asli yang diberikan oleh pengguna.
+
+    Returns:
+        tuple: (modified_prompt, requested_color_rgb)
+               - modified_prompt (str): Prompt setelah permintaan warna dihapus.
+               - requested_color_rgb (tuple): Nilai RGB warna (tuple 3 int) jika ditemukan, None jika tidak.
+    """
+    # Peta warna dasar yang dikenali dari prompt ke nilai RGB
+    color_map = {
+        "merah": (255, 0, 0), "biru": (0, 0, 255), "hijau": (0, 128, 0),
+        "kuning": (255, 255, 0), "hitam": (0, 0, 0), "putih": (255, 255, 255),
+        "oranye": (255, 165, 0), "ungu": (128, 0, 128), "abu-abu": (128, 128, 128),
+        "coklat": (165, 42, 42),
+    }
+
+    prompt_lower = prompt.lower() # Konversi prompt ke huruf kecil untuk pencarian
+    found_color = None # Inisialisasi warna yang ditemukan
+
+    # Iterasi melalui peta warna untuk mencari permintaan warna dalam prompt
+    for color_name, rgb_value in color_map.items():
+        if f"background berwarna {color_name}" in prompt_lower or \
+           f"latar belakang {color_name}" in prompt_lower or \
+           f"background {color_name}" in prompt_lower:
+            found_color = rgb_value
+            logging.info(f"Permintaan warna latar belakang terdeteksi: {color_name} -> {rgb_value}")
+            break # Hentikan pencarian setelah warna pertama ditemukan
+
+    # Jika warna ditemukan, hapus frasa permintaan warna dari prompt asli
+    # Ini penting agar LLM tidak mencoba menginterpretasikan permintaan warna sebagai instruksi teks
+    if found_color:
+        for color_name in color_map.keys():
+            # Menggunakan regex untuk menghapus frasa permintaan warna (case-insensitive)
+            prompt = re.sub(r"background berwarna " + re.escape(color_name), "", prompt, flags=re.IGNORECASE).strip()
+            prompt = re.sub(r"latar belakang " + re.escape(color_name), "", prompt, flags=re.IGNORECASE).strip()
+            prompt = re.sub(r"background " + re.escape(color_name), "", prompt, flags=re.IGNORECASE).strip()
+        prompt = re.sub(r'\s+', ' ', prompt).strip() # Hapus spasi ganda yang mungkin muncul setelah penghapusan
+
+    return prompt, found_color
+
+def build_llm_prompt(context_for_llm, user_prompt):
+    """Menyusun prompt akhir untuk Gemini dari konteks ePub dan instruksi pengguna."""
+    return f"Teks dari buku ePub (bagian awal) adalah:\n\n---\n{context_for_llm}\n---\n\nBerdasarkan teks di atas, {user_prompt}\n\nJANGAN sertakan format HTML, Markdown, atau styling apapun dalam respons Anda. Hanya berikan teks murni."
+
+def build_packed_llm_prompt(context_for_llm, user_prompts):
+    """Menyusun satu prompt Gemini untuk beberapa instruksi sekaligus; jawabannya diminta sebagai array JSON."""
+    numbered = "\n".join(f"{index}. {prompt}" for index, prompt in enumerate(user_prompts, start=1))
+    return (
+        f"Teks dari buku ePub (bagian awal) adalah:\n\n---\n{context_for_llm}\n---\n\n"
+        f"Berdasarkan teks di atas, kerjakan {len(user_prompts)} instruksi berikut secara terpisah:\n{numbered}\n\n"
+        f"Kembalikan HANYA array JSON berisi tepat {len(user_prompts)} string, satu jawaban per instruksi sesuai urutannya. "
+        "Setiap jawaban berupa teks murni tanpa format HTML, Markdown, atau styling apapun."
+    )
+
+def parse_packed_llm_response(llm_response_text, expected_count):
+    """
+    Membaca jawaban Gemini untuk prompt gabungan (build_packed_llm_prompt).
+
+    Returns:
+        list: Jawaban per instruksi, atau None jika respons bukan array JSON berisi `expected_count` string.
+    """
+    text = (llm_response_text or "").strip()
+    # Gemini kadang membungkus JSON dalam blok kode Markdown
+    text = re.sub(r"^```(?:json)?\s*|\s*```$", "", text)
+    try:
+        answers = json.loads(text)
+    except ValueError:
+        return None
+    if not isinstance(answers, list) or len(answers) != expected_count or not all(isinstance(answer, str) for answer in answers):
+        return None
+    return [answer.strip() for answer in answers]
+
+def theme_terms(text):
+    """Kata isi (huruf kecil, tanpa angka, minimal THEME_MIN_WORD_LENGTH huruf) yang mewakili tema sebuah teks."""
+    return {word.lower() for word in THEME_WORD_PATTERN.findall(text or "") if len(word) >= THEME_MIN_WORD_LENGTH}
+
+def theme_overlap(speculative_theme, final_theme):
+    """
+    Mengukur seberapa besar tema akhir sudah tercakup oleh tema spekulatif.
+
+    Args:
+        speculative_theme (str): Teks yang menjadi dasar latar belakang spekulatif.
+        final_theme (str): Teks tema akhir (awal respons LLM).
+
+    Returns:
+        float: Bagian kata isi `final_theme` yang juga muncul di `speculative_theme` (0.0 - 1.0),
+               atau 1.0 jika tema akhir tidak memiliki kata isi.
+    """
+    final_terms = theme_terms(final_theme)
+    if not final_terms:
+        return 1.0
+    return len(final_terms & theme_terms(speculative_theme)) / len(final_terms)
+
+def is_valid_llm_response(llm_response_text):
+    """Mengembalikan True jika respons LLM berisi teks yang layak dirender ke gambar."""
+    return bool(llm_response_text) and llm_response_text != NO_MODEL_RESPONSE
+
+def parse_page_range(spec):
+    """
+    Membaca rentang halaman/bab seperti "1-10", "3-7", "5", "1,4,8-12", atau "20-" (sampai akhir).
+    Nomor dimulai dari 1 dan mengacu pada urutan dokumen di spine ePub (satu dokumen = satu gambar halaman).
+
+    Args:
+        spec (str): Teks rentang. Kosong/None berarti semua halaman.
+
+    Returns:
+        list: Tuple (awal, akhir) dengan akhir None untuk rentang terbuka, atau list kosong untuk semua halaman.
+
+    Raises:
+        ValueError: Jika format rentang tidak valid.
+    """
+    ranges = []
+    for part in (spec or "").replace(" ", "").split(","):
+        if not part:
+            continue
+        match = re.fullmatch(r"(\d+)(?:(-)(\d*))?", part)
+        if not match:
+            raise ValueError(f"Rentang halaman '{part}' tidak valid. Contoh: 1-10, 3-7, 1,4,8-12, atau 20-.")
+        start = int(match.group(1))
+        end = start if not match.group(2) else (int(match.group(3)) if match.group(3) else None)
+        if start < 1 or (end is not None and end < start):
+            raise ValueError(f"Rentang halaman '{part}' tidak valid: nomor dimulai dari 1 dan akhir tidak boleh lebih kecil dari awal.")
+        ranges.append((start, end))
+    return ranges
+
+def select_pages(ranges, total_pages):
+    """Mengembalikan nomor halaman (1..total_pages, urut tanpa duplikat) yang termasuk dalam rentang dari parse_page_range."""
+    if not ranges:
+        return list(range(1, total_pages + 1))
+    selected = set()
+    for start, end in ranges:
+        selected.update(range(start, min(end or total_pages, total_pages) + 1))
+    return sorted(selected)
+
+
+def convert_epub(epub_filepath, output_dir, extract_dir, clean_filename_prefix, llm_prompt="", render_epub_pages=True, font_path=None, fallback_bg_images=None, max_workers=4, progress_callback=None, page_callback=None, renderer=None, fast_text_renderer=True, page_range=None, render_preset=None, admission_controller=None, llm_prompts=None, pack_prompts=False, collect_page_text=False, context_token_budget=prompt_compaction.DEFAULT_CONTEXT_TOKEN_BUDGET, optimize_images=True, image_cache_dir=None, speculative_background=True, book_title=None):
+    """
+    Menjalankan seluruh alur konversi satu file ePub sebagai graf tahapan konkuren.
+
+    Graf tahapan:
+        extract -> optimize_assets -> render_pages   (Pillow untuk halaman teks sederhana, selebihnya Playwright)
+        extract -> page_text -> text_chunks -> llm -> ai_background -> llm_card
+                                   text_chunks -> ai_background_speculative -> ai_background
+    atau, untuk beberapa prompt sekaligus (llm_prompts):
+        extract -> page_text -> text_chunks -> llm_batch -> ai_background -> llm_cards
+    Rendering halaman ePub tidak bergantung pada teks maupun LLM, sehingga berjalan
+    tumpang tindih dengan ekstraksi teks, panggilan Gemini, dan generasi latar belakang.
+    ROUGE Score tidak dihitung di sini, melainkan oleh rouge_evaluator di latar belakang.
+
+    Args:
+        epub_filepath (str): Path ke file ePub yang akan diproses.
+        output_dir (str): Direktori output untuk semua gambar yang dihasilkan.
+        extract_dir (str): Direktori sementara untuk aset ePub yang diekstrak (base_url Playwright).
+        clean_filename_prefix (str): Prefix nama file yang aman untuk gambar output.
+        llm_prompt (str): Prompt asli pengguna. Jika kosong, tahapan LLM dilewati.
+        render_epub_pages (bool): Apakah halaman ePub asli dirender menjadi gambar.
+        font_path (str, optional): Path font untuk gambar hasil LLM (Pillow).
+        fallback_bg_images (list, optional): Daftar path gambar latar belakang fallback.
+        max_workers (int): Jumlah thread maksimum untuk menjalankan tahapan.
+        progress_callback (callable, optional): Dipanggil sebagai
+            progress_callback(stage_name, stage_result, completed_count, total_count)
+            setiap kali sebuah tahapan selesai, untuk melaporkan progres dan hasil parsial.
+        page_callback (callable, optional): Diteruskan ke render_html_to_images sebagai
+            on_page_rendered(page_number, image_path) untuk setiap gambar halaman yang selesai.
+        renderer (callable, optional): Pengganti image_renderer.render_html_to_images dengan signature
+            yang sama, misalnya SharedBrowser().render_html_to_images untuk memakai ulang satu browser.
+        fast_text_renderer (bool): Render halaman teks sederhana dengan Pillow (text_renderer) dan hanya
+            meneruskan halaman yang tidak didukung ke `renderer`/Playwright. False untuk selalu memakai Playwright.
+        page_range (str, optional): Rentang halaman/bab yang dirender (lihat parse_page_range). None untuk semua.
+            Gambar tetap diberi nama sesuai nomor halaman aslinya. Teks untuk LLM tetap diambil dari seluruh buku.
+        render_preset (str, optional): Preset viewport (image_renderer.RENDER_PRESETS), misalnya 'mobile' atau 'print'.
+        admission_controller (admission.AdmissionController, optional): Membatasi konkurensi render Chromium,
+            panggilan Gemini, generasi gambar AI, dan render kartu LLM antar pekerjaan. None untuk tanpa batas.
+        llm_prompts (list, optional): Beberapa prompt untuk buku yang sama (menggantikan llm_prompt). Ekstraksi
+            dan chunking dilakukan sekali, prompt dikirim ke Gemini secara paralel, satu latar belakang AI dipakai
+            bersama, dan kartu hasil setiap jawaban dirender dalam satu putaran.
+        pack_prompts (bool): Dengan llm_prompts, kirim semua prompt dalam satu permintaan Gemini yang meminta
+            jawaban berupa array JSON. Jika jawabannya tidak dapat dibaca, prompt dikirim satu per satu.
+        collect_page_text (bool): Kembalikan teks per halaman (untuk indeks pencarian) meskipun tanpa prompt LLM.
+        context_token_budget (int): Anggaran token (perkiraan lokal) untuk konteks buku di prompt Gemini.
+            Boilerplate (header/footer berulang, nomor halaman, daftar isi) dibuang sebelum konteks diisi.
+        optimize_images (bool): Perkecil gambar ePub yang jauh lebih lebar dari viewport preset sebelum dirender
+            (file ditimpa di extract_dir dengan path yang sama, sehingga HTML tidak berubah).
+        image_cache_dir (str, optional): Folder cache gambar yang sudah diperkecil, berdasarkan hash konten.
+        speculative_background (bool): Dengan llm_prompt, mulai generasi latar belakang AI segera setelah chunk
+            teks tersedia (tema dari judul buku, prompt, dan chunk pertama), bersamaan dengan panggilan Gemini.
+            Hasilnya dibuang dan latar belakang dibuat ulang hanya jika tema respons LLM berbeda jauh
+            (lihat SPECULATIVE_THEME_MIN_OVERLAP).
+        book_title (str, optional): Judul buku untuk tema latar belakang spekulatif (default clean_filename_prefix).
+
+    Returns:
+        dict: Hasil konversi dengan kunci 'image_paths', 'llm_response_text', 'llm_image_path',
+              'num_epub_pages', 'num_chunks', dan 'stage_timings'. Dengan llm_prompts, ditambah 'llm_results':
+              list dict berisi 'prompt', 'response_text', dan 'image_path' per prompt. Dengan collect_page_text,
+              ditambah 'page_text': list dict per halaman ePub berisi 'page', 'chapter', dan 'strings'.
+              Jika LLM dipanggil, ditambah 'prompt_compaction': statistik pemadatan konteks, termasuk
+              'context_tokens' dan 'tokens_saved'. Jika ada gambar yang diperiksa, ditambah 'asset_optimization':
+              statistik dari asset_optimizer.optimize_images. Jika latar belakang spekulatif dibandingkan
+              dengan respons LLM, ditambah 'speculative_background': dict berisi 'outcome' ('used' atau
+              'discarded') dan 'theme_overlap'.
+    """
+    fallback_bg_images = fallback_bg_images or []
+    page_ranges = parse_page_range(page_range) # Validasi sebelum tahapan apa pun dijalankan
+    viewport = image_renderer.get_render_preset(render_preset)
+    pipeline = StagePipeline(max_workers=max_workers)
+
+    def limited(stage_name, func):
+        # Jalankan func di dalam slot tahapan (menunggu jika batas konkurensi tercapai)
+        if admission_controller is None:
+            return func
+        return admission_controller.limiter(stage_name).wrap(func)
+
+    # Path aset yang diekstrak, diisi oleh tahapan extract untuk optimize_assets
+    extracted_asset_paths = []
+
+    # --- Tahap: Ekstraksi Konten ePub (HTML, CSS, Gambar Internal) ---
+    def stage_extract(_):
+        logging.info(f"Mulai mengekstrak konten dari '{epub_filepath}' ke '{extract_dir}'...")
+        html_contents, asset_paths = epub_processor.extract_epub_content(epub_filepath, extract_dir)
+        if not html_contents:
+            logging.warning(f"Tidak ada konten HTML yang diekstrak dari '{epub_filepath}'.")
+            raise ValueError("Tidak ada konten yang dapat diekstrak dari ePub ini.")
+        extracted_asset_paths.extend(asset_paths)
+        return html_contents
+
+    # --- Tahap: Optimasi Aset (gambar raksasa diperkecil ke lebar viewport sebelum Chromium mendekodenya) ---
+    def stage_optimize_assets(_):
+        if not render_epub_pages or not optimize_images:
+            return None
+        max_width = asset_optimizer.target_width_for_preset(viewport)
+        stats = asset_optimizer.optimize_images(extracted_asset_paths, max_width, cache_dir=image_cache_dir)
+        if stats["images_downscaled"]:
+            logging.info(f"{stats['images_downscaled']} dari {stats['images_checked']} gambar diperkecil ({stats['bytes_before'] / (1024 * 1024):.1f} MB -> {stats['bytes_after'] / (1024 * 1024):.1f} MB, {stats['cache_hits']} dari cache).")
+        return stats
+
+    # --- Tahap: Rendering Gambar Konten ePub Asli (Menggunakan Playwright) ---
+    def stage_render_pages(results):
+        html_contents = results['extract']
+        if not render_epub_pages:
+            logging.info("Rendering gambar halaman ePub asli dilewati sesuai permintaan pengguna.")
+            return []
+        page_numbers = select_pages(page_ranges, len(html_contents))
+        if not page_numbers:
+            logging.warning(f"Rentang halaman '{page_range}' di luar jumlah halaman ePub ({len(html_contents)}); tidak ada halaman yang dirender.")
+            return []
+        logging.info(f"Mulai merender {len(page_numbers)} dari {len(html_contents)} bagian HTML menjadi gambar (preset {render_preset or image_renderer.DEFAULT_RENDER_PRESET})...")
+        # Hanya render dengan Chromium yang dibatasi; halaman yang digambar Pillow tidak memakai slot browser
+        render_html_to_images = limited(admission.STAGE_BROWSER, renderer or image_renderer.render_html_to_images)
+        extra_kwargs = {}
+        if fast_text_renderer:
+            # Halaman sederhana digambar langsung dengan Pillow; sisanya diteruskan ke renderer Playwright
+            extra_kwargs = {"fallback": render_html_to_images, "font_path": font_path}
+            render_html_to_images = text_renderer.render_html_to_images
+        return render_html_to_images(
+            [html_contents[page_number - 1] for page_number in page_numbers],
+            output_dir,
+            clean_filename_prefix,
+            base_url=f"file:///{extract_dir.replace(os.sep, '/')}/", # base_url untuk Playwright
+            on_page_rendered=page_callback,
+            page_numbers=page_numbers,
+            preset=render_preset,
+            **extra_kwargs
+        )
+
+    pipeline.add_stage('extract', stage_extract)
+    pipeline.add_stage('optimize_assets', stage_optimize_assets, depends_on=['extract'])
+    pipeline.add_stage('render_pages', stage_render_pages, depends_on=['extract', 'optimize_assets'])
+
+    # --- Tahap: Teks per Halaman (sekali per buku, dipakai LLM dan indeks pencarian) ---
+    def stage_page_text(results):
+        from bs4 import BeautifulSoup # Diimpor lazy: membersihkan teks HTML dari ePub sebelum dikirim ke LLM
+        pages = []
+        with metrics.span("conversion.beautifulsoup_text"):
+            for page_number, html in enumerate(results['extract'], start=1):
+                soup = BeautifulSoup(html, 'html.parser')
+                heading = soup.find(['h1', 'h2', 'h3']) or soup.title
+                pages.append({
+                    "page": page_number,
+                    "chapter": (heading.get_text(' ', strip=True) or None) if heading else None,
+                    "strings": list(soup.stripped_strings),
+                })
+        return pages
+
+    # Statistik pemadatan konteks, diisi oleh text_chunks dan select_llm_context
+    compaction_stats = {}
+    # (offset awal di teks gabungan, token boilerplate yang dibuang) per halaman
+    page_removed_tokens = []
+    # Hasil perbandingan tema latar belakang spekulatif, diisi oleh tahapan ai_background
+    speculative_stats = {}
+
+    # --- Tahap: Chunking Teks (sekali per buku, dipakai semua prompt) ---
+    def stage_text_chunks(results):
+        with metrics.span("conversion.strip_boilerplate"):
+            cleaned_pages, removed_tokens, boilerplate_stats = prompt_compaction.strip_boilerplate(results['page_text'])
+        compaction_stats.update(boilerplate_stats)
+        offset = 0
+        for page_text, tokens in zip(cleaned_pages, removed_tokens):
+            page_removed_tokens.append((offset, tokens))
+            if page_text:
+                offset += len(page_text) + 1
+        full_epub_text = " ".join(page_text for page_text in cleaned_pages if page_text)
+        chunks = epub_processor.split_text_into_chunks(full_epub_text, max_len=1500)
+        logging.info(f"Teks ePub dipecah menjadi {len(chunks)} chunk ({boilerplate_stats['boilerplate_lines_removed']} baris boilerplate dan {boilerplate_stats['toc_documents_removed']} dokumen daftar isi dibuang).")
+        return chunks
+
+    def select_llm_context(chunks):
+        # Pemilihan konteks (RAG dasar): chunk awal buku sampai anggaran token terpenuhi
+        context, context_tokens, chunks_used, chars_used = prompt_compaction.fill_token_budget(chunks, context_token_budget)
+        # Token yang dihemat: boilerplate yang dibuang dari halaman yang tercakup konteks
+        tokens_saved = sum(tokens for start, tokens in page_removed_tokens if start < chars_used)
+        compaction_stats.update(token_budget=context_token_budget, context_tokens=context_tokens, chunks_used=chunks_used, tokens_saved=tokens_saved)
+        logging.info(f"Menggunakan {chunks_used} chunk (~{context_tokens} token dari anggaran {context_token_budget}, ~{tokens_saved} token boilerplate dihemat) sebagai konteks untuk LLM.")
+        return context
+
+    def background_theme_snippet(theme_text):
+        # Bagian teks tema yang benar-benar masuk ke prompt generasi gambar
+        return theme_text[:BACKGROUND_THEME_CHARS].replace('\n', ' ')
+
+    def generate_background(theme_text, image_name="ai_bg"):
+        # Latar belakang AI bertema respons LLM, atau gambar fallback jika generasi gagal
+        theme_snippet = background_theme_snippet(theme_text)
+        image_gen_prompt = f"Minimalist abstract background, simple elegant shapes, soft warm colors, digital art. Related to the theme of: '{theme_snippet}' --v 5.2 --style raw"
+        ai_image_full_path = os.path.join(output_dir, f"{clean_filename_prefix}_{image_name}.png")
+
+        logging.info(f"Mulai generasi gambar AI untuk latar belakang: '{image_gen_prompt[:100]}...'")
+        generated_ai_background_path = limited(admission.STAGE_IMAGE_GENERATION, llm_integrator.generate_image_from_text)(image_gen_prompt, ai_image_full_path)
+
+        if not generated_ai_background_path:
+            logging.warning("Gagal generate gambar AI. Mencoba menggunakan gambar latar belakang fallback yang sudah didesain.")
+            if fallback_bg_images:
+                generated_ai_background_path = random.choice(fallback_bg_images)
+                logging.info(f"Menggunakan gambar fallback: {os.path.basename(generated_ai_background_path)}")
+            else:
+                logging.warning("Tidak ada gambar latar belakang fallback yang ditemukan. Membuat gambar default polos.")
+                generated_ai_background_path = os.path.join(output_dir, "default_plain_bg.png")
+                Image.new('RGB', (800, 400), (240, 240, 240)).save(generated_ai_background_path)
+        return generated_ai_background_path
+
+    if llm_prompt or llm_prompts or collect_page_text:
+        pipeline.add_stage('page_text', stage_page_text, depends_on=['extract'])
+
+    if llm_prompts:
+        # Setiap prompt boleh meminta warna latar belakangnya sendiri
+        batch_prompts = [extract_background_color_from_prompt(prompt) for prompt in llm_prompts]
+
+        # --- Tahap: Semua Prompt ke Gemini (paralel atau satu permintaan gabungan) ---
+        def stage_llm_batch(results):
+            context_for_llm = select_llm_context(results['text_chunks'])
+            cleaned_prompts = [cleaned for cleaned, _color in batch_prompts]
+            ask_gemini = limited(admission.STAGE_LLM, llm_integrator.get_gemini_response)
+            if pack_prompts and len(cleaned_prompts) > 1:
+                logging.info(f"Mengirim {len(cleaned_prompts)} prompt dalam satu permintaan Gemini.")
+                answers = parse_packed_llm_response(ask_gemini(build_packed_llm_prompt(context_for_llm, cleaned_prompts)), len(cleaned_prompts))
+                if answers is not None:
+                    return answers
+                logging.warning("Jawaban gabungan Gemini tidak dapat dibaca sebagai array JSON. Mengirim prompt satu per satu.")
+
+            logging.info(f"Mengirim {len(cleaned_prompts)} prompt ke Gemini secara paralel.")
+            with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_PROMPTS, len(cleaned_prompts)), thread_name_prefix="llm-batch") as executor:
+                futures = [
+                    executor.submit(contextvars.copy_context().run, ask_gemini, build_llm_prompt(context_for_llm, prompt))
+                    for prompt in cleaned_prompts
+                ]
+                return [future.result() for future in futures]
+
+        # --- Tahap: Satu Latar Belakang AI untuk Semua Kartu ---
+        def stage_batch_background(results):
+            if all(color for _prompt, color in batch_prompts):
+                logging.info("Semua prompt meminta warna latar belakang spesifik. Melewatkan generasi gambar AI.")
+                return None
+            theme_text = next((answer for answer in results['llm_batch'] if is_valid_llm_response(answer)), "")
+            return generate_background(theme_text)
+
+        # --- Tahap: Render Kartu Semua Jawaban dalam Satu Putaran ---
+        def stage_llm_cards(results):
+            cards = []
+            for index, ((_prompt, color), answer) in enumerate(zip(batch_prompts, results['llm_batch']), start=1):
+                if is_valid_llm_response(answer):
+                    cards.append((answer, os.path.join(output_dir, f"{clean_filename_prefix}_llm_result_{index}.png"), color))
+                else:
+                    cards.append(None)
+            logging.info(f"Merender {sum(1 for card in cards if card)} kartu hasil LLM.")
+            rendered = iter(limited(admission.STAGE_CARD, image_renderer.render_llm_cards)(
+                [card for card in cards if card],
+                font_path=font_path,
+                ai_background_path=results['ai_background']
+            ))
+            return [next(rendered) if card else None for card in cards]
+
+        pipeline.add_stage('text_chunks', stage_text_chunks, depends_on=['page_text'])
+        pipeline.add_stage('llm_batch', stage_llm_batch, depends_on=['text_chunks'])
+        pipeline.add_stage('ai_background', stage_batch_background, depends_on=['llm_batch'])
+        pipeline.add_stage('llm_cards', stage_llm_cards, depends_on=['llm_batch', 'ai_background'])
+
+    elif llm_prompt:
+        # Ekstrak permintaan warna latar belakang dari prompt asli pengguna
+        llm_prompt_cleaned_for_llm, requested_bg_color_rgb = extract_background_color_from_prompt(llm_prompt)
+
+        # --- Tahap: Pemilihan Konteks (RAG Dasar) dan Panggilan Gemini ---
+        def stage_llm(results):
+            context_for_llm = select_llm_context(results['text_chunks'])
+
+            logging.info(f"Mulai memproses prompt LLM: '{llm_prompt_cleaned_for_llm}'")
+            llm_response_text = limited(admission.STAGE_LLM, llm_integrator.get_gemini_response)(build_llm_prompt(context_for_llm, llm_prompt_cleaned_for_llm))
+            logging.info(f"Respons LLM diterima: {llm_response_text[:100]}...")
+            return llm_response_text
+
+        # Warna latar belakang yang diminta menggantikan gambar AI, sehingga tidak ada yang perlu dispekulasikan
+        speculate_background = speculative_background and not requested_bg_color_rgb
+        speculative_background_path = os.path.join(output_dir, f"{clean_filename_prefix}_ai_bg_speculative.png")
+
+        # --- Tahap: Latar Belakang AI Spekulatif (berjalan bersamaan dengan panggilan Gemini) ---
+        def stage_ai_background_speculative(results):
+            chunks = results['text_chunks']
+            theme_text = f"{book_title or clean_filename_prefix}. {llm_prompt_cleaned_for_llm}. {chunks[0] if chunks else ''}"
+            logging.info("Memulai generasi latar belakang AI secara spekulatif sebelum respons LLM diterima.")
+            # Kembalikan potongan yang dikirim ke model gambar (bukan seluruh chunk) sebagai pembanding tema
+            return background_theme_snippet(theme_text), generate_background(theme_text, image_name="ai_bg_speculative")
+
+        def discard_speculative_background(path):
+            # Gambar fallback bersama tidak dihapus; hanya gambar yang dibuat untuk spekulasi ini
+            if path == speculative_background_path and os.path.exists(path):
+                os.remove(path)
+
+        # --- Tahap: Generasi Gambar AI (Latar Belakang) atau Fallback ---
+        def stage_ai_background(results):
+            if requested_bg_color_rgb: # Hanya coba generate AI jika tidak ada warna spesifik yang diminta
+                logging.info(f"Warna latar belakang spesifik diminta ({requested_bg_color_rgb}). Melewatkan generasi gambar AI.")
+                return None
+            if not speculate_background:
+                return generate_background(results['llm'])
+
+            speculative_theme, speculative_path = results['ai_background_speculative']
+            llm_response_text = results['llm']
+            if not is_valid_llm_response(llm_response_text):
+                # Kartu hasil LLM tidak dirender, sehingga latar belakang tidak dipakai
+                speculative_stats.update(outcome="discarded", theme_overlap=None)
+                discard_speculative_background(speculative_path)
+                return None
+            overlap = theme_overlap(speculative_theme, background_theme_snippet(llm_response_text))
+            if overlap >= SPECULATIVE_THEME_MIN_OVERLAP:
+                speculative_stats.update(outcome="used", theme_overlap=round(overlap, 3))
+                logging.info(f"Latar belakang AI spekulatif dipakai (kesamaan tema {overlap:.2f}).")
+                return speculative_path
+            speculative_stats.update(outcome="discarded", theme_overlap=round(overlap, 3))
+            logging.info(f"Tema respons LLM berbeda dari tema spekulatif (kesamaan {overlap:.2f} < {SPECULATIVE_THEME_MIN_OVERLAP}). Membuat ulang latar belakang AI.")
+            discard_speculative_background(speculative_path)
+            return generate_background(llm_response_text)
+
+        # --- Tahap: Render Respons LLM ke Gambar yang Didesain dengan Pillow ---
+        def stage_llm_card(results):
+            llm_response_text = results['llm']
+            if not is_valid_llm_response(llm_response_text):
+                logging.warning("Respons LLM kosong atau tidak valid, tidak merender gambar hasil LLM.")
+                return None
+
+            llm_image_full_path = os.path.join(output_dir, f"{clean_filename_prefix}_llm_result.png")
+            logging.info(f"Merender respons LLM ke gambar yang didesain: '{os.path.basename(llm_image_full_path)}'")
+            rendered_llm_image_path = limited(admission.STAGE_CARD, image_renderer.render_llm_text_to_designed_image)(
+                llm_response_text,
+                llm_image_full_path,
+                font_path=font_path,
+                ai_background_path=results['ai_background'],
+                requested_bg_color=requested_bg_color_rgb
+            )
+            if not rendered_llm_image_path:
+                logging.error("Gagal merender gambar hasil LLM dengan Pillow.")
+            return rendered_llm_image_path
+
+        pipeline.add_stage('text_chunks', stage_text_chunks, depends_on=['page_text'])
+        pipeline.add_stage('llm', stage_llm, depends_on=['text_chunks'])
+        if speculate_background:
+            pipeline.add_stage('ai_background_speculative', stage_ai_background_speculative, depends_on=['text_chunks'])
+            pipeline.add_stage('ai_background', stage_ai_background, depends_on=['llm', 'ai_background_speculative'])
+        else:
+            pipeline.add_stage('ai_background', stage_ai_background, depends_on=['llm'])
+        pipeline.add_stage('llm_card', stage_llm_card, depends_on=['llm', 'ai_background'])
+
+    completed_stages = []
+
+    def on_stage_complete(name, result):
+        completed_stages.append(name)
+        if progress_callback:
+            progress_callback(name, result, len(completed_stages), len(pipeline))
+
+    results, stage_timings = pipeline.run(on_stage_complete=on_stage_complete)
+
+    llm_response_text = results.get('llm', "N/A")
+    if llm_prompt and not is_valid_llm_response(llm_response_text):
+        llm_response_text = NO_AI_RESPONSE
+
+    conversion_result = {
+        "image_paths": results['render_pages'],
+        "llm_response_text": llm_response_text,
+        "llm_image_path": results.get('llm_card'),
+        "num_epub_pages": len(results['extract']),
+        "num_chunks": len(results.get('text_chunks', [])),
+        "stage_timings": stage_timings,
+    }
+    if collect_page_text:
+        conversion_result["page_text"] = results['page_text']
+    if results.get('optimize_assets') and results['optimize_assets']["images_checked"]:
+        conversion_result["asset_optimization"] = results['optimize_assets']
+    if "context_tokens" in compaction_stats:
+        conversion_result["prompt_compaction"] = dict(compaction_stats)
+    if speculative_stats:
+        conversion_result["speculative_background"] = dict(speculative_stats)
+    if llm_prompts:
+        conversion_result["llm_results"] = [
+            {"prompt": prompt, "response_text": answer if is_valid_llm_response(answer) else NO_AI_RESPONSE, "image_path": image_path}
+            for prompt, answer, image_path in zip(llm_prompts, results['llm_batch'], results['llm_cards'])
+        ]
+        # Ringkasan gabungan untuk log kinerja dan klien lama yang hanya membaca llm_response_text
+        conversion_result["llm_response_text"] = "\n\n".join(f"{index}. {item['response_text']}" for index, item in enumerate(conversion_result["llm_results"], start=1))
+    return conversion_result
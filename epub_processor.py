@@ -1,20 +1,22 @@
 # epub_processor.py
+# ebooklib dan BeautifulSoup diimpor secara lazy di dalam fungsi yang memakainya.
 
-import ebooklib
-from ebooklib import epub
-from bs4 import BeautifulSoup
 import logging
 import os
 import re 
 import shutil 
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+import metrics # Instrumentasi span dan histogram latensi
+import log_setup # Logging terpusat non-blocking (antrean + JSON dengan ID pekerjaan)
+
+log_setup.configure_logging()
 
 def clean_filename(filename):
     """Membersihkan string untuk digunakan sebagai nama file yang aman."""
     cleaned_filename = re.sub(r'[\\/:*?"<>|]', '', filename)
     return cleaned_filename.replace(' ', '_')[:100]
 
+@metrics.timed("epub_processor.split_text_into_chunks")
 def split_text_into_chunks(text, max_len=2000): 
     """
     Membagi teks menjadi potongan-potongan (chunks) berdasarkan panjang maksimum.
@@ -34,6 +36,7 @@ def split_text_into_chunks(text, max_len=2000):
         chunks.append(current_text.strip())
     return chunks
 
+@metrics.timed("epub_processor.extract_epub_content")
 def extract_epub_content(epub_filepath, temp_extract_dir):
     """
     Mengekstrak konten HTML, CSS, dan gambar dari file ePub.
@@ -55,6 +58,9 @@ def extract_epub_content(epub_filepath, temp_extract_dir):
         os.makedirs(temp_extract_dir, exist_ok=True)
         logging.info(f"Direktori ekstraksi sementara '{temp_extract_dir}' dibuat.")
 
+    import ebooklib # Diimpor lazy: ebooklib menarik lxml
+    from ebooklib import epub
+
     try:
         book = epub.read_epub(epub_filepath)
         logging.info(f"Berhasil membaca file ePub: {epub_filepath}")
@@ -71,12 +77,13 @@ def extract_epub_content(epub_filepath, temp_extract_dir):
                     with open(asset_target_path, 'wb') as f:
                         f.write(item.get_content())
                     local_asset_paths.append(asset_target_path)
-                    logging.info(f"Aset diekstrak: '{asset_target_path}' dari '{item.get_name()}'")
+                    # Log per item hanya di level DEBUG; ringkasan dicatat sekali setelah ekstraksi
+                    logging.debug(f"Aset diekstrak: '{asset_target_path}' dari '{item.get_name()}'")
 
                     # Jika ini adalah dokumen HTML, tambahkan ke daftar raw_html_contents
                     if item.get_type() == ebooklib.ITEM_DOCUMENT:
                         raw_html_contents.append(item.get_content().decode('utf-8')) # Pastikan jadi string
-                        logging.info(f"HTML Mentah diekstrak dari item: {item.get_name()}")
+                        logging.debug(f"HTML Mentah diekstrak dari item: {item.get_name()}")
 
                 except Exception as e:
                     logging.warning(f"Gagal mengekstrak aset '{item.get_name()}' ke '{asset_target_path}': {e}")
@@ -84,8 +91,9 @@ def extract_epub_content(epub_filepath, temp_extract_dir):
             # Ini penting jika ada HTML yang tidak memiliki tipe STYLE/IMAGE/FONT/COVER
             elif item.get_type() == ebooklib.ITEM_DOCUMENT and item.get_name() not in [os.path.basename(p) for p in local_asset_paths]:
                 raw_html_contents.append(item.get_content().decode('utf-8'))
-                logging.info(f"HTML Mentah diekstrak dari item: {item.get_name()} (dari fallback)")
+                logging.debug(f"HTML Mentah diekstrak dari item: {item.get_name()} (dari fallback)")
                     
+        logging.info(f"{len(local_asset_paths)} aset diekstrak ({len(raw_html_contents)} dokumen HTML) dari '{epub_filepath}'.")
         if not raw_html_contents:
             logging.warning(f"Tidak ada konten HTML yang dapat diekstrak dari ePub: {epub_filepath}")
 
@@ -100,6 +108,8 @@ def extract_epub_content(epub_filepath, temp_extract_dir):
 
 # Contoh penggunaan (untuk pengujian)
 if __name__ == '__main__':
+    from bs4 import BeautifulSoup
+
     test_upload_dir = 'uploads' 
     test_extract_base_dir = 'temp_epub_extracts_test' 
 
@@ -0,0 +1,19 @@
+# gunicorn.conf.py
+# Konfigurasi gunicorn untuk menjalankan aplikasi di produksi:
+#   gunicorn -c gunicorn.conf.py app:app
+#
+# Dengan GUNICORN_PRELOAD=1, aplikasi diimpor sekali di proses master sebelum worker di-fork,
+# sehingga kode dan modul yang sudah dimuat dibagi antar worker melalui copy-on-write.
+# Tambahkan PRELOAD_HEAVY_MODULES=1 agar dependensi berat (Gemini SDK, Playwright, BeautifulSoup,
+# ebooklib, rouge_score, openpyxl) juga ikut dimuat di master. Worker latar belakang (job queue,
+# evaluator ROUGE, eviction output) tetap dijalankan di setiap worker setelah fork, pada request pertama.
+
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.getenv("GUNICORN_WORKERS", "2"))
+# Worker berbasis thread agar koneksi SSE (/jobs/<job_id>/events) yang panjang tidak memblokir request lain
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+preload_app = os.getenv("GUNICORN_PRELOAD", "0") == "1"
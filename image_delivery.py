@@ -0,0 +1,188 @@
+# image_delivery.py
+# Modul ini melayani gambar hasil konversi dengan URL ber-hash konten, header cache jangka panjang,
+# ETag kuat, dan dukungan Range. Pengiriman file juga dapat diserahkan ke web server di depan
+# aplikasi (X-Sendfile untuk Apache/lighttpd, X-Accel-Redirect untuk nginx) agar worker Python
+# tidak perlu mengalirkan byte gambar sendiri. Seluruh gambar satu buku juga dapat diunduh sebagai
+# arsip ZIP/CBZ yang dibuat secara streaming.
+
+import os # Untuk operasi path dan stat file
+import re # Untuk membaca nomor halaman dari nama file
+import zipfile # Untuk membuat arsip ZIP/CBZ secara streaming
+import hashlib # Untuk menghitung hash konten gambar
+import logging # Untuk mencatat informasi, peringatan, dan error
+import functools # Untuk cache hash konten
+import mimetypes # Untuk menentukan Content-Type saat pengiriman diserahkan ke web server
+
+from flask import Response, request, send_file
+import log_setup # Logging terpusat non-blocking (antrean + JSON dengan ID pekerjaan)
+
+log_setup.configure_logging()
+
+# Panjang hash konten (heksadesimal) yang dipakai di URL dan ETag
+CONTENT_HASH_LENGTH = 16
+# Umur cache untuk URL ber-hash konten (1 tahun); konten di URL tersebut tidak pernah berubah
+IMMUTABLE_MAX_AGE = 31536000
+
+# Mode pengiriman file yang didukung
+SENDFILE_NONE = ""
+SENDFILE_X_SENDFILE = "x-sendfile"
+SENDFILE_X_ACCEL = "x-accel-redirect"
+SENDFILE_MODES = (SENDFILE_NONE, SENDFILE_X_SENDFILE, SENDFILE_X_ACCEL)
+
+# Ekstensi gambar yang dimasukkan ke arsip dan ukuran chunk saat menyalin isi file ke arsip
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.webp')
+ARCHIVE_CHUNK_SIZE = 64 * 1024
+# Nama file halaman yang dihasilkan render_html_to_images: <prefix>_page_<nomor>.<ext>
+PAGE_FILENAME_PATTERN = re.compile(r"_page_(\d+)\.[^.]+$")
+
+
+@functools.lru_cache(maxsize=4096)
+def _hash_file(path, mtime_ns, size):
+    # mtime dan ukuran ikut menjadi kunci cache sehingga file yang ditimpa akan di-hash ulang
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()[:CONTENT_HASH_LENGTH]
+
+
+def content_hash(path):
+    """
+    Mengembalikan hash konten file (di-cache berdasarkan path, mtime, dan ukuran).
+
+    Args:
+        path (str): Path file gambar.
+
+    Returns:
+        str: Hash heksadesimal sepanjang CONTENT_HASH_LENGTH.
+    """
+    stat = os.stat(path)
+    return _hash_file(os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+
+def send_image(full_path, relative_path, requested_hash=None, sendfile_mode=SENDFILE_NONE, x_accel_prefix="/protected_generated_images/"):
+    """
+    Membuat respons untuk satu file gambar hasil konversi.
+
+    URL dengan hash konten yang cocok dilayani dengan `Cache-Control: public, max-age=<1 tahun>, immutable`.
+    URL tanpa hash (atau dengan hash lama) dilayani dengan `no-cache`, sehingga browser cukup
+    melakukan revalidasi dengan ETag dan menerima 304 jika gambar tidak berubah.
+
+    Args:
+        full_path (str): Path lengkap file di disk (sudah divalidasi berada di folder gambar).
+        relative_path (str): Path relatif terhadap folder gambar, untuk X-Accel-Redirect.
+        requested_hash (str, optional): Hash konten dari URL.
+        sendfile_mode (str): Salah satu SENDFILE_MODES.
+        x_accel_prefix (str): Prefix lokasi internal nginx untuk X-Accel-Redirect.
+
+    Returns:
+        flask.Response: Respons 200/206/304 dengan header cache, ETag kuat, dan Accept-Ranges.
+    """
+    file_hash = content_hash(full_path)
+    immutable = requested_hash is not None and requested_hash == file_hash
+
+    if sendfile_mode == SENDFILE_NONE:
+        # send_file menangani If-None-Match, If-Range, dan Range (206) secara otomatis
+        response = send_file(full_path, etag=file_hash, conditional=True, max_age=None)
+        response.accept_ranges = 'bytes'
+    else:
+        # Web server di depan aplikasi yang membaca file dan menangani Range; worker hanya mengirim header
+        response = Response(mimetype=mimetypes.guess_type(full_path)[0] or 'application/octet-stream')
+        if sendfile_mode == SENDFILE_X_ACCEL:
+            response.headers['X-Accel-Redirect'] = x_accel_prefix.rstrip('/') + '/' + relative_path.lstrip('/')
+        else:
+            response.headers['X-Sendfile'] = os.path.abspath(full_path)
+        response.set_etag(file_hash)
+        response.make_conditional(request)
+
+    if immutable:
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
+
+
+def list_archive_entries(image_dir, pages_only=False):
+    """
+    Menyusun daftar isi arsip untuk satu folder output: halaman ePub berurutan sesuai nomor halaman,
+    diikuti gambar lain (misalnya kartu hasil LLM) berdasarkan nama file.
+
+    Args:
+        image_dir (str): Folder output satu pekerjaan.
+        pages_only (bool): True untuk hanya memasukkan gambar halaman (dipakai untuk CBZ).
+
+    Returns:
+        list: Tuple (path lengkap, nama entri di arsip).
+    """
+    pages = []
+    others = []
+    for filename in os.listdir(image_dir):
+        if not filename.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        match = PAGE_FILENAME_PATTERN.search(filename)
+        if match:
+            pages.append((int(match.group(1)), filename))
+        elif not pages_only:
+            others.append(filename)
+
+    entries = []
+    for page_number, filename in sorted(pages):
+        # Nomor halaman diberi nol di depan agar pembaca komik mengurutkan halaman dengan benar
+        extension = os.path.splitext(filename)[1].lower()
+        entries.append((os.path.join(image_dir, filename), f"page_{page_number:04d}{extension}"))
+    entries.extend((os.path.join(image_dir, filename), filename) for filename in sorted(others))
+    return entries
+
+
+class _StreamBuffer:
+    """Objek tulis tanpa seek untuk zipfile; byte yang ditulis diambil (dan dikosongkan) oleh generator."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_archive(entries):
+    """
+    Menghasilkan arsip ZIP secara streaming, tanpa file sementara di disk.
+
+    Gambar PNG/JPEG sudah terkompresi, sehingga entri disimpan tanpa kompresi (ZIP_STORED).
+    Karena output tidak dapat di-seek, zipfile menulis ukuran dan CRC setiap entri di data
+    descriptor setelah isinya. Pemakaian memori konstan: paling banyak satu chunk per entri.
+
+    Args:
+        entries (list): Tuple (path lengkap, nama entri) dari list_archive_entries.
+
+    Yields:
+        bytes: Potongan arsip ZIP.
+    """
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, mode='w', compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for full_path, arcname in entries:
+            try:
+                zip_info = zipfile.ZipInfo.from_file(full_path, arcname)
+                zip_info.compress_type = zipfile.ZIP_STORED
+                with open(full_path, 'rb') as source, archive.open(zip_info, mode='w', force_zip64=zip_info.file_size > 0xFFFFFFFF) as entry:
+                    for block in iter(lambda: source.read(ARCHIVE_CHUNK_SIZE), b''):
+                        entry.write(block)
+                        yield buffer.drain()
+            except FileNotFoundError:
+                # File bisa terhapus oleh eviction saat arsip sedang dikirim; lewati saja
+                logging.warning(f"Gambar '{full_path}' hilang saat membuat arsip, dilewati.")
+            yield buffer.drain()
+    # Central directory ditulis saat arsip ditutup
+    yield buffer.drain()
@@ -4,16 +4,39 @@ import os
 import logging
 import re
 import shutil 
+import functools # Untuk cache font dan gambar latar belakang kartu LLM
 
-# Import Playwright
-from playwright.sync_api import sync_playwright 
-
-# Import Pillow dan library untuk teks Arab
+# Import Pillow. Playwright dan library untuk teks Arab (arabic_reshaper, bidi) diimpor secara lazy
+# di dalam fungsi yang memakainya, agar impor modul ini tetap ringan.
 from PIL import Image, ImageDraw, ImageFont, ImageOps 
-from arabic_reshaper import reshape
-from bidi.algorithm import get_display
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+import metrics # Instrumentasi span dan histogram latensi
+import log_setup # Logging terpusat non-blocking (antrean + JSON dengan ID pekerjaan)
+
+log_setup.configure_logging()
+
+# Preset viewport untuk rendering halaman ePub: lebar/tinggi dalam piksel CSS dan device scale factor.
+# Ukuran gambar yang dihasilkan = viewport x scale (tinggi mengikuti panjang halaman).
+RENDER_PRESETS = {
+    "desktop": {"width": 1280, "height": 720, "scale": 1}, # Viewport default Playwright
+    "mobile": {"width": 390, "height": 844, "scale": 2},
+    "tablet": {"width": 820, "height": 1180, "scale": 2},
+    "print": {"width": 794, "height": 1123, "scale": 2}, # A4 pada 96 DPI, dirender ~192 DPI
+}
+DEFAULT_RENDER_PRESET = "desktop"
+
+
+def get_render_preset(name=None):
+    """
+    Mengembalikan preset viewport berdasarkan nama (None -> DEFAULT_RENDER_PRESET).
+
+    Raises:
+        ValueError: Jika nama preset tidak dikenal.
+    """
+    name = name or DEFAULT_RENDER_PRESET
+    if name not in RENDER_PRESETS:
+        raise ValueError(f"Preset render '{name}' tidak dikenal. Pilihan: {', '.join(RENDER_PRESETS)}.")
+    return RENDER_PRESETS[name]
 
 def clean_filename(filename):
     """Membersihkan string untuk digunakan sebagai nama file yang aman."""
@@ -21,7 +44,8 @@ def clean_filename(filename):
     return cleaned_filename.replace(' ', '_')[:100]
 
 # --- FUNGSI render_html_to_images (Menggunakan Playwright) ---
-def render_html_to_images(html_contents, output_dir, epub_filename_prefix="epub", base_url=None):
+@metrics.timed("image_renderer.render_html_to_images")
+def render_html_to_images(html_contents, output_dir, epub_filename_prefix="epub", base_url=None, on_page_rendered=None, browser=None, page_numbers=None, preset=None):
     """
     Merender list string HTML menjadi gambar menggunakan Playwright.
     
@@ -31,6 +55,14 @@ def render_html_to_images(html_contents, output_dir, epub_filename_prefix="epub"
         epub_filename_prefix (str): Prefix untuk nama file gambar yang dihasilkan.
         base_url (str): Base URL untuk Playwright agar dapat menyelesaikan path relatif aset.
                         Contoh: "file:///C:/path/to/extracted_epub_assets/"
+        on_page_rendered (callable, optional): Dipanggil sebagai on_page_rendered(page_number, image_path)
+                        segera setelah setiap gambar halaman selesai ditulis, untuk event progres.
+        browser (optional): Browser Playwright yang sudah berjalan. Jika None, Chromium diluncurkan
+                        dan ditutup di dalam fungsi ini. Harus dipanggil dari thread yang membuat browser.
+        page_numbers (list, optional): Nomor halaman untuk setiap string HTML (dipakai untuk nama file dan
+                        on_page_rendered). Default 1..n; diisi oleh text_renderer saat hanya sebagian halaman
+                        yang dirender dengan Playwright.
+        preset (str, optional): Nama preset viewport di RENDER_PRESETS (default DEFAULT_RENDER_PRESET).
     Returns:
         list: List dari path lengkap ke gambar-gambar yang dihasilkan.
     """
@@ -40,55 +72,78 @@ def render_html_to_images(html_contents, output_dir, epub_filename_prefix="epub"
         logging.info(f"Direktori output '{output_dir}' dibuat.")
 
     generated_image_paths = []
+    viewport = get_render_preset(preset)
+    page_options = {
+        "viewport": {"width": viewport["width"], "height": viewport["height"]},
+        "device_scale_factor": viewport["scale"],
+    }
 
-    logging.info(f"Mulai rendering {len(html_contents)} bagian HTML ke gambar menggunakan Playwright...")
+    logging.info(f"Mulai rendering {len(html_contents)} bagian HTML ke gambar menggunakan Playwright (preset {preset or DEFAULT_RENDER_PRESET})...")
 
-    try:
-        with sync_playwright() as p:
-            # Launch browser (chromium, firefox, webkit)
-            # headless=True untuk tidak menampilkan jendela browser
-            browser = p.chromium.launch(headless=True) 
-            page = browser.new_page()
-
-            for i, html_string in enumerate(html_contents):
-                clean_prefix = clean_filename(epub_filename_prefix)
-                image_filename = f"{clean_prefix}_page_{i+1}.png"
-                output_image_path = os.path.join(output_dir, image_filename)
-
-                try:
-                    # Tulis HTML ke file sementara di direktori ekstraksi ePub (base_url menunjuk ke sana)
-                    # Ini penting agar Playwright bisa menyelesaikan path relatif ke aset (CSS, gambar)
-                    local_base_path = base_url.replace('file:///', '').replace('/', os.sep)
-                    temp_html_file_name = f"temp_page_{i}_{os.urandom(4).hex()}.html"
-                    temp_html_full_path = os.path.join(local_base_path, temp_html_file_name)
+    def render_pages(page):
+        for i, html_string in enumerate(html_contents):
+            page_number = page_numbers[i] if page_numbers else i + 1
+            clean_prefix = clean_filename(epub_filename_prefix)
+            image_filename = f"{clean_prefix}_page_{page_number}.png"
+            output_image_path = os.path.join(output_dir, image_filename)
+
+            try:
+                # Tulis HTML ke file sementara di direktori ekstraksi ePub (base_url menunjuk ke sana)
+                # Ini penting agar Playwright bisa menyelesaikan path relatif ke aset (CSS, gambar)
+                local_base_path = base_url.replace('file:///', '').replace('/', os.sep)
+                temp_html_file_name = f"temp_page_{i}_{os.urandom(4).hex()}.html"
+                temp_html_full_path = os.path.join(local_base_path, temp_html_file_name)
                     
-                    with open(temp_html_full_path, 'w', encoding='utf-8') as f:
-                        f.write(html_string)
+                with open(temp_html_full_path, 'w', encoding='utf-8') as f:
+                    f.write(html_string)
                     
-                    # Suruh Playwright untuk pergi ke URL file lokal ini
-                    file_url_for_goto = f"file:///{temp_html_full_path.replace(os.sep, '/')}"
+                # Suruh Playwright untuk pergi ke URL file lokal ini
+                file_url_for_goto = f"file:///{temp_html_full_path.replace(os.sep, '/')}"
                     
-                    logging.info(f"Loading HTML for page {i+1} from {file_url_for_goto}")
+                logging.debug(f"Loading HTML for page {page_number} from {file_url_for_goto}")
                     
+                with metrics.span("image_renderer.chromium_page"):
                     page.goto(file_url_for_goto) 
-                    
+                        
                     # Tunggu hingga halaman selesai dimuat (networkidle atau load)
                     page.wait_for_load_state('networkidle') 
-                    
+                        
                     # Ambil screenshot
                     # full_page=True agar tidak terpotong jika konten lebih panjang dari viewport
                     page.screenshot(path=output_image_path, full_page=True) 
-                    generated_image_paths.append(output_image_path)
-                    logging.info(f"Berhasil merender halaman {i+1} ke '{image_filename}' menggunakan Playwright.")
+                generated_image_paths.append(output_image_path)
+                logging.debug(f"Berhasil merender halaman {page_number} ke '{image_filename}' menggunakan Playwright.")
                     
-                    # Hapus file HTML sementara setelah digunakan
-                    os.remove(temp_html_full_path)
+                # Hapus file HTML sementara setelah digunakan
+                os.remove(temp_html_full_path)
 
-                except Exception as e:
-                    logging.error(f"Gagal merender halaman {i+1} dari {epub_filename_prefix} menggunakan Playwright. Error: {e}", exc_info=True)
-                    logging.error(f"HTML Content (partial): {html_string[:500]}...")
-                    
-            browser.close()
+                if on_page_rendered:
+                    on_page_rendered(page_number, output_image_path)
+
+            except Exception as e:
+                logging.error(f"Gagal merender halaman {page_number} dari {epub_filename_prefix} menggunakan Playwright. Error: {e}", exc_info=True)
+                # Cuplikan HTML hanya di level DEBUG agar halaman gagal yang beruntun tidak membanjiri log
+                logging.debug(f"HTML Content (partial): {html_string[:500]}...")
+
+    try:
+        if browser is not None:
+            # Pakai browser yang sudah berjalan (lihat SharedBrowser); hanya tab baru yang dibuka dan ditutup
+            page = browser.new_page(**page_options)
+            try:
+                render_pages(page)
+            finally:
+                page.close()
+        else:
+            from playwright.sync_api import sync_playwright # Diimpor lazy: hanya dibutuhkan saat merender halaman
+            with sync_playwright() as p:
+                # Launch browser (chromium, firefox, webkit)
+                # headless=True untuk tidak menampilkan jendela browser
+                with metrics.span("image_renderer.chromium_launch"):
+                    browser = p.chromium.launch(headless=True) 
+                    page = browser.new_page(**page_options)
+
+                render_pages(page)
+                browser.close()
         
     except Exception as e:
         logging.error(f"Error saat menginisialisasi atau menjalankan Playwright: {e}", exc_info=True)
@@ -98,7 +153,71 @@ def render_html_to_images(html_contents, output_dir, epub_filename_prefix="epub"
     return generated_image_paths
 
 
+class SharedBrowser:
+    """
+    Satu instance Chromium yang dipakai ulang untuk banyak pemanggilan render_html_to_images,
+    sehingga biaya peluncuran browser hanya dibayar sekali per proses (misalnya per worker batch).
+
+    API sync Playwright terikat pada thread yang membuatnya, sedangkan tahapan konversi berjalan
+    di thread pool. Karena itu browser dijalankan di satu thread khusus dan setiap permintaan
+    render diteruskan ke thread tersebut.
+    """
+
+    def __init__(self):
+        from concurrent.futures import ThreadPoolExecutor
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shared-browser")
+        self._playwright = None
+        self._browser = None
+
+    def _launch(self):
+        from playwright.sync_api import sync_playwright
+        with metrics.span("image_renderer.chromium_launch"):
+            self._playwright = sync_playwright().start()
+            self._browser = self._playwright.chromium.launch(headless=True)
+        logging.info("Browser bersama (Chromium) diluncurkan.")
+
+    def _render(self, args, kwargs):
+        # Luncurkan (ulang) browser jika belum ada atau terputus, misalnya karena crash
+        if self._browser is None or not self._browser.is_connected():
+            self._shutdown()
+            self._launch()
+        return render_html_to_images(*args, browser=self._browser, **kwargs)
+
+    def render_html_to_images(self, *args, **kwargs):
+        """Sama seperti render_html_to_images(), tetapi memakai browser bersama."""
+        return self._executor.submit(self._render, args, kwargs).result()
+
+    def _shutdown(self):
+        try:
+            if self._browser is not None:
+                self._browser.close()
+            if self._playwright is not None:
+                self._playwright.stop()
+        except Exception as e:
+            logging.warning(f"Gagal menutup browser bersama: {e}")
+        self._browser = None
+        self._playwright = None
+
+    def close(self):
+        """Menutup browser dan thread khususnya."""
+        self._executor.submit(self._shutdown).result()
+        self._executor.shutdown()
+
+
+@functools.lru_cache(maxsize=32)
+def _load_truetype(font_path, size):
+    # Font yang sama dipakai berulang kali untuk setiap kartu dan ukuran font adaptif
+    return ImageFont.truetype(font_path, size)
+
+
+@functools.lru_cache(maxsize=4)
+def _load_background(path, mtime_ns):
+    # mtime ikut menjadi kunci cache sehingga latar belakang yang ditimpa dibaca ulang
+    return Image.open(path).convert("RGB")
+
+
 # --- FUNGSI render_llm_text_to_designed_image (Pillow) ---
+@metrics.timed("image_renderer.render_llm_text_to_designed_image")
 def render_llm_text_to_designed_image(llm_text, output_path, max_width=800, padding=40, initial_font_size=24, line_height_factor=1.8, font_path=None, ai_background_path=None, requested_bg_color=None): 
     """
     Merender teks LLM ke gambar yang didesain menggunakan Pillow.
@@ -133,7 +252,7 @@ def render_llm_text_to_designed_image(llm_text, output_path, max_width=800, padd
         # Prioritas 1: Font kustom yang diberikan
         if font_path and os.path.exists(font_path):
             try:
-                font_obj = ImageFont.truetype(font_path, size)
+                font_obj = _load_truetype(font_path, size)
                 # logging.info(f"Menggunakan font kustom: {font_path} ukuran {size}")
             except IOError:
                 logging.warning(f"Font kustom tidak ditemukan atau tidak valid: {font_path}. Mencoba font fallback.")
@@ -153,7 +272,7 @@ def render_llm_text_to_designed_image(llm_text, output_path, max_width=800, padd
             for f_path in fallback_fonts_to_try:
                 if os.path.exists(f_path):
                     try:
-                        font_obj = ImageFont.truetype(f_path, size)
+                        font_obj = _load_truetype(f_path, size)
                         # logging.info(f"Berhasil memuat font fallback: {f_path} ukuran {size}")
                         loaded_font = True
                         break
@@ -168,6 +287,8 @@ def render_llm_text_to_designed_image(llm_text, output_path, max_width=800, padd
     # Proses teks Arab jika ada
     is_arabic = bool(re.search(r'[\u0600-\u06FF\u0750-\u077F\u08A0-\u08FF\uFB50-\uFDFF\uFE70-\uFEFF]', llm_text))
     if is_arabic:
+        from arabic_reshaper import reshape # Diimpor lazy bersama bidi: hanya dibutuhkan untuk teks Arab
+        from bidi.algorithm import get_display
         reshaped_text = reshape(llm_text)
         display_text = get_display(reshaped_text) 
     else:
@@ -264,7 +385,7 @@ def render_llm_text_to_designed_image(llm_text, output_path, max_width=800, padd
         image = Image.new('RGB', (max_width, image_height), requested_bg_color)
     elif ai_background_path and os.path.exists(ai_background_path): 
         try:
-            background_image = Image.open(ai_background_path).convert("RGB")
+            background_image = _load_background(ai_background_path, os.stat(ai_background_path).st_mtime_ns)
             bg_width, bg_height = background_image.size
             
             ratio = max_width / bg_width
@@ -346,6 +467,25 @@ def render_llm_text_to_designed_image(llm_text, output_path, max_width=800, padd
         logging.error(f"Gagal menyimpan gambar hasil LLM ke '{output_path}': {e}", exc_info=True)
         return None
 
+@metrics.timed("image_renderer.render_llm_cards")
+def render_llm_cards(cards, font_path=None, ai_background_path=None):
+    """
+    Merender beberapa kartu hasil LLM dalam satu putaran. Font dan latar belakang AI yang sama
+    dimuat sekali (di-cache) dan dipakai untuk semua kartu.
+
+    Args:
+        cards (list): Tuple (teks LLM, path output, warna latar belakang RGB yang diminta atau None).
+        font_path (str, optional): Path font untuk semua kartu.
+        ai_background_path (str, optional): Latar belakang bersama untuk kartu tanpa warna yang diminta.
+
+    Returns:
+        list: Path gambar per kartu (None untuk kartu yang gagal dirender), sesuai urutan `cards`.
+    """
+    return [
+        render_llm_text_to_designed_image(llm_text, output_path, font_path=font_path, ai_background_path=ai_background_path, requested_bg_color=requested_bg_color)
+        for llm_text, output_path, requested_bg_color in cards
+    ]
+
 # Contoh penggunaan (untuk pengujian)
 if __name__ == '__main__':
     print("--- Menguji render_html_to_images (Playwright) ---")
@@ -0,0 +1,365 @@
+# job_queue.py
+# Modul ini menyediakan antrean pekerjaan (job queue) asinkron berbatas dengan backend
+# SQLite lokal, sehingga konversi ePub yang lama tidak menahan request HTTP dan
+# pekerjaan yang masih mengantre tetap bertahan ketika server di-restart.
+
+import os # Untuk operasi path dan pengecekan proses
+import json # Untuk serialisasi parameter, progres, dan hasil pekerjaan
+import time # Untuk timestamp pekerjaan
+import uuid # Untuk membuat ID pekerjaan yang unik
+import sqlite3 # Backend penyimpanan persisten lokal
+import logging # Untuk mencatat informasi, peringatan, dan error
+import threading # Untuk worker latar belakang
+import log_setup # Logging terpusat non-blocking (antrean + JSON dengan ID pekerjaan)
+
+log_setup.configure_logging()
+
+# Status-status pekerjaan yang mungkin
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+# Jumlah percobaan mencatat status akhir pekerjaan jika database sedang terkunci
+FINISH_ATTEMPTS = 3
+
+
+class QueueFullError(Exception):
+    """Dimunculkan ketika antrean sudah mencapai batas jumlah pekerjaan yang mengantre."""
+
+
+def pid_is_alive(pid):
+    """Mengembalikan True jika proses dengan PID tersebut masih berjalan di host ini."""
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobQueue:
+    """
+    Antrean pekerjaan berbatas dengan sekumpulan worker thread.
+
+    Semua status pekerjaan disimpan di SQLite, dan worker mengklaim pekerjaan secara atomik
+    langsung dari tabel tersebut. Karena itu beberapa proses (misalnya beberapa worker
+    gunicorn) dapat berbagi antrean yang sama, dan pekerjaan yang belum selesai dapat
+    dilanjutkan setelah restart.
+
+    Handler dipanggil sebagai handler(job_id, params, report) dan harus mengembalikan dict
+    hasil akhir. `report(progress=None, **partial)` dapat dipanggil kapan saja untuk
+    memperbarui progres dan hasil parsial pekerjaan.
+
+    Setiap perubahan juga dicatat sebagai event berurutan per pekerjaan (tabel job_events),
+    sehingga klien dapat menerima progres secara streaming (misalnya lewat SSE) tanpa polling.
+    """
+
+    def __init__(self, db_path, handler, num_workers=2, max_queued=20, poll_interval=1.0, ttl_seconds=0, sweep_interval=300):
+        self.db_path = db_path
+        self.handler = handler
+        self.num_workers = num_workers
+        self.max_queued = max_queued
+        self.poll_interval = poll_interval
+        self.ttl_seconds = ttl_seconds # Umur maksimum pekerjaan selesai beserta event-nya; 0 berarti tanpa batas
+        self.sweep_interval = sweep_interval
+        self._wakeup = threading.Condition()
+        self._started = False
+        self._start_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._events_cond = threading.Condition()
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    worker_pid INTEGER,
+                    params TEXT NOT NULL,
+                    progress TEXT NOT NULL DEFAULT '{}',
+                    partial TEXT NOT NULL DEFAULT '{}',
+                    result TEXT,
+                    error TEXT
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_updated ON jobs (status, updated_at)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS job_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    job_id TEXT NOT NULL,
+                    type TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_job_events_job ON job_events (job_id, id)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    # --- API Publik ---
+
+    def start(self):
+        """Memulihkan pekerjaan yang terputus lalu menjalankan worker thread (hanya sekali)."""
+        with self._start_lock:
+            if self._started:
+                return
+            self._recover_orphaned_jobs()
+            for i in range(self.num_workers):
+                worker = threading.Thread(target=self._worker_loop, name=f"job-worker-{i}", daemon=True)
+                worker.start()
+            if self.ttl_seconds:
+                threading.Thread(target=self._prune_loop, name="job-pruner", daemon=True).start()
+            self._started = True
+            logging.info(f"Job queue dimulai dengan {self.num_workers} worker (batas antrean: {self.max_queued}).")
+
+    def submit(self, params):
+        """
+        Menambahkan pekerjaan baru ke antrean.
+
+        Args:
+            params (dict): Parameter pekerjaan (harus dapat diserialisasi ke JSON).
+
+        Returns:
+            str: ID pekerjaan yang baru dibuat.
+
+        Raises:
+            QueueFullError: Jika jumlah pekerjaan yang mengantre sudah mencapai batas.
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._write_lock, self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            queued = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (STATUS_QUEUED,)).fetchone()[0]
+            if queued >= self.max_queued:
+                raise QueueFullError(f"Antrean penuh ({queued} pekerjaan mengantre).")
+            conn.execute(
+                "INSERT INTO jobs (id, status, created_at, updated_at, params) VALUES (?, ?, ?, ?, ?)",
+                (job_id, STATUS_QUEUED, now, now, json.dumps(params))
+            )
+        logging.info(f"Pekerjaan '{job_id}' ditambahkan ke antrean.")
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    def get(self, job_id):
+        """Mengembalikan status pekerjaan sebagai dict, atau None jika tidak ditemukan."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            job = {
+                "job_id": row["id"],
+                "status": row["status"],
+                "created_at": row["created_at"],
+                "updated_at": row["updated_at"],
+                "progress": json.loads(row["progress"]),
+                "partial": json.loads(row["partial"]),
+                "result": json.loads(row["result"]) if row["result"] else None,
+                "error": row["error"],
+            }
+            # Gambar halaman yang sudah selesai dirender disusun dari event 'page'
+            page_rows = conn.execute(
+                "SELECT data FROM job_events WHERE job_id = ? AND type = 'page' ORDER BY id", (job_id,)
+            ).fetchall()
+            if page_rows:
+                job["partial"]["image_urls"] = [json.loads(page_row["data"])["url"] for page_row in page_rows]
+            if row["status"] == STATUS_QUEUED:
+                job["queue_position"] = conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = ? AND created_at <= ?",
+                    (STATUS_QUEUED, row["created_at"])
+                ).fetchone()[0]
+        return job
+
+    def queue_depth(self):
+        """Mengembalikan jumlah pekerjaan yang sedang mengantre."""
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (STATUS_QUEUED,)).fetchone()[0]
+
+    def report(self, job_id, progress=None, **partial):
+        """Memperbarui progres dan/atau hasil parsial sebuah pekerjaan (digabung dengan yang lama)."""
+        with self._write_lock, self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT progress, partial FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return
+            merged_progress = json.loads(row["progress"])
+            merged_progress.update(progress or {})
+            merged_partial = json.loads(row["partial"])
+            merged_partial.update(partial)
+            conn.execute(
+                "UPDATE jobs SET progress = ?, partial = ?, updated_at = ? WHERE id = ?",
+                (json.dumps(merged_progress), json.dumps(merged_partial), time.time(), job_id)
+            )
+            self._insert_event(conn, job_id, 'progress', {"progress": merged_progress, "partial": partial})
+        self._notify_events()
+
+    def publish(self, job_id, event_type, data):
+        """
+        Mencatat event untuk sebuah pekerjaan tanpa mengubah progresnya.
+
+        Args:
+            job_id (str): ID pekerjaan.
+            event_type (str): Jenis event, misalnya 'page' untuk setiap gambar halaman yang selesai.
+            data (dict): Data event (harus dapat diserialisasi ke JSON).
+        """
+        with self._write_lock, self._connect() as conn:
+            self._insert_event(conn, job_id, event_type, data)
+        self._notify_events()
+
+    def wait_for_events(self, job_id, after_id=0, timeout=15.0):
+        """
+        Mengembalikan event pekerjaan dengan id > after_id, menunggu hingga `timeout` detik jika belum ada.
+
+        Event dari worker di proses yang sama dibangunkan langsung lewat Condition; event dari
+        proses lain terlihat paling lambat setelah `poll_interval` detik.
+
+        Returns:
+            list: Daftar dict event dengan kunci 'id', 'type', dan 'data' (bisa kosong jika timeout).
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._connect() as conn:
+                rows = conn.execute(
+                    "SELECT id, type, data FROM job_events WHERE job_id = ? AND id > ? ORDER BY id",
+                    (job_id, after_id)
+                ).fetchall()
+            if rows:
+                return [{"id": row["id"], "type": row["type"], "data": json.loads(row["data"])} for row in rows]
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return []
+            with self._events_cond:
+                self._events_cond.wait(timeout=min(remaining, self.poll_interval))
+
+    def prune_finished(self):
+        """
+        Menghapus pekerjaan 'done'/'failed' yang tidak berubah lebih lama dari TTL beserta event-nya.
+
+        Returns:
+            int: Jumlah pekerjaan yang dihapus.
+        """
+        if not self.ttl_seconds:
+            return 0
+        cutoff = time.time() - self.ttl_seconds
+        with self._write_lock, self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            expired = [row["id"] for row in conn.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) AND updated_at < ?", (STATUS_DONE, STATUS_FAILED, cutoff)
+            ).fetchall()]
+            for job_id in expired:
+                conn.execute("DELETE FROM job_events WHERE job_id = ?", (job_id,))
+                conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        if expired:
+            logging.info(f"{len(expired)} pekerjaan selesai yang lebih lama dari TTL dihapus dari antrean.")
+        return len(expired)
+
+    # --- Internal ---
+
+    def _prune_loop(self):
+        while True:
+            try:
+                self.prune_finished()
+            except sqlite3.Error as e:
+                logging.error(f"Gagal menghapus pekerjaan lama dari antrean: {e}", exc_info=True)
+            time.sleep(self.sweep_interval)
+
+    def _insert_event(self, conn, job_id, event_type, data):
+        conn.execute(
+            "INSERT INTO job_events (job_id, type, data, created_at) VALUES (?, ?, ?, ?)",
+            (job_id, event_type, json.dumps(data), time.time())
+        )
+
+    def _notify_events(self):
+        with self._events_cond:
+            self._events_cond.notify_all()
+
+    def _recover_orphaned_jobs(self):
+        """Mengembalikan pekerjaan 'running' milik proses yang sudah mati ke status 'queued'."""
+        with self._write_lock, self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute("SELECT id, worker_pid FROM jobs WHERE status = ?", (STATUS_RUNNING,)).fetchall()
+            for row in rows:
+                if not pid_is_alive(row["worker_pid"]) or row["worker_pid"] == os.getpid():
+                    conn.execute(
+                        "UPDATE jobs SET status = ?, worker_pid = NULL, updated_at = ? WHERE id = ?",
+                        (STATUS_QUEUED, time.time(), row["id"])
+                    )
+                    logging.warning(f"Pekerjaan '{row['id']}' terputus sebelumnya dan dikembalikan ke antrean.")
+
+    def _claim_next(self):
+        """Mengklaim pekerjaan tertua yang mengantre secara atomik. Mengembalikan (id, params) atau None."""
+        with self._write_lock, self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id, params FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (STATUS_QUEUED,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker_pid = ?, updated_at = ? WHERE id = ?",
+                (STATUS_RUNNING, os.getpid(), time.time(), row["id"])
+            )
+            # Pekerjaan yang dipulihkan setelah restart dimulai dari awal: buang event dari percobaan sebelumnya
+            conn.execute("DELETE FROM job_events WHERE job_id = ?", (row["id"],))
+            return row["id"], json.loads(row["params"])
+
+    def _finish(self, job_id, status, result=None, error=None):
+        # Database bisa sesaat terkunci oleh proses lain; coba lagi agar pekerjaan tidak tertahan di 'running'
+        for attempt in range(1, FINISH_ATTEMPTS + 1):
+            try:
+                with self._write_lock, self._connect() as conn:
+                    conn.execute(
+                        "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE id = ?",
+                        (status, json.dumps(result) if result is not None else None, error, time.time(), job_id)
+                    )
+                    self._insert_event(conn, job_id, status, {"result": result, "error": error})
+                break
+            except sqlite3.OperationalError as e:
+                if attempt == FINISH_ATTEMPTS:
+                    raise
+                logging.warning(f"Gagal mencatat status akhir pekerjaan '{job_id}' (percobaan {attempt}): {e}")
+                time.sleep(self.poll_interval * attempt)
+        self._notify_events()
+
+    def _worker_loop(self):
+        while True:
+            try:
+                claimed = self._claim_next()
+            except sqlite3.Error as e:
+                logging.error(f"Gagal mengklaim pekerjaan dari antrean: {e}", exc_info=True)
+                claimed = None
+
+            if claimed is None:
+                # Tunggu notifikasi dari submit() atau polling berkala (untuk pekerjaan dari proses lain)
+                with self._wakeup:
+                    self._wakeup.wait(timeout=self.poll_interval)
+                continue
+
+            job_id, params = claimed
+            # Semua log selama pekerjaan ini (termasuk thread tahapan) ditandai dengan ID pekerjaannya
+            with log_setup.job_context(job_id):
+                logging.info(f"Worker '{threading.current_thread().name}' mulai mengerjakan '{job_id}'.")
+                # Kegagalan apa pun (termasuk saat mencatat status akhir) tidak boleh menghentikan worker thread
+                try:
+                    try:
+                        result = self.handler(job_id, params, lambda progress=None, **partial: self.report(job_id, progress, **partial))
+                    except Exception as e:
+                        logging.error(f"Pekerjaan '{job_id}' gagal: {e}", exc_info=True)
+                        self._finish(job_id, STATUS_FAILED, error=str(e))
+                    else:
+                        self._finish(job_id, STATUS_DONE, result=result)
+                        logging.info(f"Pekerjaan '{job_id}' selesai.")
+                except Exception as e:
+                    # Pekerjaan tetap 'running' di database sampai dipulihkan oleh _recover_orphaned_jobs
+                    logging.error(f"Gagal mencatat status akhir pekerjaan '{job_id}': {e}", exc_info=True)
@@ -1,13 +1,16 @@
 # llm_integrator.py
 # Modul ini bertanggung jawab untuk semua interaksi dengan model AI eksternal (Google Gemini dan Hugging Face).
+# SDK Gemini (beserta gRPC) dan requests diimpor secara lazy saat pertama kali dipakai, agar proses
+# yang tidak memanggil AI tidak menanggung waktu impor dan memorinya.
 
-import google.generativeai as genai # SDK resmi Google untuk Gemini API
 import os # Untuk mengakses variabel lingkungan (API Keys)
 import logging # Untuk mencatat informasi, peringatan, dan error
-import requests # Untuk membuat permintaan HTTP ke Hugging Face Inference API
+
+import metrics # Instrumentasi span dan histogram latensi
+import log_setup # Logging terpusat non-blocking (antrean + JSON dengan ID pekerjaan)
 
 # Konfigurasi dasar logging untuk modul ini
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+log_setup.configure_logging()
 
 def configure_gemini():
     """
@@ -23,9 +26,11 @@ def configure_gemini():
         logging.error("Variabel lingkungan GOOGLE_API_KEY tidak ditemukan.")
         raise ValueError("GOOGLE_API_KEY tidak diatur. Harap atur variabel lingkungan Anda.")
     
+    import google.generativeai as genai # SDK resmi Google untuk Gemini API
     genai.configure(api_key=api_key) # Mengkonfigurasi SDK Gemini dengan kunci API
     logging.info("Google Gemini API berhasil dikonfigurasi.")
 
+@metrics.timed("llm_integrator.gemini_generate")
 def get_gemini_response(prompt_text, model_name="gemini-1.5-flash-latest"):
     """
     Mengirim prompt teks ke model Google Gemini dan mengembalikan responsnya.
@@ -42,6 +47,7 @@ def get_gemini_response(prompt_text, model_name="gemini-1.5-flash-latest"):
     try:
         # Memastikan Gemini API sudah dikonfigurasi. Ini dipanggil setiap kali fungsi ini digunakan.
         configure_gemini() 
+        import google.generativeai as genai
         
         # Membuat instance model generatif
         model = genai.GenerativeModel(model_name)
@@ -75,6 +81,7 @@ def get_gemini_response(prompt_text, model_name="gemini-1.5-flash-latest"):
 
 # --- FUNGSI BARU: Generasi Gambar AI ---
 # Ubah default model_id di sini ke runwayml/stable-diffusion-v1-5
+@metrics.timed("llm_integrator.huggingface_image")
 def generate_image_from_text(image_prompt, output_filepath, model_id="runwayml/stable-diffusion-v1-5"):
     """
     Menghasilkan gambar dari prompt teks menggunakan Hugging Face Inference API.
@@ -88,6 +95,8 @@ def generate_image_from_text(image_prompt, output_filepath, model_id="runwayml/s
     Returns:
         str: Path lengkap ke gambar yang dihasilkan jika berhasil, None jika gagal.
     """
+    import requests # Untuk membuat permintaan HTTP ke Hugging Face Inference API
+
     # Mengambil token API Hugging Face dari variabel lingkungan
     hf_api_token = os.getenv("HF_API_TOKEN")
     if not hf_api_token:
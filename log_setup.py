@@ -0,0 +1,247 @@
+# log_setup.py
+# Modul ini menyediakan konfigurasi logging terpusat untuk seluruh aplikasi. Pemanggil di jalur panas
+# (worker, tahapan konversi, render) hanya menaruh record ke antrean di memori (QueueHandler), sedangkan
+# penulisan ke stderr dilakukan satu thread QueueListener. Record diformat sebagai JSON terstruktur
+# dengan ID pekerjaan dari konteks saat ini, dan log per item yang sangat sering (misalnya per aset
+# atau per halaman) dibatasi per baris kode pemanggil lalu diringkas.
+
+import os # Untuk variabel lingkungan dan hook setelah fork
+import sys # Untuk stream stderr
+import json # Untuk format log JSON
+import time # Untuk jendela pembatasan laju
+import queue # Antrean record antara pemanggil dan thread penulis
+import atexit # Untuk mengosongkan antrean saat proses selesai
+import logging # Modul logging standar
+import threading # Untuk lock konfigurasi dan pembatas laju
+import contextvars # Agar ID pekerjaan ikut terbawa ke thread tahapan
+import logging.handlers # QueueHandler dan QueueListener
+from contextlib import contextmanager
+
+# Format log: "json" (default) atau "text" (format lama yang mudah dibaca di terminal)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").strip().lower()
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").strip().upper()
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+# Paling banyak sekian record INFO/DEBUG per baris kode pemanggil dalam satu jendela; sisanya diringkas
+RATE_LIMIT_BURST = 20
+RATE_LIMIT_WINDOW_SECONDS = 10.0
+
+_current_job_id = contextvars.ContextVar("log_job_id", default=None)
+_configure_lock = threading.Lock()
+_queue_handler = None
+_listener = None
+_rate_limit_filter = None
+_sweeper_stop = None
+
+
+@contextmanager
+def job_context(job_id):
+    """Menandai semua log di dalam blok ini (termasuk thread tahapan yang menyalin konteks) dengan `job_id`."""
+    token = _current_job_id.set(job_id)
+    try:
+        yield
+    finally:
+        _current_job_id.reset(token)
+
+
+def current_job_id():
+    return _current_job_id.get()
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Membatasi record di bawah WARNING per pekerjaan dan baris kode pemanggil (job_id, logger, pathname,
+    lineno): paling banyak `burst` record per jendela waktu, sehingga pekerjaan yang sibuk tidak
+    meredam log pekerjaan lain. Setelah jendelanya lewat, record yang dibuang diringkas menjadi satu record
+    berisi jumlahnya dan contoh pesan terakhir, yang dikirim lewat `emit_summary`. Jendela yang sudah lewat
+    diperiksa saat record berikutnya datang dan secara berkala oleh sweep(), sehingga ringkasan tetap
+    terkirim meskipun baris kode tersebut tidak mencatat log lagi.
+    """
+
+    def __init__(self, burst=RATE_LIMIT_BURST, window_seconds=RATE_LIMIT_WINDOW_SECONDS, emit_summary=None):
+        super().__init__()
+        self.burst = burst
+        self.window_seconds = window_seconds
+        self.emit_summary = emit_summary
+        self._sites = {}
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or getattr(record, "rate_limit_summary", False):
+            return True
+        job_id = getattr(record, "job_id", None) or _current_job_id.get()
+        key = (job_id, record.name, record.pathname, record.lineno)
+        now = time.monotonic()
+        summaries = []
+        with self._lock:
+            state = self._sites.get(key)
+            if state is None or now - state["started"] >= self.window_seconds:
+                if state and state["suppressed"]:
+                    summaries.append(state)
+                state = self._sites[key] = {"started": now, "count": 0, "suppressed": 0, "last": None, "job_id": job_id}
+            state["count"] += 1
+            allowed = state["count"] <= self.burst
+            if not allowed:
+                state["suppressed"] += 1
+                state["last"] = record
+            if now - self._last_sweep >= self.window_seconds:
+                self._last_sweep = now
+                summaries.extend(self._pop_expired(now))
+        for summary in summaries:
+            self._emit(summary)
+        return allowed
+
+    def _pop_expired(self, now, force=False):
+        expired = []
+        for key, state in list(self._sites.items()):
+            if force or now - state["started"] >= self.window_seconds:
+                del self._sites[key]
+                if state["suppressed"]:
+                    expired.append(state)
+        return expired
+
+    def _emit(self, state):
+        last = state["last"]
+        summary = logging.LogRecord(
+            last.name, last.levelno, last.pathname, last.lineno,
+            f"{state['suppressed']} pesan serupa dari {last.module}:{last.lineno} diringkas. Contoh terakhir: {last.getMessage()[:200]}",
+            None, None
+        )
+        summary.rate_limit_summary = True
+        summary.suppressed = state["suppressed"]
+        summary.job_id = state["job_id"]
+        if self.emit_summary:
+            self.emit_summary(summary)
+
+    def sweep(self):
+        """Mengirim ringkasan untuk baris kode yang jendelanya sudah lewat (dipanggil berkala oleh thread sweeper)."""
+        now = time.monotonic()
+        with self._lock:
+            self._last_sweep = now
+            summaries = self._pop_expired(now)
+        for summary in summaries:
+            self._emit(summary)
+
+    def flush(self):
+        """Mengirim ringkasan semua record yang masih tertahan (dipanggil saat logging dihentikan)."""
+        with self._lock:
+            summaries = self._pop_expired(time.monotonic(), force=True)
+        for summary in summaries:
+            self._emit(summary)
+
+
+class _ContextQueueHandler(logging.handlers.QueueHandler):
+    # Dijalankan di thread pemanggil: tambahkan ID pekerjaan dan siapkan record agar aman dipindah antar thread
+
+    def prepare(self, record):
+        if not hasattr(record, "job_id"):
+            record.job_id = _current_job_id.get()
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """Satu objek JSON per baris: waktu, level, logger, pesan, ID pekerjaan, thread, dan traceback."""
+
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "module": record.module,
+            "thread": record.threadName,
+        }
+        if getattr(record, "job_id", None):
+            entry["job_id"] = record.job_id
+        if getattr(record, "suppressed", None):
+            entry["suppressed_similar"] = record.suppressed
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """Format teks lama, ditambah ID pekerjaan."""
+
+    def __init__(self):
+        super().__init__(TEXT_FORMAT)
+
+    def format(self, record):
+        line = super().format(record)
+        if getattr(record, "job_id", None):
+            line = line.replace(f" - {record.levelname} - ", f" - {record.levelname} - [{record.job_id}] ", 1)
+        return line
+
+
+def _start_listener(handlers):
+    global _listener
+    log_queue = queue.SimpleQueue()
+    _queue_handler.queue = log_queue
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def _start_summary_sweeper():
+    # Ringkasan record yang dibuang dikirim paling lambat sekitar satu jendela setelah burst berhenti
+    global _sweeper_stop
+    _sweeper_stop = threading.Event()
+    stop = _sweeper_stop
+
+    def run():
+        while not stop.wait(RATE_LIMIT_WINDOW_SECONDS / 2):
+            _rate_limit_filter.sweep()
+
+    threading.Thread(target=run, name="log-summary-sweeper", daemon=True).start()
+
+
+def _restart_after_fork():
+    # Thread listener dan sweeper tidak ikut ter-fork (misalnya worker ProcessPoolExecutor); buat ulang keduanya
+    if _listener is not None:
+        _start_listener(_listener.handlers)
+        _start_summary_sweeper()
+
+
+def configure_logging(level=None, log_format=None):
+    """
+    Memasang logging terpusat pada root logger (hanya sekali per proses; pemanggilan berikutnya diabaikan).
+
+    Args:
+        level (str, optional): Level log (default LOG_LEVEL dari lingkungan, 'INFO').
+        log_format (str, optional): 'json' atau 'text' (default LOG_FORMAT dari lingkungan, 'json').
+    """
+    global _queue_handler, _rate_limit_filter
+    with _configure_lock:
+        if _queue_handler is not None:
+            return
+        stream_handler = logging.StreamHandler(sys.stderr)
+        stream_handler.setFormatter(TextFormatter() if (log_format or LOG_FORMAT) == "text" else JsonFormatter())
+        _queue_handler = _ContextQueueHandler(queue.SimpleQueue())
+        _rate_limit_filter = RateLimitFilter(emit_summary=_queue_handler.handle)
+        _queue_handler.addFilter(_rate_limit_filter)
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(_queue_handler)
+        root.setLevel(level or LOG_LEVEL)
+        _start_listener([stream_handler])
+        _start_summary_sweeper()
+        atexit.register(shutdown_logging)
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+def shutdown_logging():
+    """Menulis semua record yang masih mengantre lalu menghentikan thread listener."""
+    global _listener
+    if _listener is not None:
+        _sweeper_stop.set()
+        _rate_limit_filter.flush()
+        _listener.stop()
+        _listener = None
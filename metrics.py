@@ -0,0 +1,239 @@
+# metrics.py
+# Modul ini menyediakan instrumentasi waktu bergaya "span" untuk setiap tahapan proses,
+# histogram latensi dan counter di memori, serta ekspor dalam format teks Prometheus.
+#
+# Catatan: metrik disimpan per proses. Jika aplikasi dijalankan dengan beberapa worker
+# proses (misalnya gunicorn -w 4), setiap worker mengekspor metriknya sendiri.
+
+import time # Untuk mengukur durasi span
+import bisect # Untuk menempatkan nilai ke bucket histogram
+import logging # Untuk mencatat informasi, peringatan, dan error
+import threading # Untuk mengamankan registry dari akses banyak thread
+import functools # Untuk dekorator timed
+import contextvars # Untuk mengumpulkan span per pekerjaan lintas thread
+from contextlib import contextmanager
+import log_setup # Logging terpusat non-blocking (antrean + JSON dengan ID pekerjaan)
+
+log_setup.configure_logging()
+
+# Batas bucket histogram latensi (detik), dari operasi kecil hingga rendering buku besar
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+# Prefix semua nama metrik yang diekspor
+METRIC_PREFIX = "epub2image"
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in labels.values())
+    return "{" + ",".join(f'{key}="{value}"' for key, value in zip(labels.keys(), escaped)) + "}"
+
+
+class Counter:
+    """Counter monoton naik dengan label."""
+
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(label, "") for label in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(dict(zip(self.label_names, key)))} {value}")
+        return lines
+
+
+class Histogram:
+    """Histogram kumulatif dengan label, kompatibel dengan format eksposisi Prometheus."""
+
+    def __init__(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {} # label key -> [bucket_counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(label, "") for label in self.label_names)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self, **labels):
+        """Mengembalikan (count, sum) untuk satu kombinasi label, atau (0, 0.0) jika belum ada."""
+        key = tuple(labels.get(label, "") for label in self.label_names)
+        with self._lock:
+            series = self._series.get(key)
+            return (series[2], series[1]) if series else (0, 0.0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (bucket_counts, total_sum, total_count) in sorted(self._series.items()):
+                labels = dict(zip(self.label_names, key))
+                cumulative = 0
+                for upper_bound, bucket_count in zip(self.buckets, bucket_counts):
+                    cumulative += bucket_count
+                    lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': repr(float(upper_bound))})} {cumulative}")
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': '+Inf'})} {total_count}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {total_sum}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {total_count}")
+        return lines
+
+
+class CallbackGauge:
+    """
+    Gauge yang nilainya dibaca dari sebuah fungsi setiap kali metrik diekspor.
+    Dengan label_names, callback mengembalikan dict berisi tuple nilai label -> nilai gauge.
+    """
+
+    def __init__(self, name, documentation, callback, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.label_names = tuple(label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        try:
+            if not self.label_names:
+                lines.append(f"{self.name} {self.callback()}")
+            else:
+                for key, value in sorted(self.callback().items()):
+                    lines.append(f"{self.name}{_format_labels(dict(zip(self.label_names, key)))} {value}")
+        except Exception as e:
+            logging.warning(f"Gagal membaca nilai gauge '{self.name}': {e}")
+        return lines
+
+
+class Registry:
+    """Kumpulan metrik yang diekspor bersama di endpoint /metrics."""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Mengembalikan seluruh metrik dalam format teks Prometheus (text/plain; version=0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+SPAN_DURATION = REGISTRY.register(Histogram(
+    f"{METRIC_PREFIX}_span_duration_seconds",
+    "Durasi setiap span (tahapan atau fungsi) dalam detik.",
+    label_names=("span",)
+))
+SPAN_TOTAL = REGISTRY.register(Counter(
+    f"{METRIC_PREFIX}_span_total",
+    "Jumlah eksekusi setiap span berdasarkan hasilnya.",
+    label_names=("span", "outcome")
+))
+JOBS_TOTAL = REGISTRY.register(Counter(
+    f"{METRIC_PREFIX}_jobs_total",
+    "Jumlah pekerjaan konversi yang selesai berdasarkan statusnya.",
+    label_names=("status",)
+))
+LLM_CONTEXT_TOKENS_TOTAL = REGISTRY.register(Counter(
+    f"{METRIC_PREFIX}_llm_context_tokens_total",
+    "Perkiraan token konteks buku yang dikirim ke LLM (sent) dan token boilerplate yang dibuang (saved).",
+    label_names=("kind",)
+))
+SPECULATIVE_BACKGROUND_TOTAL = REGISTRY.register(Counter(
+    f"{METRIC_PREFIX}_speculative_background_total",
+    "Jumlah latar belakang AI spekulatif berdasarkan hasilnya (used: dipakai, discarded: dibuang dan dibuat ulang).",
+    label_names=("outcome",)
+))
+
+# Kolektor span aktif untuk pekerjaan saat ini (diwariskan ke thread tahapan lewat copy_context)
+_current_collector = contextvars.ContextVar("span_collector", default=None)
+
+
+class SpanCollector:
+    """
+    Mengumpulkan total durasi per nama span yang terjadi di dalam blok `with`,
+    termasuk span dari thread lain yang dijalankan dengan konteks yang disalin.
+    """
+
+    def __init__(self):
+        self.durations = {}
+        self._lock = threading.Lock()
+        self._token = None
+
+    def add(self, span_name, duration):
+        with self._lock:
+            self.durations[span_name] = round(self.durations.get(span_name, 0.0) + duration, 3)
+
+    def __enter__(self):
+        self._token = _current_collector.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_collector.reset(self._token)
+        return False
+
+
+@contextmanager
+def span(name):
+    """
+    Mengukur durasi blok kode sebagai span bernama.
+
+    Durasi dicatat ke histogram latensi, counter hasil (ok/error), dan ke SpanCollector
+    yang sedang aktif (jika ada).
+    """
+    span_start = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        duration = time.perf_counter() - span_start
+        SPAN_DURATION.observe(duration, span=name)
+        SPAN_TOTAL.inc(span=name, outcome=outcome)
+        collector = _current_collector.get()
+        if collector is not None:
+            collector.add(name, duration)
+
+
+def timed(name):
+    """Dekorator yang membungkus seluruh pemanggilan fungsi dalam span bernama `name`."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def render_prometheus():
+    """Mengembalikan seluruh metrik terdaftar dalam format teks Prometheus."""
+    return REGISTRY.render()
@@ -0,0 +1,368 @@
+# performance_log.py
+# Modul ini menyimpan log kinerja setiap proses konversi secara append-only di SQLite (mode WAL).
+# File Excel hanya dibuat sesuai permintaan saat log diunduh, bukan pada setiap request.
+
+import os # Untuk operasi path
+import io # Untuk membuat file Excel di memori
+import time # Untuk waktu klaim penilaian ROUGE
+import sqlite3 # Backend penyimpanan append-only
+import threading # Untuk menyerialkan penulisan dari banyak thread
+import log_setup # Logging terpusat non-blocking (antrean + JSON dengan ID pekerjaan)
+
+log_setup.configure_logging()
+
+# Pemetaan kolom database -> header yang ditampilkan di UI dan file Excel (urutan dipertahankan)
+COLUMNS = [
+    ("timestamp", "Timestamp"),
+    ("epub_filename", "ePub Filename"),
+    ("llm_prompt", "LLM Prompt"),
+    ("llm_response_partial", "LLM Response (Partial)"),
+    ("rouge1_f1", "ROUGE-1 F1 Score"),
+    ("rouge_reference", "ROUGE Reference"),
+    ("total_duration", "Total Duration (s)"),
+    ("num_epub_pages", "Num ePub Pages"),
+    ("num_chunks", "Num Chunks"),
+    ("status_message", "Status Message"),
+    ("stage_extract_s", "Extract (s)"),
+    ("stage_optimize_assets_s", "Optimize Assets (s)"),
+    ("stage_render_pages_s", "Render Pages (s)"),
+    ("stage_text_chunks_s", "Text Chunks (s)"),
+    ("stage_llm_s", "LLM (s)"),
+    ("stage_ai_background_s", "AI Background (s)"),
+    ("stage_ai_background_speculative_s", "AI Background Speculative (s)"),
+    ("stage_llm_card_s", "LLM Card (s)"),
+    ("context_tokens", "Context Tokens"),
+    ("tokens_saved", "Tokens Saved"),
+]
+
+# Pemetaan nama tahapan di conversion.convert_epub -> kolom durasi per tahapan
+STAGE_COLUMNS = {
+    "extract": "stage_extract_s",
+    "optimize_assets": "stage_optimize_assets_s",
+    "render_pages": "stage_render_pages_s",
+    "text_chunks": "stage_text_chunks_s",
+    "llm": "stage_llm_s",
+    "ai_background": "stage_ai_background_s",
+    # Berjalan bersamaan dengan LLM, sehingga dicatat terpisah agar durasinya tidak terhitung dua kali
+    "ai_background_speculative": "stage_ai_background_speculative_s",
+    "llm_card": "stage_llm_card_s",
+    # Pekerjaan multi-prompt (/upload/batch) mencatat semua prompt pada kolom yang sama
+    "llm_batch": "stage_llm_s",
+    "llm_cards": "stage_llm_card_s",
+    # Parsing BeautifulSoup per halaman dihitung sebagai bagian dari chunking teks, seperti sebelumnya
+    "page_text": "stage_text_chunks_s",
+}
+
+# Kolom yang disimpan untuk evaluasi (respons LLM lengkap, referensi manusia, dan waktu klaim penilaian
+# oleh evaluator ROUGE), tidak ditampilkan di UI/Excel
+EVALUATION_COLUMNS = ["llm_response", "reference_text", "scoring_claimed_at"]
+# Klaim penilaian yang lebih tua dari ini (detik) dianggap ditinggalkan proses yang mati dan boleh diklaim ulang
+SCORING_CLAIM_TIMEOUT_SECONDS = 600
+
+
+class PerformanceLogStore:
+    """
+    Penyimpanan log kinerja append-only berbasis SQLite.
+
+    Setiap baris baru hanya berupa satu INSERT (O(1)), dan mode WAL memungkinkan
+    pembaca berjalan bersamaan dengan penulis tanpa merusak file, berbeda dengan
+    menulis ulang seluruh workbook Excel pada setiap request.
+
+    Setiap baris memiliki nomor urut perubahan `seq` yang naik setiap kali baris
+    ditambahkan atau diperbarui, sehingga klien dapat meminta hanya baris yang berubah
+    sejak `seq` terakhir yang dilihatnya. `generation` naik setiap kali log dihapus,
+    menandakan klien harus memuat ulang dari awal.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._write_lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            column_defs = ", ".join([name for name, _ in COLUMNS] + EVALUATION_COLUMNS)
+            conn.execute(f"CREATE TABLE IF NOT EXISTS performance_log (id INTEGER PRIMARY KEY AUTOINCREMENT, seq INTEGER, {column_defs})")
+            conn.execute("CREATE TABLE IF NOT EXISTS performance_log_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO performance_log_meta (key, value) VALUES ('generation', 1), ('last_seq', 0)")
+            # Database dari versi sebelumnya: tambahkan kolom yang belum ada (seq diisi dari id)
+            existing_columns = [row["name"] for row in conn.execute("PRAGMA table_info(performance_log)")]
+            for name in ["seq"] + [name for name, _ in COLUMNS] + EVALUATION_COLUMNS:
+                if name not in existing_columns:
+                    conn.execute(f"ALTER TABLE performance_log ADD COLUMN {name}")
+            if conn.execute("SELECT COUNT(*) FROM performance_log WHERE seq IS NULL").fetchone()[0]:
+                conn.execute("UPDATE performance_log SET seq = id WHERE seq IS NULL")
+                conn.execute("UPDATE performance_log_meta SET value = (SELECT COALESCE(MAX(seq), 0) FROM performance_log) WHERE key = 'last_seq'")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_performance_log_seq ON performance_log (seq)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _next_seq(self, conn):
+        conn.execute("UPDATE performance_log_meta SET value = value + 1 WHERE key = 'last_seq'")
+        return conn.execute("SELECT value FROM performance_log_meta WHERE key = 'last_seq'").fetchone()[0]
+
+    def _state(self, conn):
+        meta = dict(conn.execute("SELECT key, value FROM performance_log_meta").fetchall())
+        total = conn.execute("SELECT COUNT(*) FROM performance_log").fetchone()[0]
+        return {"generation": meta["generation"], "last_seq": meta["last_seq"], "total": total}
+
+    @staticmethod
+    def _row_to_dict(row):
+        entry = {"id": row["id"]}
+        entry.update({header: row[name] for name, header in COLUMNS})
+        return entry
+
+    def append(self, **values):
+        """
+        Menambahkan satu baris log kinerja.
+
+        Args:
+            **values: Nilai kolom berdasarkan nama kolom database (lihat COLUMNS dan EVALUATION_COLUMNS).
+
+        Returns:
+            int: ID baris yang baru ditambahkan.
+        """
+        names = [name for name, _ in COLUMNS] + EVALUATION_COLUMNS
+        placeholders = ", ".join("?" for _ in names)
+        with self._write_lock, self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            cursor = conn.execute(
+                f"INSERT INTO performance_log (seq, {', '.join(names)}) VALUES (?, {placeholders})",
+                [self._next_seq(conn)] + [values.get(name) for name in names]
+            )
+            return cursor.lastrowid
+
+    def update_many(self, updates):
+        """
+        Memperbarui beberapa baris dalam satu transaksi. Setiap baris yang diperbarui
+        mendapat `seq` baru sehingga ikut terambil oleh read_since.
+
+        Args:
+            updates (dict): ID baris -> dict nilai kolom yang diperbarui.
+
+        Returns:
+            int: Jumlah baris yang benar-benar ada dan diperbarui.
+        """
+        allowed = {name for name, _ in COLUMNS} | set(EVALUATION_COLUMNS)
+        updated = 0
+        with self._write_lock, self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for row_id, values in updates.items():
+                names = [name for name in values if name in allowed]
+                if not names or conn.execute("SELECT 1 FROM performance_log WHERE id = ?", (row_id,)).fetchone() is None:
+                    continue
+                assignments = ", ".join(f"{name} = ?" for name in names)
+                conn.execute(
+                    f"UPDATE performance_log SET seq = ?, {assignments} WHERE id = ?",
+                    [self._next_seq(conn)] + [values[name] for name in names] + [row_id]
+                )
+                updated += 1
+        return updated
+
+    def update(self, row_id, **values):
+        """Memperbarui satu baris log. Mengembalikan True jika baris ditemukan."""
+        return self.update_many({row_id: values}) == 1
+
+    def read_for_scoring(self, row_ids):
+        """Mengembalikan baris (id, prompt, respons lengkap, referensi) yang memiliki respons LLM untuk dinilai."""
+        if not row_ids:
+            return []
+        placeholders = ", ".join("?" for _ in row_ids)
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT id, llm_prompt, llm_response, reference_text FROM performance_log "
+                f"WHERE id IN ({placeholders}) AND llm_response IS NOT NULL ORDER BY id",
+                list(row_ids)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def claim_for_scoring(self, row_ids=None, limit=100, stale_seconds=SCORING_CLAIM_TIMEOUT_SECONDS):
+        """
+        Mengklaim baris untuk dinilai secara atomik, sehingga setiap baris hanya dinilai oleh satu proses
+        meskipun beberapa worker gunicorn berbagi database yang sama. Klaim dilepas oleh update_many
+        dengan nilai 'scoring_claimed_at' None saat skornya ditulis.
+
+        Args:
+            row_ids (list, optional): ID baris tertentu. None untuk baris yang belum memiliki ROUGE Score.
+            limit (int): Jumlah maksimum baris yang diklaim jika row_ids None.
+            stale_seconds (float): Umur klaim (detik) setelah baris boleh diklaim ulang.
+
+        Returns:
+            list: Baris yang berhasil diklaim, seperti pada read_for_scoring.
+        """
+        if row_ids is not None and not row_ids:
+            return []
+        now = time.time()
+        if row_ids is None:
+            selection, params = "rouge1_f1 IS NULL ORDER BY id LIMIT ?", [limit]
+        else:
+            selection, params = f"id IN ({', '.join('?' for _ in row_ids)}) ORDER BY id", list(row_ids)
+        with self._write_lock, self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                f"SELECT id, llm_prompt, llm_response, reference_text FROM performance_log "
+                f"WHERE llm_response IS NOT NULL AND (scoring_claimed_at IS NULL OR scoring_claimed_at < ?) AND {selection}",
+                [now - stale_seconds] + params
+            ).fetchall()
+            conn.executemany("UPDATE performance_log SET scoring_claimed_at = ? WHERE id = ?", [(now, row["id"]) for row in rows])
+        return [dict(row) for row in rows]
+
+    def iter_for_scoring(self, batch_size=100, only_unscored=False):
+        """
+        Mengiterasi seluruh baris yang memiliki respons LLM dalam batch (pagination berbasis id).
+
+        Args:
+            batch_size (int): Jumlah baris per batch.
+            only_unscored (bool): Jika True, hanya baris yang belum memiliki ROUGE Score.
+
+        Yields:
+            list: Batch baris seperti pada read_for_scoring.
+        """
+        last_id = 0
+        condition = " AND rouge1_f1 IS NULL" if only_unscored else ""
+        while True:
+            with self._connect() as conn:
+                rows = conn.execute(
+                    f"SELECT id, llm_prompt, llm_response, reference_text FROM performance_log "
+                    f"WHERE id > ? AND llm_response IS NOT NULL{condition} ORDER BY id LIMIT ?",
+                    (last_id, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            last_id = rows[-1]["id"]
+            yield [dict(row) for row in rows]
+
+    def set_references(self, references):
+        """
+        Menyimpan teks referensi manusia untuk evaluasi ROUGE.
+
+        Args:
+            references (dict): Kunci berupa ID baris log (int atau string angka) atau nama file ePub
+                               (berlaku untuk semua baris dengan nama file tersebut) -> teks referensi.
+
+        Returns:
+            list: ID baris yang referensinya diperbarui.
+        """
+        updates = {}
+        with self._connect() as conn:
+            for key, reference_text in references.items():
+                if isinstance(key, int) or str(key).isdigit():
+                    rows = conn.execute("SELECT id FROM performance_log WHERE id = ?", (int(key),)).fetchall()
+                else:
+                    rows = conn.execute("SELECT id FROM performance_log WHERE epub_filename = ?", (key,)).fetchall()
+                for row in rows:
+                    updates[row["id"]] = {"reference_text": reference_text}
+        self.update_many(updates)
+        return sorted(updates)
+
+    def read_all(self):
+        """Mengembalikan semua baris log sebagai list of dicts dengan header tampilan sebagai kunci."""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT * FROM performance_log ORDER BY id").fetchall()
+        return [{header: row[name] for name, header in COLUMNS} for row in rows]
+
+    def read_page(self, cursor=None, limit=50):
+        """
+        Mengembalikan satu halaman baris log, dari yang terbaru ke belakang (pagination berbasis cursor).
+
+        Args:
+            cursor (int, optional): Hanya baris dengan id < cursor. None untuk halaman terbaru.
+            limit (int): Jumlah baris maksimum.
+
+        Returns:
+            dict: {'rows' (urut naik berdasarkan id), 'next_cursor' (None jika tidak ada baris lebih lama),
+                   'generation', 'last_seq', 'total'}.
+        """
+        with self._connect() as conn:
+            state = self._state(conn)
+            if cursor is None:
+                rows = conn.execute("SELECT * FROM performance_log ORDER BY id DESC LIMIT ?", (limit + 1,)).fetchall()
+            else:
+                rows = conn.execute("SELECT * FROM performance_log WHERE id < ? ORDER BY id DESC LIMIT ?", (cursor, limit + 1)).fetchall()
+        has_more = len(rows) > limit
+        rows = list(reversed(rows[:limit]))
+        state["rows"] = [self._row_to_dict(row) for row in rows]
+        state["next_cursor"] = rows[0]["id"] if has_more and rows else None
+        return state
+
+    def read_since(self, since_seq, limit=500):
+        """
+        Mengembalikan baris yang ditambahkan atau diperbarui setelah `since_seq`.
+
+        Returns:
+            dict: {'rows' (urut naik berdasarkan seq), 'has_more', 'generation', 'last_seq', 'total'}.
+                  Jika has_more True, 'last_seq' adalah seq baris terakhir yang dikembalikan.
+        """
+        with self._connect() as conn:
+            state = self._state(conn)
+            rows = conn.execute(
+                "SELECT * FROM performance_log WHERE seq > ? ORDER BY seq LIMIT ?", (since_seq, limit + 1)
+            ).fetchall()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        state["rows"] = [self._row_to_dict(row) for row in rows]
+        state["has_more"] = has_more
+        if has_more:
+            state["last_seq"] = rows[-1]["seq"]
+        return state
+
+    def state(self):
+        """Mengembalikan (generation, last_seq, total) sebagai dict; murah, cocok untuk ETag."""
+        with self._connect() as conn:
+            return self._state(conn)
+
+    def count(self):
+        """Mengembalikan jumlah baris log."""
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM performance_log").fetchone()[0]
+
+    def clear(self):
+        """Menghapus semua baris log dan menaikkan generation."""
+        with self._write_lock, self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM performance_log")
+            conn.execute("UPDATE performance_log_meta SET value = value + 1 WHERE key = 'generation'")
+
+    def export_xlsx(self):
+        """
+        Membuat file Excel dari seluruh log kinerja di memori.
+
+        Returns:
+            io.BytesIO: Isi file .xlsx, posisi kursor di awal.
+        """
+        from openpyxl import Workbook # Hanya dibutuhkan saat log diunduh
+
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        sheet.append([header for _, header in COLUMNS])
+        with self._connect() as conn:
+            for row in conn.execute("SELECT * FROM performance_log ORDER BY id"):
+                sheet.append([row[name] for name, _ in COLUMNS])
+        buffer = io.BytesIO()
+        workbook.save(buffer)
+        buffer.seek(0)
+        return buffer
+
+    def import_xlsx(self, excel_path):
+        """
+        Mengimpor baris dari file log Excel lama (format sebelum penyimpanan SQLite).
+
+        Returns:
+            int: Jumlah baris yang diimpor.
+        """
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(excel_path, read_only=True)
+        sheet = workbook.active
+        rows = sheet.iter_rows(values_only=True)
+        headers = list(next(rows, []))
+        header_to_name = {header: name for name, header in COLUMNS}
+        imported = 0
+        for row in rows:
+            values = {header_to_name[h]: v for h, v in zip(headers, row) if h in header_to_name}
+            self.append(**values)
+            imported += 1
+        workbook.close()
+        return imported
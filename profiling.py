@@ -0,0 +1,229 @@
+# profiling.py
+# Modul ini menyediakan mode profiling opt-in untuk satu pekerjaan konversi: cProfile di setiap
+# thread yang menjalankan pekerjaan tersebut (thread worker dan thread tahapan StagePipeline)
+# ditambah snapshot tracemalloc. Mulai Python 3.12, cProfile memakai sys.monitoring yang berlaku
+# untuk seluruh proses, sehingga cukup satu profiler sesi yang melihat semua thread. Artefak disimpan di folder per pekerjaan sehingga pekerjaan
+# yang lambat di produksi dapat dianalisis tanpa deploy ulang.
+
+import io # Untuk menulis ringkasan pstats ke string
+import os # Untuk operasi path
+import sys # Untuk memeriksa versi Python (cProfile berbasis sys.monitoring)
+import json # Untuk metadata artefak
+import time # Untuk durasi dan waktu pembuatan
+import random # Untuk sampling
+import shutil # Untuk menghapus artefak lama
+import pstats # Untuk menggabungkan dan meringkas hasil cProfile
+import cProfile # Profiler deterministik bawaan Python
+import logging # Untuk mencatat informasi, peringatan, dan error
+import threading # Untuk lock penggabungan profil dan tracemalloc
+import contextvars # Agar sesi profiling ikut terbawa ke thread tahapan
+import tracemalloc # Untuk snapshot alokasi memori
+from contextlib import contextmanager
+import log_setup # Logging terpusat non-blocking (antrean + JSON dengan ID pekerjaan)
+
+log_setup.configure_logging()
+
+# Nama file artefak di folder profil satu pekerjaan
+PROFILE_STATS_FILE = "cprofile.prof" # Dapat dibuka dengan pstats, snakeviz, atau gprof2dot
+PROFILE_SUMMARY_FILE = "cprofile.txt"
+MEMORY_SUMMARY_FILE = "tracemalloc.txt"
+META_FILE = "meta.json"
+# Jumlah baris teratas pada ringkasan cProfile dan tracemalloc
+SUMMARY_LIMIT = 60
+# Jumlah frame traceback yang disimpan tracemalloc per alokasi
+TRACEMALLOC_FRAMES = 10
+# Sebelum Python 3.12, cProfile hanya melihat thread tempat enable() dipanggil, sehingga setiap thread
+# tahapan memerlukan profilernya sendiri. Mulai 3.12, profiler kedua tidak dapat diaktifkan sama sekali
+# ("Another profiling tool is already active"), tetapi profiler sesi sudah mencakup semua thread.
+PER_THREAD_PROFILERS = sys.version_info < (3, 12)
+
+_current_session = contextvars.ContextVar("profiling_session", default=None)
+# tracemalloc bersifat global per proses; hanya satu sesi yang memilikinya dalam satu waktu
+_tracemalloc_lock = threading.Lock()
+
+
+def should_profile(sample_rate=0.0, forced=False):
+    """Menentukan apakah satu pekerjaan diprofil: dipaksa (misalnya token admin) atau terpilih oleh sampling."""
+    return forced or (sample_rate > 0 and random.random() < sample_rate)
+
+
+class ProfileSession:
+    """
+    Sesi profiling untuk satu pekerjaan, dipakai sebagai context manager di thread yang menjalankannya.
+
+    Thread lain yang menjalankan bagian dari pekerjaan yang sama (misalnya tahapan StagePipeline,
+    yang menyalin konteks) ikut diprofil lewat profile_thread(). Semua profil digabung saat sesi ditutup.
+    Mulai Python 3.12 profiler sesi mencakup semua thread di proses (termasuk pekerjaan lain yang berjalan
+    bersamaan), dan jika profiler lain sudah aktif, pekerjaan tetap berjalan tanpa profil cProfile.
+    Snapshot tracemalloc mencakup seluruh proses, sehingga alokasi pekerjaan lain yang berjalan
+    bersamaan ikut tercatat; jika sesi lain sedang memakai tracemalloc, snapshot memori dilewati.
+    """
+
+    def __init__(self, output_dir, label="", reason=""):
+        """
+        Args:
+            output_dir (str): Folder artefak untuk pekerjaan ini.
+            label (str): Keterangan pekerjaan (misalnya nama file ePub) untuk metadata.
+            reason (str): Alasan profiling ('admin' atau 'sampled').
+        """
+        self.output_dir = output_dir
+        self.label = label
+        self.reason = reason
+        self._stats = None
+        self._lock = threading.Lock()
+        self._profile = None
+        self._token = None
+        self._owns_tracemalloc = False
+        self._started = None
+
+    def add_profile(self, profile):
+        """Menggabungkan hasil cProfile satu thread ke sesi ini."""
+        with self._lock:
+            if self._stats is None:
+                self._stats = pstats.Stats(profile)
+            else:
+                self._stats.add(profile)
+
+    def __enter__(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._started = time.time()
+        if _tracemalloc_lock.acquire(blocking=False):
+            if tracemalloc.is_tracing():
+                _tracemalloc_lock.release() # Sudah dipakai pihak lain (misalnya PYTHONTRACEMALLOC)
+            else:
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+                self._owns_tracemalloc = True
+        self._token = _current_session.set(self)
+        self._profile = cProfile.Profile()
+        try:
+            self._profile.enable()
+        except ValueError as e:
+            # Python 3.12+: profiler lain (misalnya sesi pekerjaan lain) sudah aktif di proses ini
+            logging.warning(f"cProfile tidak dapat diaktifkan untuk '{self.label}': {e}. Pekerjaan dijalankan tanpa profil cProfile.")
+            self._profile = None
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._profile is not None:
+            self._profile.disable()
+        _current_session.reset(self._token)
+        duration = time.time() - self._started
+        # Snapshot memori diambil sebelum pstats bekerja agar alokasinya tidak ikut tercatat
+        snapshot = None
+        if self._owns_tracemalloc:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            _tracemalloc_lock.release()
+            self._owns_tracemalloc = False
+        if self._profile is not None:
+            self.add_profile(self._profile)
+
+        meta = {
+            "label": self.label,
+            "reason": self.reason,
+            "created_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self._started)),
+            "duration_s": round(duration, 3),
+            "status": "failed" if exc_type else "done",
+            "files": [],
+        }
+        try:
+            if self._stats is not None:
+                self._stats.dump_stats(os.path.join(self.output_dir, PROFILE_STATS_FILE))
+                summary = io.StringIO()
+                pstats.Stats(os.path.join(self.output_dir, PROFILE_STATS_FILE), stream=summary).sort_stats("cumulative").print_stats(SUMMARY_LIMIT)
+                with open(os.path.join(self.output_dir, PROFILE_SUMMARY_FILE), "w", encoding="utf-8") as f:
+                    f.write(summary.getvalue())
+                meta["files"] += [PROFILE_STATS_FILE, PROFILE_SUMMARY_FILE]
+            else:
+                meta["cprofile"] = "dilewati: profiler lain sedang aktif"
+
+            if snapshot is not None:
+                meta["traced_memory_peak_mb"] = round(peak / (1024 * 1024), 2)
+                self._write_memory_summary(snapshot, current, peak)
+                meta["files"].append(MEMORY_SUMMARY_FILE)
+            else:
+                meta["tracemalloc"] = "dilewati: sedang dipakai sesi lain"
+
+            with open(os.path.join(self.output_dir, META_FILE), "w", encoding="utf-8") as f:
+                json.dump(meta, f, indent=2, ensure_ascii=False)
+            logging.info(f"Profil pekerjaan '{self.label}' disimpan di '{self.output_dir}'.")
+        except Exception as e:
+            logging.error(f"Gagal menyimpan profil ke '{self.output_dir}': {e}", exc_info=True)
+        return False
+
+    def _write_memory_summary(self, snapshot, current, peak):
+        snapshot = snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            # Alokasi profiler sendiri (hasil cProfile thread tahapan yang digabung)
+            tracemalloc.Filter(False, cProfile.__file__),
+            tracemalloc.Filter(False, pstats.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        ])
+        lines = [
+            f"Memori yang dilacak saat selesai: {current / 1024:.1f} KiB, puncak: {peak / 1024:.1f} KiB",
+            f"{SUMMARY_LIMIT} lokasi alokasi terbesar yang masih hidup:",
+            "",
+        ]
+        for stat in snapshot.statistics("lineno")[:SUMMARY_LIMIT]:
+            lines.append(str(stat))
+        with open(os.path.join(self.output_dir, MEMORY_SUMMARY_FILE), "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+
+@contextmanager
+def profile_thread():
+    """
+    Memprofil blok kode di thread saat ini jika ada sesi profiling aktif di konteksnya.
+    Tanpa sesi aktif, blok dijalankan apa adanya (hanya satu lookup ContextVar). Mulai Python 3.12
+    blok juga dijalankan apa adanya, karena profiler sesi sudah mencatat semua thread.
+    """
+    session = _current_session.get()
+    if session is None or not PER_THREAD_PROFILERS:
+        yield
+        return
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:
+        # Profiler lain sudah aktif; tahapan tetap dijalankan, hanya tanpa profil thread ini
+        yield
+        return
+    try:
+        yield
+    finally:
+        profile.disable()
+        session.add_profile(profile)
+
+
+def list_profiles(root):
+    """
+    Mengembalikan metadata semua profil di folder induk, terbaru lebih dulu.
+
+    Returns:
+        list: dict metadata dengan tambahan kunci 'id' (nama folder profil).
+    """
+    profiles = []
+    if not os.path.isdir(root):
+        return profiles
+    for name in os.listdir(root):
+        meta_path = os.path.join(root, name, META_FILE)
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            continue # Profil yang masih ditulis atau rusak
+        meta["id"] = name
+        profiles.append(meta)
+    profiles.sort(key=lambda meta: meta.get("created_at", ""), reverse=True)
+    return profiles
+
+
+def prune_profiles(root, keep):
+    """Menghapus folder profil paling lama sehingga tersisa paling banyak `keep` profil."""
+    if keep <= 0:
+        return
+    for meta in list_profiles(root)[keep:]:
+        shutil.rmtree(os.path.join(root, meta["id"]), ignore_errors=True)
+        logging.info(f"Profil lama '{meta['id']}' dihapus.")
@@ -0,0 +1,170 @@
+# prompt_compaction.py
+# Modul ini memadatkan konteks ePub sebelum dikirim ke Gemini: membuang boilerplate (header/footer
+# berulang, nomor halaman, daftar isi, judul bab yang berulang), merapikan spasi, lalu mengisi konteks
+# sampai anggaran token tertentu berdasarkan perkiraan token lokal (tanpa memanggil API tokenizer).
+
+import re # Untuk pola nomor halaman, daftar isi, dan pemecahan token
+import math # Untuk pembulatan perkiraan token
+from collections import Counter # Untuk menghitung baris yang berulang antar dokumen
+import log_setup # Logging terpusat non-blocking (antrean + JSON dengan ID pekerjaan)
+
+log_setup.configure_logging()
+
+# Anggaran token default untuk konteks buku (setara kira-kira dengan 5 chunk x 1500 karakter teks Arab)
+DEFAULT_CONTEXT_TOKEN_BUDGET = 3000
+# Jumlah baris di awal dan akhir setiap dokumen yang diperiksa sebagai header/footer
+EDGE_LINES = 3
+# Baris tepi dianggap boilerplate jika muncul di sekurang-kurangnya sekian dokumen spine
+BOILERPLATE_MIN_DOCUMENTS = 3
+# Baris yang lebih panjang dari ini dianggap isi, bukan header/footer
+BOILERPLATE_MAX_CHARS = 80
+# Dokumen dianggap daftar isi jika memiliki sekurang-kurangnya sekian baris dan sebagian besar berupa entri daftar isi
+TOC_MIN_LINES = 5
+TOC_LINE_RATIO = 0.6
+# Perkiraan jumlah karakter per token untuk tokenizer SentencePiece (Gemini)
+ARABIC_CHARS_PER_TOKEN = 3.0
+LATIN_CHARS_PER_TOKEN = 4.0
+DIGITS_PER_TOKEN = 3.0
+
+PAGE_NUMBER_PATTERN = re.compile(r"^(?:page|hal(?:aman)?\.?|صفحة|ص)?\s*[\d٠-٩]+(?:\s*(?:/|dari|of|من)\s*[\d٠-٩]+)?$|^[ivxlcdm]+$", re.IGNORECASE)
+# Entri daftar isi: judul diikuti titik/spasi pengisi dan nomor halaman
+TOC_ENTRY_PATTERN = re.compile(r"^.{1,120}?[\s.·…_-]{2,}[\d٠-٩]+$")
+# Karakter tanpa lebar dan soft hyphen yang tidak menambah makna tetapi menambah token
+INVISIBLE_CHARS_PATTERN = re.compile(r"[\u200b-\u200d\u2060\ufeff\u00ad]")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+TOKEN_PATTERN = re.compile(r"[^\W\d_]+|\d+|[^\w\s]")
+ARABIC_CHAR_PATTERN = re.compile(r"[\u0600-\u06FF\u0750-\u077F\u08A0-\u08FF\uFB50-\uFDFF\uFE70-\uFEFF]")
+
+
+def estimate_tokens(text):
+    """
+    Memperkirakan jumlah token teks tanpa memanggil API: kata Arab sekitar 3 karakter per token,
+    kata Latin sekitar 4 karakter per token, angka 3 digit per token, dan setiap tanda baca satu token.
+    """
+    total = 0
+    for piece in TOKEN_PATTERN.findall(text):
+        if piece.isdigit():
+            total += math.ceil(len(piece) / DIGITS_PER_TOKEN)
+        elif piece[0].isalpha():
+            chars_per_token = ARABIC_CHARS_PER_TOKEN if ARABIC_CHAR_PATTERN.match(piece) else LATIN_CHARS_PER_TOKEN
+            total += math.ceil(len(piece) / chars_per_token)
+        else:
+            total += 1
+    return total
+
+
+def normalize_whitespace(text):
+    """Menghapus karakter tanpa lebar dan menyatukan spasi/baris baru berturut-turut menjadi satu spasi."""
+    return WHITESPACE_PATTERN.sub(" ", INVISIBLE_CHARS_PATTERN.sub("", text)).strip()
+
+
+def _line_key(line):
+    # Header berulang sering memuat nomor halaman yang berbeda; angka diabaikan saat membandingkan
+    return re.sub(r"[\d٠-٩]+", "#", line.lower())
+
+
+def _is_toc_document(lines, chapter_titles):
+    if len(lines) < TOC_MIN_LINES:
+        return False
+    toc_lines = sum(1 for line in lines if line in chapter_titles or TOC_ENTRY_PATTERN.match(line))
+    return toc_lines >= TOC_LINE_RATIO * len(lines)
+
+
+def strip_boilerplate(pages):
+    """
+    Membuang boilerplate dari teks per dokumen spine.
+
+    Hanya baris di tepi dokumen (EDGE_LINES pertama dan terakhir) yang dapat dianggap header/footer,
+    sehingga potongan teks pendek di tengah isi (misalnya kata bercetak tebal) tidak ikut terbuang.
+    Baris tepi yang berulang di banyak dokumen hanya dipertahankan pada kemunculan pertamanya, sehingga
+    judul bab yang berulang di setiap bagian bab tetap muncul sekali.
+
+    Args:
+        pages (list): dict per dokumen dengan kunci 'strings' (potongan teks berurutan) dan 'chapter'
+                      (judul dokumen atau None), seperti hasil tahapan page_text di conversion.
+
+    Returns:
+        tuple: (cleaned_pages, removed_tokens, stats)
+               cleaned_pages (list): Teks bersih per dokumen (string, bisa kosong).
+               removed_tokens (list): Perkiraan token yang dibuang per dokumen.
+               stats (dict): Jumlah 'boilerplate_lines_removed' dan 'toc_documents_removed'.
+    """
+    documents = [[normalize_whitespace(piece) for piece in page["strings"]] for page in pages]
+    documents = [[line for line in lines if line] for lines in documents]
+    chapter_titles = {normalize_whitespace(page["chapter"]) for page in pages if page.get("chapter")}
+
+    def edge_indexes(lines):
+        # Pada dokumen pendek, hanya baris pertama dan terakhir yang dianggap tepi agar isinya tidak habis
+        edge = EDGE_LINES if len(lines) > 2 * EDGE_LINES else 1
+        return set(range(min(edge, len(lines)))) | set(range(max(0, len(lines) - edge), len(lines)))
+
+    # Hitung di berapa dokumen setiap baris tepi muncul
+    document_counts = Counter()
+    for lines in documents:
+        document_counts.update({_line_key(lines[index]) for index in edge_indexes(lines) if len(lines[index]) <= BOILERPLATE_MAX_CHARS})
+
+    cleaned_pages = []
+    removed_tokens = []
+    seen_repeated = set()
+    stats = {"boilerplate_lines_removed": 0, "toc_documents_removed": 0}
+    for page, lines in zip(pages, documents):
+        chapter_title = normalize_whitespace(page.get("chapter") or "")
+        if _is_toc_document(lines, chapter_titles):
+            cleaned_pages.append("")
+            removed_tokens.append(estimate_tokens(" ".join(lines)))
+            stats["toc_documents_removed"] += 1
+            continue
+        kept = []
+        removed = []
+        edges = edge_indexes(lines)
+        for index, line in enumerate(lines):
+            if index in edges:
+                # Judul bab dokumen ini dibandingkan apa adanya agar "Bab 2" tidak dianggap sama dengan "Bab 1"
+                key = line if line == chapter_title else _line_key(line)
+                if PAGE_NUMBER_PATTERN.match(line):
+                    removed.append(line)
+                    continue
+                if document_counts[_line_key(line)] >= BOILERPLATE_MIN_DOCUMENTS and len(line) <= BOILERPLATE_MAX_CHARS:
+                    if key in seen_repeated:
+                        removed.append(line)
+                        continue
+                    seen_repeated.add(key)
+            kept.append(line)
+        cleaned_pages.append(" ".join(kept))
+        removed_tokens.append(estimate_tokens(" ".join(removed)) if removed else 0)
+        stats["boilerplate_lines_removed"] += len(removed)
+    return cleaned_pages, removed_tokens, stats
+
+
+def fill_token_budget(chunks, token_budget):
+    """
+    Menyusun konteks dari chunk berurutan sampai anggaran token terpenuhi. Chunk terakhir yang
+    tidak muat seluruhnya dipotong di batas kata.
+
+    Returns:
+        tuple: (context, context_tokens, chunks_used, chars_used)
+    """
+    selected = []
+    used_tokens = 0
+    chars_used = 0
+    for chunk in chunks:
+        chunk_tokens = estimate_tokens(chunk)
+        if used_tokens + chunk_tokens <= token_budget:
+            selected.append(chunk)
+            used_tokens += chunk_tokens
+            chars_used += len(chunk) + 1
+            continue
+        # Potong chunk terakhir agar tetap di bawah anggaran
+        words = []
+        for word in chunk.split(" "):
+            word_tokens = estimate_tokens(word)
+            if used_tokens + word_tokens > token_budget:
+                break
+            words.append(word)
+            used_tokens += word_tokens
+        if words:
+            partial = " ".join(words)
+            selected.append(partial)
+            chars_used += len(partial) + 1
+        break
+    return "\n\n".join(selected), used_tokens, len(selected), chars_used
@@ -0,0 +1,421 @@
+# render_service.py
+# Modul ini memisahkan rendering Chromium dari worker Flask: node web mengirim dokumen HTML ke broker,
+# sedangkan proses render worker terpisah (di host yang sama atau host lain) mengambil tugas dari broker,
+# merendernya dengan satu browser bersama, lalu mengembalikan path gambar yang dihasilkan.
+# Dengan begitu kapasitas render dapat diskalakan secara horizontal tanpa menambah worker web.
+#
+# Broker dapat diganti (lihat open_broker): SQLite untuk satu host, atau folder bersama (file system)
+# sebagai pengganti lokal untuk broker antrean sungguhan. Folder ekstraksi ePub (base_url) dan folder
+# output harus dapat diakses dengan path yang sama oleh node web dan render worker (misalnya NFS).
+#
+# Menjalankan render worker:
+#     python render_service.py --broker sqlite:///uploads/render_broker.sqlite3
+
+import os # Untuk operasi path dan file broker
+import sys # Untuk kode keluar CLI
+import json # Untuk serialisasi tugas dan hasil
+import time # Untuk lease dan polling
+import uuid # Untuk ID tugas yang unik
+import socket # Untuk identitas render worker
+import sqlite3 # Backend broker SQLite
+import logging # Untuk mencatat informasi, peringatan, dan error
+import argparse # Untuk antarmuka baris perintah render worker
+
+import image_delivery # Pola nama file halaman untuk memetakan gambar ke nomor halamannya
+from job_queue import STATUS_QUEUED, STATUS_RUNNING, STATUS_DONE, STATUS_FAILED
+import log_setup # Logging terpusat non-blocking (antrean + JSON dengan ID pekerjaan)
+
+log_setup.configure_logging()
+
+# Jumlah halaman per tugas render; satu buku dibagi ke beberapa tugas agar dikerjakan beberapa worker sekaligus
+PAGES_PER_TASK = 4
+# Lama (detik) sebuah tugas boleh dipegang worker sebelum dianggap terputus dan diambil worker lain
+DEFAULT_LEASE_SECONDS = 300
+# Tugas yang sudah diklaim sebanyak ini (misalnya karena worker crash berulang kali) ditandai gagal
+MAX_ATTEMPTS = 3
+# Interval polling (detik) node web dan render worker
+DEFAULT_POLL_INTERVAL = 0.2
+# Batas waktu default (detik) node web menunggu semua tugas satu buku selesai
+DEFAULT_RENDER_TIMEOUT = 600
+
+
+class RenderTimeoutError(Exception):
+    """Dimunculkan ketika tugas render tidak selesai dalam batas waktu (misalnya tidak ada render worker yang berjalan)."""
+
+
+class SQLiteRenderBroker:
+    """
+    Broker tugas render berbasis SQLite (mode WAL). Cocok untuk node web dan render worker di satu host;
+    tugas diklaim secara atomik dengan BEGIN IMMEDIATE seperti JobQueue.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS render_tasks (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    payload TEXT NOT NULL,
+                    worker TEXT,
+                    lease_expires_at REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    result TEXT,
+                    error TEXT
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_render_tasks_status ON render_tasks (status, created_at)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def submit(self, payload):
+        """Menambahkan tugas render dan mengembalikan ID-nya."""
+        task_id = uuid.uuid4().hex
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO render_tasks (id, status, created_at, payload) VALUES (?, ?, ?, ?)",
+                (task_id, STATUS_QUEUED, time.time(), json.dumps(payload))
+            )
+        return task_id
+
+    def claim(self, worker, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """
+        Mengklaim tugas tertua yang mengantre atau yang lease-nya sudah habis.
+
+        Returns:
+            tuple: (task_id, payload), atau None jika tidak ada tugas.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            while True:
+                row = conn.execute(
+                    "SELECT id, payload, attempts FROM render_tasks WHERE status = ? OR (status = ? AND lease_expires_at < ?) ORDER BY created_at LIMIT 1",
+                    (STATUS_QUEUED, STATUS_RUNNING, now)
+                ).fetchone()
+                if row is None:
+                    return None
+                if row["attempts"] >= MAX_ATTEMPTS:
+                    conn.execute(
+                        "UPDATE render_tasks SET status = ?, error = ? WHERE id = ?",
+                        (STATUS_FAILED, f"Tugas render gagal setelah {MAX_ATTEMPTS} percobaan (worker terputus).", row["id"])
+                    )
+                    continue
+                conn.execute(
+                    "UPDATE render_tasks SET status = ?, worker = ?, lease_expires_at = ?, attempts = attempts + 1 WHERE id = ?",
+                    (STATUS_RUNNING, worker, now + lease_seconds, row["id"])
+                )
+                return row["id"], json.loads(row["payload"])
+
+    def complete(self, task_id, image_paths):
+        with self._connect() as conn:
+            conn.execute("UPDATE render_tasks SET status = ?, result = ? WHERE id = ?", (STATUS_DONE, json.dumps(image_paths), task_id))
+
+    def fail(self, task_id, error):
+        with self._connect() as conn:
+            conn.execute("UPDATE render_tasks SET status = ?, error = ? WHERE id = ?", (STATUS_FAILED, error, task_id))
+
+    def result(self, task_id):
+        """
+        Returns:
+            dict: {'status', 'image_paths', 'error'} jika tugas sudah selesai atau gagal, atau None.
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT status, result, error FROM render_tasks WHERE id = ?", (task_id,)).fetchone()
+        if row is None or row["status"] not in (STATUS_DONE, STATUS_FAILED):
+            return None
+        return {"status": row["status"], "image_paths": json.loads(row["result"]) if row["result"] else [], "error": row["error"]}
+
+    def delete(self, task_id):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM render_tasks WHERE id = ?", (task_id,))
+
+    def depth(self):
+        """Jumlah tugas yang masih mengantre."""
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM render_tasks WHERE status = ?", (STATUS_QUEUED,)).fetchone()[0]
+
+
+class FileSystemRenderBroker:
+    """
+    Broker tugas render berbasis folder (queued/, running/, done/). Klaim memakai os.rename yang atomik,
+    sehingga beberapa render worker dapat berbagi satu folder, termasuk folder jaringan bersama.
+    Waktu modifikasi file di running/ dipakai sebagai awal lease.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.queued_dir = os.path.join(root, STATUS_QUEUED)
+        self.running_dir = os.path.join(root, STATUS_RUNNING)
+        self.done_dir = os.path.join(root, STATUS_DONE)
+        for path in (self.queued_dir, self.running_dir, self.done_dir):
+            os.makedirs(path, exist_ok=True)
+
+    @staticmethod
+    def _write_json(path, data):
+        # Ditulis ke file sementara lalu di-rename agar pembaca tidak pernah melihat file setengah jadi
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(temp_path, path)
+
+    def submit(self, payload):
+        task_id = uuid.uuid4().hex
+        # Prefix waktu menjaga urutan FIFO saat folder didaftar
+        self._write_json(os.path.join(self.queued_dir, f"{time.time_ns()}_{task_id}.json"), {"id": task_id, "attempts": 0, "payload": payload})
+        return task_id
+
+    def _requeue_expired(self, lease_seconds):
+        now = time.time()
+        for name in os.listdir(self.running_dir):
+            path = os.path.join(self.running_dir, name)
+            try:
+                if name.endswith(".json") and os.path.getmtime(path) + lease_seconds < now:
+                    os.rename(path, os.path.join(self.queued_dir, name))
+                    logging.warning(f"Lease tugas render '{name}' habis; tugas dikembalikan ke antrean.")
+            except FileNotFoundError:
+                pass # Sudah diselesaikan atau dipindahkan worker lain
+
+    def claim(self, worker, lease_seconds=DEFAULT_LEASE_SECONDS):
+        self._requeue_expired(lease_seconds)
+        for name in sorted(name for name in os.listdir(self.queued_dir) if name.endswith(".json")):
+            running_path = os.path.join(self.running_dir, name)
+            try:
+                os.rename(os.path.join(self.queued_dir, name), running_path)
+            except FileNotFoundError:
+                continue # Diklaim worker lain lebih dulu
+            with open(running_path, encoding="utf-8") as f:
+                task = json.load(f)
+            task["attempts"] += 1
+            task["worker"] = worker
+            if task["attempts"] > MAX_ATTEMPTS:
+                self._finish(task["id"], running_path, {"status": STATUS_FAILED, "image_paths": [], "error": f"Tugas render gagal setelah {MAX_ATTEMPTS} percobaan (worker terputus)."})
+                continue
+            self._write_json(running_path, task) # Juga memperbarui mtime sebagai awal lease
+            return task["id"], task["payload"]
+        return None
+
+    def _running_path(self, task_id):
+        for name in os.listdir(self.running_dir):
+            if name.endswith(f"_{task_id}.json"):
+                return os.path.join(self.running_dir, name)
+        return None
+
+    def _finish(self, task_id, running_path, result):
+        self._write_json(os.path.join(self.done_dir, f"{task_id}.json"), result)
+        if running_path:
+            try:
+                os.remove(running_path)
+            except FileNotFoundError:
+                pass
+
+    def complete(self, task_id, image_paths):
+        self._finish(task_id, self._running_path(task_id), {"status": STATUS_DONE, "image_paths": image_paths, "error": None})
+
+    def fail(self, task_id, error):
+        self._finish(task_id, self._running_path(task_id), {"status": STATUS_FAILED, "image_paths": [], "error": error})
+
+    def result(self, task_id):
+        try:
+            with open(os.path.join(self.done_dir, f"{task_id}.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def delete(self, task_id):
+        paths = [os.path.join(self.done_dir, f"{task_id}.json")]
+        for directory in (self.queued_dir, self.running_dir):
+            paths.extend(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(f"_{task_id}.json"))
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def depth(self):
+        return sum(1 for name in os.listdir(self.queued_dir) if name.endswith(".json"))
+
+
+def open_broker(url):
+    """
+    Membuka broker berdasarkan URL.
+
+    Args:
+        url (str): 'sqlite:///<path database>' atau 'file:///<folder bersama>'. Path relatif diperbolehkan
+                   (misalnya 'sqlite:///uploads/render_broker.sqlite3').
+
+    Raises:
+        ValueError: Jika skema URL tidak dikenal.
+    """
+    scheme, separator, path = url.partition(":///")
+    if not separator or not path:
+        raise ValueError(f"URL broker render '{url}' tidak valid. Gunakan sqlite:///<path> atau file:///<folder>.")
+    if scheme == "sqlite":
+        return SQLiteRenderBroker(path)
+    if scheme == "file":
+        return FileSystemRenderBroker(path)
+    raise ValueError(f"Skema broker render '{scheme}' tidak dikenal. Pilihan: sqlite, file.")
+
+
+class RemoteRenderer:
+    """
+    Pengganti image_renderer.render_html_to_images yang mengirim halaman ke render worker lewat broker.
+    Dapat diteruskan sebagai `renderer` ke conversion.convert_epub.
+    """
+
+    def __init__(self, broker, timeout=DEFAULT_RENDER_TIMEOUT, poll_interval=DEFAULT_POLL_INTERVAL, pages_per_task=PAGES_PER_TASK):
+        """
+        Args:
+            broker: SQLiteRenderBroker, FileSystemRenderBroker, atau objek lain dengan API yang sama.
+            timeout (float): Batas waktu (detik) menunggu semua tugas satu pemanggilan selesai.
+            poll_interval (float): Interval polling hasil tugas (detik).
+            pages_per_task (int): Jumlah halaman per tugas render.
+        """
+        self.broker = broker
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.pages_per_task = max(1, pages_per_task)
+
+    def render_html_to_images(self, html_contents, output_dir, epub_filename_prefix="epub", base_url=None, on_page_rendered=None, browser=None, page_numbers=None, preset=None):
+        """
+        Signature sama dengan image_renderer.render_html_to_images (argumen `browser` diabaikan).
+        Halaman yang gagal dirender dilewati seperti pada renderer lokal.
+
+        Raises:
+            RenderTimeoutError: Jika tugas tidak selesai dalam batas waktu.
+        """
+        page_numbers = list(page_numbers or range(1, len(html_contents) + 1))
+        output_dir = os.path.abspath(output_dir) # Render worker dapat berjalan dengan direktori kerja lain
+        pending = {}
+        for start in range(0, len(html_contents), self.pages_per_task):
+            task_id = self.broker.submit({
+                "html_contents": html_contents[start:start + self.pages_per_task],
+                "page_numbers": page_numbers[start:start + self.pages_per_task],
+                "output_dir": output_dir,
+                "epub_filename_prefix": epub_filename_prefix,
+                "base_url": base_url,
+                "preset": preset,
+                "job_id": log_setup.current_job_id(), # Agar log render worker dapat dikaitkan dengan pekerjaannya
+            })
+            pending[task_id] = start
+        logging.info(f"{len(html_contents)} halaman dikirim ke render worker sebagai {len(pending)} tugas.")
+
+        rendered = {}
+        deadline = time.monotonic() + self.timeout
+        try:
+            while pending:
+                for task_id in list(pending):
+                    result = self.broker.result(task_id)
+                    if result is None:
+                        continue
+                    start = pending.pop(task_id)
+                    self.broker.delete(task_id)
+                    if result["status"] == STATUS_FAILED:
+                        logging.error(f"Tugas render halaman {page_numbers[start]}+ gagal di render worker: {result['error']}")
+                    for image_path in result["image_paths"]:
+                        page_number = int(image_delivery.PAGE_FILENAME_PATTERN.search(image_path).group(1))
+                        rendered[page_number] = image_path
+                        if on_page_rendered:
+                            on_page_rendered(page_number, image_path)
+                if pending:
+                    if time.monotonic() > deadline:
+                        raise RenderTimeoutError(f"{len(pending)} tugas render belum selesai setelah {self.timeout} detik. Pastikan render worker berjalan.")
+                    time.sleep(self.poll_interval)
+        finally:
+            for task_id in pending:
+                self.broker.delete(task_id) # Tugas yang ditinggalkan tidak perlu dikerjakan lagi
+        return [rendered[page_number] for page_number in page_numbers if page_number in rendered]
+
+
+class RenderWorker:
+    """Loop render worker: mengklaim tugas dari broker dan merendernya dengan satu Chromium bersama."""
+
+    def __init__(self, broker, lease_seconds=DEFAULT_LEASE_SECONDS, poll_interval=DEFAULT_POLL_INTERVAL, renderer=None):
+        """
+        Args:
+            broker: Broker tugas render (lihat open_broker).
+            lease_seconds (float): Lease setiap tugas; harus lebih lama dari waktu render satu tugas.
+            poll_interval (float): Jeda saat antrean kosong (detik).
+            renderer (callable, optional): Pengganti image_renderer.SharedBrowser().render_html_to_images.
+        """
+        self.broker = broker
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._shared_browser = None
+        self._renderer = renderer
+
+    def _render(self, payload):
+        if self._renderer is None:
+            import image_renderer # Diimpor lazy: Playwright hanya dibutuhkan di proses render worker
+            self._shared_browser = image_renderer.SharedBrowser()
+            self._renderer = self._shared_browser.render_html_to_images
+        return self._renderer(
+            payload["html_contents"],
+            payload["output_dir"],
+            payload["epub_filename_prefix"],
+            base_url=payload["base_url"],
+            page_numbers=payload["page_numbers"],
+            preset=payload["preset"],
+        )
+
+    def run_once(self):
+        """Mengerjakan satu tugas jika ada. Mengembalikan True jika ada tugas yang dikerjakan."""
+        claimed = self.broker.claim(self.worker_id, self.lease_seconds)
+        if claimed is None:
+            return False
+        task_id, payload = claimed
+        with log_setup.job_context(payload.get("job_id") or task_id):
+            try:
+                image_paths = self._render(payload)
+                self.broker.complete(task_id, image_paths)
+                logging.info(f"Tugas render '{task_id}' selesai: {len(image_paths)} dari {len(payload['html_contents'])} halaman.")
+            except Exception as e:
+                logging.error(f"Tugas render '{task_id}' gagal: {e}", exc_info=True)
+                self.broker.fail(task_id, str(e))
+        return True
+
+    def run_forever(self):
+        logging.info(f"Render worker '{self.worker_id}' berjalan.")
+        try:
+            while True:
+                if not self.run_once():
+                    time.sleep(self.poll_interval)
+        finally:
+            if self._shared_browser is not None:
+                self._shared_browser.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Render worker: merender halaman ePub dari broker tugas render dengan Chromium.",
+        epilog="Tugas render hanya berisi path, bukan isi file: worker ini harus dapat membaca folder scratch node web "
+               "(WORKSPACE_SCRATCH_DIR, wajib diatur eksplisit di node web, bukan /dev/shm lokal) dan menulis ke folder "
+               "generated_images dengan path yang sama, misalnya lewat NFS. Folder scratch dibuat dengan mode 0700, "
+               "sehingga worker harus berjalan sebagai user yang sama dengan node web."
+    )
+    parser.add_argument("--broker", default=os.getenv("RENDER_BROKER_URL", ""), help="URL broker: sqlite:///<path> atau file:///<folder> (default: RENDER_BROKER_URL).")
+    parser.add_argument("--lease-seconds", type=float, default=DEFAULT_LEASE_SECONDS, help="Lease setiap tugas sebelum diambil alih worker lain.")
+    parser.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL, help="Jeda polling saat antrean kosong (detik).")
+    args = parser.parse_args(argv)
+    if not args.broker:
+        parser.error("URL broker wajib diisi (--broker atau RENDER_BROKER_URL).")
+    try:
+        broker = open_broker(args.broker)
+    except ValueError as e:
+        parser.error(str(e))
+    try:
+        RenderWorker(broker, lease_seconds=args.lease_seconds, poll_interval=args.poll_interval).run_forever()
+    except KeyboardInterrupt:
+        logging.info("Render worker dihentikan.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
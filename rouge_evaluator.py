@@ -0,0 +1,209 @@
+# rouge_evaluator.py
+# Modul ini menghitung ROUGE Score di luar jalur request. Respons LLM yang tercatat di log
+# kinerja dinilai secara batch oleh satu worker latar belakang yang memakai ulang satu
+# RougeScorer, lalu hasilnya ditulis kembali ke log kinerja.
+#
+# Modul ini juga dapat dijalankan langsung untuk menilai ulang seluruh riwayat log secara offline:
+#   python rouge_evaluator.py --references referensi.json
+
+import os # Untuk operasi path
+import sys # Untuk kode keluar CLI
+import json # Untuk membaca file referensi
+import time # Untuk batas waktu pengumpulan batch
+import queue # Antrean ID log yang menunggu dinilai
+import logging # Untuk mencatat informasi, peringatan, dan error
+import argparse # Untuk antarmuka baris perintah penilaian ulang offline
+import threading # Untuk worker latar belakang
+
+from performance_log import PerformanceLogStore
+import log_setup # Logging terpusat non-blocking (antrean + JSON dengan ID pekerjaan)
+
+log_setup.configure_logging()
+
+# Jenis referensi yang dipakai untuk menghitung skor (disimpan di kolom "ROUGE Reference")
+REFERENCE_HUMAN = "human" # Teks referensi yang ditulis manusia
+REFERENCE_PROMPT = "prompt" # Fallback: prompt pengguna, jika belum ada referensi manusia
+
+
+class RougeEvaluator:
+    """
+    Worker evaluasi ROUGE-1 latar belakang.
+
+    ID baris log yang baru dicatat dimasukkan ke antrean dengan enqueue(). Worker mengumpulkan
+    ID yang datang berdekatan menjadi satu batch, membaca barisnya dengan satu query, menilainya
+    dengan RougeScorer yang sama, lalu menulis semua skor dalam satu transaksi.
+    """
+
+    def __init__(self, store, batch_size=32, batch_wait=0.5):
+        """
+        Args:
+            store (PerformanceLogStore): Penyimpanan log kinerja yang dinilai dan diperbarui.
+            batch_size (int): Jumlah maksimum baris per batch.
+            batch_wait (float): Waktu tunggu (detik) untuk mengumpulkan ID tambahan ke dalam batch.
+        """
+        self.store = store
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self._queue = queue.Queue()
+        self._scorer = None
+        self._scorer_lock = threading.Lock()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def _get_scorer(self):
+        # Satu RougeScorer dibuat sekali lalu dipakai ulang untuk semua penilaian
+        with self._scorer_lock:
+            if self._scorer is None:
+                from rouge_score import rouge_scorer # Hanya dibutuhkan saat ada respons yang dinilai
+                self._scorer = rouge_scorer.RougeScorer(['rouge1'], use_stemmer=True)
+            return self._scorer
+
+    def score_text(self, reference_text, generated_text):
+        """
+        Menghitung ROUGE-1 F1 Score antara teks referensi dan teks yang dihasilkan.
+
+        Returns:
+            float: Skor dibulatkan ke 4 angka di belakang koma, 0.0 jika salah satu teks kosong.
+        """
+        if not reference_text or not generated_text:
+            return 0.0
+        score = self._get_scorer().score(reference_text, generated_text)
+        return round(score['rouge1'].fmeasure, 4)
+
+    def score_rows(self, rows):
+        """
+        Menilai baris log. Referensi manusia dipakai jika ada; jika tidak, prompt pengguna.
+
+        Args:
+            rows (list): Baris dari PerformanceLogStore.read_for_scoring / iter_for_scoring.
+
+        Returns:
+            dict: ID baris -> {'rouge1_f1', 'rouge_reference'}, siap untuk update_many.
+        """
+        updates = {}
+        for row in rows:
+            if row["reference_text"]:
+                reference_text, reference_kind = row["reference_text"], REFERENCE_HUMAN
+            else:
+                reference_text, reference_kind = row["llm_prompt"], REFERENCE_PROMPT
+            updates[row["id"]] = {
+                "rouge1_f1": self.score_text(reference_text, row["llm_response"]),
+                "rouge_reference": reference_kind,
+            }
+        return updates
+
+    def evaluate_ids(self, row_ids):
+        """
+        Menilai baris dengan ID tertentu dan menulis hasilnya ke log. Baris yang sedang diklaim proses
+        lain dilewati. Mengembalikan jumlah baris yang dinilai.
+        """
+        return self._evaluate_claimed(self.store.claim_for_scoring(row_ids))
+
+    def evaluate_backlog(self):
+        """
+        Menilai baris yang belum sempat dinilai (misalnya karena server berhenti sebelum worker selesai),
+        per batch dan dengan klaim atomik agar tidak dinilai ganda oleh proses lain.
+
+        Returns:
+            int: Jumlah baris yang dinilai.
+        """
+        evaluated = 0
+        while True:
+            rows = self.store.claim_for_scoring(limit=self.batch_size)
+            if not rows:
+                return evaluated
+            evaluated += self._evaluate_claimed(rows)
+
+    def _evaluate_claimed(self, rows):
+        updates = self.score_rows(rows)
+        for values in updates.values():
+            values["scoring_claimed_at"] = None # Lepas klaim bersamaan dengan penulisan skor
+        self.store.update_many(updates)
+        return len(updates)
+
+    def rescore_all(self, only_unscored=False):
+        """
+        Menilai ulang seluruh riwayat log (misalnya setelah referensi manusia ditambahkan).
+
+        Returns:
+            int: Jumlah baris yang dinilai.
+        """
+        evaluated = 0
+        for rows in self.store.iter_for_scoring(batch_size=self.batch_size, only_unscored=only_unscored):
+            self.store.update_many(self.score_rows(rows))
+            evaluated += len(rows)
+        return evaluated
+
+    def enqueue(self, row_id):
+        """Menjadwalkan satu baris log untuk dinilai oleh worker latar belakang."""
+        self._queue.put(row_id)
+
+    def start(self):
+        """
+        Menjalankan worker latar belakang (hanya sekali per proses). Baris yang belum sempat dinilai
+        diproses oleh worker itu sendiri (evaluate_backlog), bukan di thread pemanggil.
+        """
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="rouge-evaluator", daemon=True)
+            self._thread.start()
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        try:
+            evaluated = self.evaluate_backlog()
+            if evaluated:
+                logging.info(f"ROUGE Score dihitung untuk {evaluated} baris log kinerja yang tertunda.")
+        except Exception as e:
+            logging.error(f"Gagal menilai baris log kinerja yang tertunda: {e}", exc_info=True)
+        while True:
+            batch = self._next_batch()
+            try:
+                evaluated = self.evaluate_ids(batch)
+                logging.info(f"ROUGE Score dihitung untuk {evaluated} baris log kinerja.")
+            except Exception as e:
+                logging.error(f"Gagal menghitung ROUGE Score untuk baris {batch}: {e}", exc_info=True)
+
+
+def main(argv=None):
+    """Titik masuk CLI untuk menilai ulang ROUGE Score seluruh riwayat log kinerja secara offline."""
+    parser = argparse.ArgumentParser(description="Menilai ulang ROUGE Score seluruh riwayat log kinerja.")
+    parser.add_argument("--db", default=os.path.join("uploads", "performance_log.sqlite3"), help="Path database log kinerja.")
+    parser.add_argument("--references", help="File JSON berisi {ID log atau nama file ePub: teks referensi manusia}.")
+    parser.add_argument("--only-unscored", action="store_true", help="Hanya nilai baris yang belum memiliki skor.")
+    parser.add_argument("--batch-size", type=int, default=100, help="Jumlah baris per batch.")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        logging.error(f"Database log kinerja '{args.db}' tidak ditemukan.")
+        return 1
+
+    store = PerformanceLogStore(args.db)
+    evaluator = RougeEvaluator(store, batch_size=args.batch_size)
+
+    if args.references:
+        with open(args.references, encoding="utf-8") as f:
+            references = json.load(f)
+        updated_ids = store.set_references(references)
+        logging.info(f"Referensi manusia disimpan untuk {len(updated_ids)} baris log.")
+
+    evaluated = evaluator.rescore_all(only_unscored=args.only_unscored)
+    logging.info(f"Selesai: {evaluated} baris log kinerja dinilai ulang.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,290 @@
+# search_index.py
+# Modul ini menyimpan teks setiap bab/halaman buku yang sudah diproses di indeks teks penuh
+# SQLite FTS5, sehingga pengguna dapat mencari kutipan tanpa mengunggah dan mengekstrak ulang buku.
+# Teks Arab dinormalisasi sebelum diindeks (harakat, tatweel, varian alef dan ya), dan kueri
+# dinormalisasi dengan cara yang sama, sehingga "الْكِتَابُ" cocok dengan "الكتاب" dan "إلى" dengan "الى".
+
+import os # Untuk operasi path
+import re # Untuk memecah kueri menjadi kata dan mencari posisi kata di cuplikan
+import time # Untuk timestamp buku yang diindeks
+import sqlite3 # Backend indeks (FTS5)
+import logging # Untuk mencatat informasi, peringatan, dan error
+import threading # Untuk menyerialkan penulisan dari banyak thread
+import log_setup # Logging terpusat non-blocking (antrean + JSON dengan ID pekerjaan)
+
+log_setup.configure_logging()
+
+# Karakter yang dihapus: tanda baca Al-Qur'an, harakat, alef kecil (superscript), dan tatweel
+_ARABIC_REMOVED = (
+    list(range(0x0610, 0x061B)) + list(range(0x064B, 0x0660)) + [0x0670, 0x0640]
+    + list(range(0x06D6, 0x06DD)) + list(range(0x06DF, 0x06E9)) + list(range(0x06EA, 0x06EE))
+)
+# Varian alef (أ إ آ ٱ) -> ا, varian ya (ى ی ئ) -> ي
+_ARABIC_REPLACED = {
+    0x0623: "ا", 0x0625: "ا", 0x0622: "ا", 0x0671: "ا",
+    0x0649: "ي", 0x06CC: "ي", 0x0626: "ي",
+}
+ARABIC_NORMALIZATION_TABLE = {**{codepoint: None for codepoint in _ARABIC_REMOVED}, **_ARABIC_REPLACED}
+
+# Panjang maksimum satu passage (baris indeks) dalam karakter; hasil pencarian berupa passage
+PASSAGE_MAX_CHARS = 600
+# Panjang cuplikan yang dikembalikan per hasil
+SNIPPET_CHARS = 200
+# Batas jumlah hasil per pencarian
+MAX_RESULTS = 50
+# Kata kueri: huruf/angka (termasuk Arab), opsional diakhiri * untuk pencarian awalan
+QUERY_TERM_PATTERN = re.compile(r"\w+\*?")
+
+
+def normalize_text(text):
+    """Menormalisasi teks Arab untuk pengindeksan dan kueri (huruf besar/kecil ditangani tokenizer FTS5)."""
+    return text.translate(ARABIC_NORMALIZATION_TABLE)
+
+
+def split_passages(strings, max_chars=PASSAGE_MAX_CHARS):
+    """
+    Menggabungkan potongan teks berurutan satu halaman (misalnya hasil BeautifulSoup.stripped_strings)
+    menjadi passage dengan panjang paling banyak `max_chars`. Potongan yang lebih panjang dipecah di batas kata.
+
+    Returns:
+        list: Teks passage.
+    """
+    passages = []
+    current = ""
+    for piece in strings:
+        words = piece.split()
+        for word in words:
+            if current and len(current) + 1 + len(word) > max_chars:
+                passages.append(current)
+                current = word
+            else:
+                current = f"{current} {word}" if current else word
+    if current:
+        passages.append(current)
+    return passages
+
+
+def _normalized_with_offsets(text):
+    # Normalisasi per karakter (plus huruf kecil) sambil mencatat posisi asal setiap karakter hasil
+    chars = []
+    offsets = []
+    for index, char in enumerate(text):
+        mapped = ARABIC_NORMALIZATION_TABLE.get(ord(char), char)
+        if mapped:
+            for out_char in mapped.lower():
+                chars.append(out_char)
+                offsets.append(index)
+    return "".join(chars), offsets
+
+
+def make_snippet(text, terms, max_chars=SNIPPET_CHARS):
+    """
+    Membuat cuplikan teks asli (dengan harakat) di sekitar kata yang cocok.
+
+    Args:
+        text (str): Teks passage asli.
+        terms (list): Kata kueri yang sudah dinormalisasi; akhiran * berarti pencarian awalan.
+        max_chars (int): Panjang cuplikan maksimum.
+
+    Returns:
+        tuple: (cuplikan, list [awal, akhir] posisi kata yang cocok di dalam cuplikan).
+    """
+    normalized, offsets = _normalized_with_offsets(text)
+    matches = []
+    for term in terms:
+        word = re.escape(term.rstrip("*").lower())
+        pattern = rf"(?<!\w){word}\w*" if term.endswith("*") else rf"(?<!\w){word}(?!\w)"
+        for match in re.finditer(pattern, normalized):
+            start = offsets[match.start()]
+            end = offsets[match.end() - 1] + 1
+            # Harakat setelah huruf terakhir ikut disorot
+            while end < len(text) and not ARABIC_NORMALIZATION_TABLE.get(ord(text[end]), text[end]):
+                end += 1
+            matches.append((start, end))
+    matches.sort()
+
+    if len(text) <= max_chars:
+        window_start, window_end = 0, len(text)
+    else:
+        first_start = matches[0][0] if matches else 0
+        window_start = max(0, min(first_start - max_chars // 3, len(text) - max_chars))
+        window_end = window_start + max_chars
+        # Jangan memotong kata di tepi cuplikan
+        if window_start > 0:
+            space = text.find(" ", window_start)
+            if 0 <= space < first_start:
+                window_start = space + 1
+        if window_end < len(text):
+            space = text.rfind(" ", window_start, window_end)
+            if space > window_start:
+                window_end = space
+
+    prefix = "…" if window_start > 0 else ""
+    suffix = "…" if window_end < len(text) else ""
+    snippet = prefix + text[window_start:window_end] + suffix
+    highlights = [
+        [start - window_start + len(prefix), end - window_start + len(prefix)]
+        for start, end in matches if start >= window_start and end <= window_end
+    ]
+    return snippet, highlights
+
+
+def build_match_query(query):
+    """
+    Mengubah kueri pengguna menjadi ekspresi MATCH FTS5: setiap kata dinormalisasi dan dikutip
+    (sintaks FTS5 di dalam kueri tidak ditafsirkan), semua kata harus ada, `kata*` untuk awalan.
+
+    Returns:
+        tuple: (ekspresi MATCH atau None jika tidak ada kata, list kata yang dinormalisasi).
+    """
+    terms = QUERY_TERM_PATTERN.findall(normalize_text(query))
+    if not terms:
+        return None, []
+    expression = " ".join(f'"{term.rstrip("*")}"' + ("*" if term.endswith("*") else "") for term in terms)
+    return expression, terms
+
+
+class SearchIndex:
+    """
+    Indeks teks penuh buku yang sudah diproses, berbasis SQLite FTS5 (mode WAL).
+
+    Setiap halaman (dokumen spine) dipecah menjadi passage pendek. Tabel `passages` menyimpan teks
+    asli beserta nomor halaman, judul bab, dan nama file gambar halaman; tabel FTS5 `passages_fts`
+    menyimpan teks yang sudah dinormalisasi dengan rowid yang sama. Peringkat memakai bm25.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._write_lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS books (
+                    id TEXT PRIMARY KEY,
+                    title TEXT NOT NULL,
+                    output_subfolder TEXT,
+                    num_pages INTEGER NOT NULL,
+                    indexed_at REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS passages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    book_id TEXT NOT NULL,
+                    page_number INTEGER NOT NULL,
+                    chapter TEXT,
+                    image_file TEXT,
+                    text TEXT NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_passages_book ON passages (book_id)")
+            conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS passages_fts USING fts5(body, tokenize='unicode61 remove_diacritics 2')")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def add_book(self, book_id, title, pages, output_subfolder=None):
+        """
+        Mengindeks (atau mengindeks ulang) teks satu buku.
+
+        Args:
+            book_id (str): ID buku, misalnya ID pekerjaan.
+            title (str): Nama yang ditampilkan (misalnya nama file ePub).
+            pages (list): dict per halaman dengan kunci 'page' (nomor halaman), 'chapter' (judul atau None),
+                          'strings' (potongan teks berurutan), dan 'image_file' (nama file gambar atau None).
+            output_subfolder (str, optional): Subfolder gambar hasil render di folder output.
+
+        Returns:
+            int: Jumlah passage yang diindeks.
+        """
+        rows = [
+            (page["page"], page.get("chapter"), page.get("image_file"), passage)
+            for page in pages
+            for passage in split_passages(page["strings"])
+        ]
+        with self._write_lock, self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            self._delete_book(conn, book_id)
+            conn.execute(
+                "INSERT INTO books (id, title, output_subfolder, num_pages, indexed_at) VALUES (?, ?, ?, ?, ?)",
+                (book_id, title, output_subfolder, len(pages), time.time())
+            )
+            for page_number, chapter, image_file, passage in rows:
+                cursor = conn.execute(
+                    "INSERT INTO passages (book_id, page_number, chapter, image_file, text) VALUES (?, ?, ?, ?, ?)",
+                    (book_id, page_number, chapter, image_file, passage)
+                )
+                conn.execute("INSERT INTO passages_fts (rowid, body) VALUES (?, ?)", (cursor.lastrowid, normalize_text(passage)))
+        logging.info(f"Buku '{title}' diindeks: {len(pages)} halaman, {len(rows)} passage.")
+        return len(rows)
+
+    def _delete_book(self, conn, book_id):
+        conn.execute("DELETE FROM passages_fts WHERE rowid IN (SELECT id FROM passages WHERE book_id = ?)", (book_id,))
+        conn.execute("DELETE FROM passages WHERE book_id = ?", (book_id,))
+        conn.execute("DELETE FROM books WHERE id = ?", (book_id,))
+
+    def remove_book(self, book_id):
+        """Menghapus satu buku dari indeks. Mengembalikan True jika buku tersebut ada."""
+        with self._write_lock, self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            exists = conn.execute("SELECT 1 FROM books WHERE id = ?", (book_id,)).fetchone() is not None
+            self._delete_book(conn, book_id)
+        return exists
+
+    def list_books(self):
+        """Mengembalikan semua buku yang diindeks, terbaru lebih dulu."""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT * FROM books ORDER BY indexed_at DESC").fetchall()
+        return [dict(row) for row in rows]
+
+    def search(self, query, limit=20, book_id=None):
+        """
+        Mencari passage yang memuat semua kata kueri, diurutkan berdasarkan relevansi (bm25).
+
+        Args:
+            query (str): Kueri pengguna (Arab atau Latin, harakat boleh ada atau tidak).
+            limit (int): Jumlah hasil maksimum (dibatasi MAX_RESULTS).
+            book_id (str, optional): Batasi pencarian ke satu buku.
+
+        Returns:
+            list: dict hasil dengan kunci 'book_id', 'title', 'output_subfolder', 'page', 'chapter',
+                  'image_file', 'snippet', 'highlights', dan 'score' (bm25; makin kecil makin relevan).
+        """
+        expression, terms = build_match_query(query)
+        if expression is None:
+            return []
+        sql = """
+            SELECT p.book_id, b.title, b.output_subfolder, p.page_number, p.chapter, p.image_file, p.text,
+                   bm25(passages_fts) AS score
+            FROM passages_fts
+            JOIN passages p ON p.id = passages_fts.rowid
+            JOIN books b ON b.id = p.book_id
+            WHERE passages_fts MATCH ?
+        """
+        params = [expression]
+        if book_id:
+            sql += " AND p.book_id = ?"
+            params.append(book_id)
+        sql += " ORDER BY score LIMIT ?"
+        params.append(max(1, min(limit, MAX_RESULTS)))
+        with self._connect() as conn:
+            rows = conn.execute(sql, params).fetchall()
+
+        results = []
+        for row in rows:
+            snippet, highlights = make_snippet(row["text"], terms)
+            results.append({
+                "book_id": row["book_id"],
+                "title": row["title"],
+                "output_subfolder": row["output_subfolder"],
+                "page": row["page_number"],
+                "chapter": row["chapter"],
+                "image_file": row["image_file"],
+                "snippet": snippet,
+                "highlights": highlights,
+                "score": round(row["score"], 4),
+            })
+        return results
@@ -0,0 +1,116 @@
+# stage_pipeline.py
+# Modul ini menyediakan runner sederhana untuk menjalankan tahapan (stage) proses
+# sebagai graf dependensi secara konkuren di atas thread pool.
+
+import logging # Untuk mencatat informasi, peringatan, dan error
+import time # Untuk mengukur durasi setiap tahapan
+import contextvars # Agar konteks (misalnya SpanCollector) ikut terbawa ke thread tahapan
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import metrics # Instrumentasi span dan histogram latensi
+import profiling # Profiling opt-in per pekerjaan (aktif hanya jika ada sesi di konteks)
+import log_setup # Logging terpusat non-blocking (antrean + JSON dengan ID pekerjaan)
+
+log_setup.configure_logging()
+
+
+class StagePipeline:
+    """
+    Graf dependensi kecil dari tahapan-tahapan proses.
+
+    Setiap tahapan adalah fungsi yang menerima satu argumen `results` (dict berisi
+    hasil semua tahapan yang menjadi dependensinya) dan mengembalikan hasilnya sendiri.
+    Tahapan yang dependensinya sudah selesai langsung dijalankan di thread pool,
+    sehingga tahapan yang tidak saling bergantung dapat berjalan tumpang tindih.
+    """
+
+    def __init__(self, max_workers=4):
+        self.max_workers = max_workers
+        self._stages = {} # nama -> (fungsi, tuple dependensi)
+
+    def add_stage(self, name, func, depends_on=()):
+        """
+        Mendaftarkan tahapan baru ke dalam graf.
+
+        Args:
+            name (str): Nama unik tahapan (juga dipakai sebagai kunci hasil dan timing).
+            func (callable): Fungsi tahapan, dipanggil sebagai func(results).
+            depends_on (iterable): Nama-nama tahapan yang harus selesai terlebih dahulu.
+        """
+        if name in self._stages:
+            raise ValueError(f"Tahapan '{name}' sudah terdaftar.")
+        for dep in depends_on:
+            if dep not in self._stages:
+                raise ValueError(f"Dependensi '{dep}' untuk tahapan '{name}' belum terdaftar.")
+        self._stages[name] = (func, tuple(depends_on))
+
+    def __len__(self):
+        return len(self._stages)
+
+    def run(self, on_stage_complete=None):
+        """
+        Menjalankan semua tahapan sesuai urutan dependensinya.
+
+        Args:
+            on_stage_complete (callable, optional): Dipanggil sebagai on_stage_complete(name, result)
+                                                    setiap kali sebuah tahapan selesai dengan sukses.
+
+        Returns:
+            tuple: (results, timings)
+                   results (dict): Nama tahapan -> nilai yang dikembalikan tahapan tersebut.
+                   timings (dict): Nama tahapan -> durasi eksekusi dalam detik (dibulatkan).
+
+        Raises:
+            Exception: Error pertama yang dimunculkan oleh salah satu tahapan. Tahapan yang
+                       belum dimulai tidak akan dijalankan lagi setelah terjadi error.
+        """
+        results = {}
+        timings = {}
+        pending = dict(self._stages)
+        running = {} # future -> nama tahapan
+        first_error = None
+
+        def timed_call(name, func, dep_results):
+            stage_start = time.perf_counter()
+            try:
+                with metrics.span(f"stage.{name}"), profiling.profile_thread():
+                    return func(dep_results)
+            finally:
+                timings[name] = round(time.perf_counter() - stage_start, 3)
+                logging.info(f"Tahapan '{name}' selesai dalam {timings[name]} detik.")
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="stage") as executor:
+            while pending or running:
+                # Jadwalkan semua tahapan yang dependensinya sudah terpenuhi
+                if first_error is None:
+                    for name, (func, deps) in list(pending.items()):
+                        if all(dep in results for dep in deps):
+                            dep_results = {dep: results[dep] for dep in deps}
+                            stage_context = contextvars.copy_context()
+                            running[executor.submit(stage_context.run, timed_call, name, func, dep_results)] = name
+                            del pending[name]
+
+                if not running:
+                    if pending and first_error is None:
+                        raise RuntimeError(f"Tahapan tidak dapat dijalankan (dependensi melingkar?): {list(pending)}")
+                    break
+
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except Exception as e:
+                        logging.error(f"Tahapan '{name}' gagal: {e}")
+                        if first_error is None:
+                            first_error = e
+                        continue
+                    if on_stage_complete:
+                        try:
+                            on_stage_complete(name, results[name])
+                        except Exception as e:
+                            logging.warning(f"Callback progres untuk tahapan '{name}' gagal: {e}")
+
+        if first_error is not None:
+            raise first_error
+        return results, timings
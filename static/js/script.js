@@ -14,6 +14,13 @@ document.addEventListener("DOMContentLoaded", function () {
   const logTableContainer = document.getElementById("logTableContainer");
   const downloadLogBtn = document.getElementById("downloadLogBtn");
   const clearLogBtn = document.getElementById("clearLogBtn");
+  const loadOlderLogsBtn = document.getElementById("loadOlderLogsBtn");
+
+  // Status log kinerja di sisi klien, agar hanya baris yang belum dimiliki yang diambil dari server
+  const logRowsById = new Map(); // id baris -> objek log
+  let logGeneration = null; // Berubah jika log dihapus di server
+  let logLastSeq = 0; // Nomor urut perubahan terakhir yang sudah diterima
+  let logNextCursor = null; // Cursor untuk halaman log yang lebih lama
 
   /**
    * Memperbarui pesan status di UI dan mengontrol visibilitas spinner loading.
@@ -43,8 +50,8 @@ document.addEventListener("DOMContentLoaded", function () {
     }
 
     let tableHtml = '<table class="performance-table"><thead><tr>';
-    // Membuat header tabel dari kunci objek log pertama
-    const headers = Object.keys(logs[0]);
+    // Membuat header tabel dari kunci objek log pertama (kolom id internal tidak ditampilkan)
+    const headers = Object.keys(logs[0]).filter((header) => header !== "id");
     headers.forEach((header) => {
       tableHtml += `<th>${header}</th>`;
     });
@@ -74,11 +81,81 @@ document.addEventListener("DOMContentLoaded", function () {
     logTableContainer.innerHTML = tableHtml; // Memperbarui konten tabel di DOM
   }
 
+  /**
+   * Menggambar ulang tabel log dari baris-baris yang sudah dimiliki klien (urut berdasarkan id).
+   */
+  function renderKnownLogs() {
+    const rows = Array.from(logRowsById.values()).sort((a, b) => a.id - b.id);
+    loadPerformanceLogs(rows);
+    loadOlderLogsBtn.style.display = logNextCursor ? "inline-block" : "none";
+  }
+
+  /**
+   * Memuat halaman log kinerja terbaru dari awal (saat halaman dimuat atau setelah log dihapus).
+   */
+  async function fetchPerformanceLogs() {
+    const response = await fetch("/performance-log?limit=50");
+    if (!response.ok) {
+      logTableContainer.innerHTML = "<p>Gagal memuat log kinerja.</p>";
+      return;
+    }
+    const page = await response.json();
+    logRowsById.clear();
+    page.rows.forEach((row) => logRowsById.set(row.id, row));
+    logGeneration = page.generation;
+    logLastSeq = page.last_seq;
+    logNextCursor = page.next_cursor;
+    renderKnownLogs();
+  }
+
+  /**
+   * Mengambil hanya baris log yang baru ditambahkan atau diperbarui sejak pembaruan terakhir.
+   */
+  async function fetchNewPerformanceLogs() {
+    while (true) {
+      const response = await fetch(`/performance-log?since=${logLastSeq}`);
+      if (!response.ok) {
+        return;
+      }
+      const page = await response.json();
+      if (logGeneration !== null && page.generation !== logGeneration) {
+        // Log dihapus di server sejak terakhir dimuat: muat ulang dari awal
+        await fetchPerformanceLogs();
+        return;
+      }
+      page.rows.forEach((row) => logRowsById.set(row.id, row));
+      logGeneration = page.generation;
+      logLastSeq = page.last_seq;
+      if (!page.has_more) {
+        break;
+      }
+    }
+    renderKnownLogs();
+  }
+
+  /**
+   * Memuat satu halaman log kinerja yang lebih lama (pagination berbasis cursor).
+   */
+  async function fetchOlderPerformanceLogs() {
+    if (!logNextCursor) {
+      return;
+    }
+    const response = await fetch(`/performance-log?cursor=${logNextCursor}&limit=50`);
+    if (!response.ok) {
+      return;
+    }
+    const page = await response.json();
+    page.rows.forEach((row) => logRowsById.set(row.id, row));
+    logNextCursor = page.next_cursor;
+    renderKnownLogs();
+  }
+
   // Memuat log kinerja saat halaman pertama kali dimuat
-  // Data `performance_logs` datang dari Flask melalui Jinja2 rendering
-  // `initialPerformanceLogs` adalah variabel global yang diasumsikan ada di `index.html`
-  if (typeof initialPerformanceLogs !== "undefined" && initialPerformanceLogs.length > 0) {
-    loadPerformanceLogs(initialPerformanceLogs);
+  fetchPerformanceLogs();
+
+  // Event listener untuk tombol "Muat Log Lebih Lama"
+  if (loadOlderLogsBtn) {
+    loadOlderLogsBtn.addEventListener("click", fetchOlderPerformanceLogs);
   }
 
   // Event listener untuk tombol "Unduh Log Kinerja"
@@ -103,11 +180,10 @@ document.addEventListener("DOMContentLoaded", function () {
           const result = await response.json(); // Menerima respons JSON dari server
           if (response.ok) {
             updateStatus(result.message, false, false); // Tampilkan pesan sukses
-            loadPerformanceLogs(result.performance_log); // Muat log yang diperbarui (seharusnya kosong)
           } else {
             updateStatus(`Error: ${result.error || "Gagal membersihkan log."}`, true, false); // Tampilkan pesan error
-            loadPerformanceLogs(result.performance_log); // Muat log yang ada (jika gagal hapus)
           }
+          await fetchPerformanceLogs(); // Muat ulang log (seharusnya kosong jika berhasil dihapus)
         } catch (error) {
           console.error("Error saat membersihkan log:", error);
           updateStatus("Terjadi kesalahan saat membersihkan log.", true, false);
@@ -116,6 +192,233 @@ document.addEventListener("DOMContentLoaded", function () {
     });
   }
 
+  // Interval polling status pekerjaan konversi (milidetik)
+  const JOB_POLL_INTERVAL_MS = 1500;
+  // Jeda sebelum mengambil ulang log agar ROUGE Score dari evaluator latar belakang ikut tampil (milidetik)
+  const ROUGE_REFRESH_DELAY_MS = 3000;
+
+  /**
+   * Mengambil baris log yang baru, lalu sekali lagi setelah ROUGE Score selesai dihitung di latar belakang.
+   */
+  async function refreshLogsAfterJob() {
+    await fetchNewPerformanceLogs();
+    setTimeout(fetchNewPerformanceLogs, ROUGE_REFRESH_DELAY_MS);
+  }
+
+  /**
+   * Menampilkan hasil AI (teks dan gambar) di UI.
+   * @param {Object} result - Hasil (parsial atau akhir) pekerjaan konversi.
+   */
+  function renderLlmResults(result) {
+    llmResultTextDiv.innerHTML = "";
+    llmResultImageDiv.innerHTML = "";
+
+    // Tampilkan Teks Hasil LLM jika ada
+    if (result.llm_response_text && result.llm_response_text !== "Tidak ada respons dari AI." && result.llm_response_text !== "Tidak ada respons yang dihasilkan dari model.") {
+      const heading = document.createElement("h2");
+      heading.textContent = "Hasil Pemrosesan AI (Teks)";
+      llmResultTextDiv.appendChild(heading);
+      const preElement = document.createElement("pre");
+      preElement.textContent = result.llm_response_text;
+      llmResultTextDiv.appendChild(preElement);
+    } else {
+      llmResultTextDiv.innerHTML = "<p>Tidak ada hasil AI (teks) yang diminta atau dihasilkan.</p>";
+    }
+
+    // Tampilkan gambar hasil LLM jika ada
+    if (result.llm_image_url) {
+      const heading = document.createElement("h2");
+      heading.textContent = "Hasil Pemrosesan AI (Gambar)";
+      llmResultImageDiv.appendChild(heading);
+
+      const imgElement = document.createElement("img");
+      imgElement.src = result.llm_image_url;
+      imgElement.alt = "Hasil AI Gemini";
+      llmResultImageDiv.appendChild(imgElement);
+    } else {
+      llmResultImageDiv.innerHTML = "<p>Tidak ada hasil AI (gambar) yang diminta atau dihasilkan.</p>";
+    }
+  }
+
+  /**
+   * Menambahkan satu gambar halaman ePub ke galeri (dipanggil setiap kali halaman selesai dirender).
+   * @param {string} imageUrl - URL gambar halaman.
+   */
+  function appendPageImage(imageUrl) {
+    if (!imageResultsDiv.querySelector("h2")) {
+      imageResultsDiv.innerHTML = "";
+      const heading = document.createElement("h2");
+      heading.textContent = "Konten ePub Asli (Gambar)";
+      imageResultsDiv.appendChild(heading);
+    }
+    const imgElement = document.createElement("img");
+    imgElement.src = imageUrl;
+    imgElement.alt = "Konversi Gambar ePub";
+    imgElement.loading = "lazy"; // Menggunakan lazy loading untuk gambar banyak
+    imageResultsDiv.appendChild(imgElement);
+  }
+
+  /**
+   * Menambahkan tautan unduh semua halaman (ZIP dan CBZ) di bawah judul galeri.
+   * @param {string} archiveUrl - URL arsip folder output (/generated_images/<subfolder>/archive).
+   */
+  function appendArchiveLinks(archiveUrl) {
+    const heading = imageResultsDiv.querySelector("h2");
+    if (!archiveUrl || !heading || imageResultsDiv.querySelector(".archive-links")) {
+      return;
+    }
+    const links = document.createElement("p");
+    links.className = "archive-links";
+    [["zip", "Unduh Semua Halaman (ZIP)"], ["cbz", "Unduh sebagai Komik (CBZ)"]].forEach(([format, label], index) => {
+      const link = document.createElement("a");
+      link.href = `${archiveUrl}?format=${format}`;
+      link.textContent = label;
+      if (index > 0) {
+        links.appendChild(document.createTextNode(" | "));
+      }
+      links.appendChild(link);
+    });
+    heading.insertAdjacentElement("afterend", links);
+  }
+
+  /**
+   * Menampilkan hasil akhir konversi (teks AI, gambar AI, dan gambar halaman ePub) di UI.
+   * @param {Object} result - Hasil akhir pekerjaan dari /jobs/<job_id>.
+   */
+  function renderResults(result) {
+    imageResultsDiv.innerHTML = "";
+    renderLlmResults(result);
+
+    // Tampilkan gambar-gambar konten ePub asli
+    if (result.image_urls && result.image_urls.length > 0) {
+      result.image_urls.forEach(appendPageImage);
+      appendArchiveLinks(result.archive_url);
+      // Scroll ke hasil yang paling relevan
+      if (result.llm_response_text && llmResultTextDiv.offsetHeight > 0) {
+        llmResultTextDiv.scrollIntoView({ behavior: "smooth", block: "start" });
+      } else if (result.llm_image_url && llmResultImageDiv.offsetHeight > 0) {
+        llmResultImageDiv.scrollIntoView({ behavior: "smooth", block: "start" });
+      } else if (result.image_urls.length > 0 && imageResultsDiv.offsetHeight > 0) {
+        imageResultsDiv.scrollIntoView({ behavior: "smooth", block: "start" });
+      }
+    } else {
+      imageResultsDiv.innerHTML = "<p>Tidak ada gambar konten ePub yang dihasilkan.</p>";
+    }
+  }
+
+  /**
+   * Menampilkan status progres pekerjaan berdasarkan data progres dari server.
+   * @param {Object} progress - Objek progres ({stage, completed_stages, total_stages}).
+   */
+  function updateProgressStatus(progress) {
+    if (progress && progress.total_stages) {
+      updateStatus(`Memproses... (${progress.completed_stages}/${progress.total_stages} tahap, terakhir: ${progress.stage})`, false, true);
+    } else {
+      updateStatus("Memproses...", false, true);
+    }
+  }
+
+  /**
+   * Menerima event progres pekerjaan lewat Server-Sent Events. Setiap gambar halaman
+   * ditambahkan ke galeri segera setelah selesai dirender. Jika koneksi SSE gagal total,
+   * beralih ke polling biasa.
+   * @param {string} eventsUrl - URL stream event (/jobs/<job_id>/events).
+   * @param {string} statusUrl - URL status pekerjaan (/jobs/<job_id>).
+   */
+  function streamJob(eventsUrl, statusUrl) {
+    return new Promise((resolve) => {
+      const source = new EventSource(eventsUrl);
+      let pageCount = 0;
+      const partialResult = {}; // Gabungan hasil parsial yang diterima sejauh ini
+
+      source.addEventListener("page", (event) => {
+        const data = JSON.parse(event.data);
+        appendPageImage(data.url);
+        pageCount += 1;
+        updateStatus(`Memproses... (${pageCount} halaman selesai dirender)`, false, true);
+      });
+
+      source.addEventListener("progress", (event) => {
+        const data = JSON.parse(event.data);
+        updateProgressStatus(data.progress);
+        // Tampilkan hasil AI segera setelah tersedia, tanpa menunggu rendering halaman
+        Object.assign(partialResult, data.partial || {});
+        if (partialResult.llm_response_text) {
+          renderLlmResults(partialResult);
+        }
+      });
+
+      source.addEventListener("done", async (event) => {
+        source.close();
+        const data = JSON.parse(event.data);
+        updateStatus(data.result.message, false, false); // Tampilkan pesan sukses
+        renderLlmResults(data.result);
+        if (pageCount === 0 && (!data.result.image_urls || data.result.image_urls.length === 0)) {
+          imageResultsDiv.innerHTML = "<p>Tidak ada gambar konten ePub yang dihasilkan.</p>";
+        } else {
+          appendArchiveLinks(data.result.archive_url);
+        }
+        await refreshLogsAfterJob();
+        resolve();
+      });
+
+      source.addEventListener("failed", async (event) => {
+        source.close();
+        const data = JSON.parse(event.data);
+        updateStatus(`Error: ${data.error || "Terjadi kesalahan yang tidak diketahui."}`, true, false);
+        imageResultsDiv.innerHTML = "<p>Gagal mengkonversi file. Silakan coba lagi.</p>";
+        llmResultTextDiv.innerHTML = "";
+        llmResultImageDiv.innerHTML = "";
+        await fetchNewPerformanceLogs();
+        resolve();
+      });
+
+      source.onerror = async () => {
+        // EventSource menyambung ulang otomatis (dengan Last-Event-ID); hanya tangani jika ditutup permanen
+        if (source.readyState === EventSource.CLOSED) {
+          await pollJob(statusUrl);
+          resolve();
+        }
+      };
+    });
+  }
+
+  /**
+   * Memantau status pekerjaan konversi secara berkala hingga selesai atau gagal.
+   * @param {string} statusUrl - URL status pekerjaan (/jobs/<job_id>).
+   */
+  async function pollJob(statusUrl) {
+    while (true) {
+      await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+      const response = await fetch(statusUrl);
+      const job = await response.json();
+      if (!response.ok) {
+        updateStatus(`Error: ${job.error || "Gagal mengambil status pekerjaan."}`, true, false);
+        return;
+      }
+
+      if (job.status === "queued") {
+        updateStatus(`Menunggu di antrean (posisi ${job.queue_position})...`, false, true);
+      } else if (job.status === "running") {
+        updateProgressStatus(job.progress);
+      } else if (job.status === "done") {
+        updateStatus(job.result.message, false, false); // Tampilkan pesan sukses
+        renderResults(job.result);
+        // Ambil baris log kinerja yang baru setelah proses selesai
+        await refreshLogsAfterJob();
+        return;
+      } else if (job.status === "failed") {
+        updateStatus(`Error: ${job.error || "Terjadi kesalahan yang tidak diketahui."}`, true, false);
+        imageResultsDiv.innerHTML = "<p>Gagal mengkonversi file. Silakan coba lagi.</p>";
+        llmResultTextDiv.innerHTML = "";
+        llmResultImageDiv.innerHTML = "";
+        // Ambil baris log kinerja yang baru (termasuk catatan error)
+        await fetchNewPerformanceLogs();
+        return;
+      }
+    }
+  }
+
   // Event listener untuk form unggah file
   if (uploadForm) {
     uploadForm.addEventListener("submit", async function (event) {
@@ -130,83 +433,25 @@ document.addEventListener("DOMContentLoaded", function () {
       const formData = new FormData(uploadForm); // Membuat objek FormData dari form
 
       try {
-        updateStatus("Mengunggah file ePub dan memproses...", false, true); // Update status
-        // Mengirim file ke backend Flask
+        updateStatus("Mengunggah file ePub...", false, true); // Update status
+        // Mengirim file ke backend Flask; server langsung mengembalikan ID pekerjaan
         const response = await fetch("/upload", {
           method: "POST",
           body: formData,
         });
+        const result = await response.json(); // Menerima respons JSON dari server
 
         if (response.ok) {
-          const result = await response.json(); // Menerima respons JSON dari server
-          updateStatus(result.message, false, false); // Tampilkan pesan sukses
-
-          // Tampilkan Teks Hasil LLM jika ada
-          if (result.llm_response_text && result.llm_response_text !== "Tidak ada respons dari AI." && result.llm_response_text !== "Tidak ada respons yang dihasilkan dari model.") {
-            const heading = document.createElement("h2");
-            heading.textContent = "Hasil Pemrosesan AI (Teks)";
-            llmResultTextDiv.appendChild(heading);
-            const preElement = document.createElement("pre");
-            preElement.textContent = result.llm_response_text;
-            llmResultTextDiv.appendChild(preElement);
-          } else {
-            llmResultTextDiv.innerHTML = "<p>Tidak ada hasil AI (teks) yang diminta atau dihasilkan.</p>";
-          }
-
-          // Tampilkan gambar hasil LLM jika ada
-          if (result.llm_image_url) {
-            const heading = document.createElement("h2");
-            heading.textContent = "Hasil Pemrosesan AI (Gambar)";
-            llmResultImageDiv.appendChild(heading);
-
-            const imgElement = document.createElement("img");
-            imgElement.src = result.llm_image_url;
-            imgElement.alt = "Hasil AI Gemini";
-            llmResultImageDiv.appendChild(imgElement);
+          updateStatus(result.message, false, true);
+          if (window.EventSource) {
+            await streamJob(result.events_url, result.status_url);
           } else {
-            llmResultImageDiv.innerHTML = "<p>Tidak ada hasil AI (gambar) yang diminta atau dihasilkan.</p>";
-          }
-
-          // Tampilkan gambar-gambar konten ePub asli
-          if (result.image_urls && result.image_urls.length > 0) {
-            const heading = document.createElement("h2");
-            heading.textContent = "Konten ePub Asli (Gambar)";
-            imageResultsDiv.appendChild(heading);
-
-            result.image_urls.forEach((imageUrl) => {
-              const imgElement = document.createElement("img");
-              imgElement.src = imageUrl;
-              imgElement.alt = "Konversi Gambar ePub";
-              imgElement.loading = "lazy"; // Menggunakan lazy loading untuk gambar banyak
-              imageResultsDiv.appendChild(imgElement);
-            });
-            // Scroll ke hasil yang paling relevan
-            if (result.llm_response_text && llmResultTextDiv.offsetHeight > 0) {
-              llmResultTextDiv.scrollIntoView({ behavior: "smooth", block: "start" });
-            } else if (result.llm_image_url && llmResultImageDiv.offsetHeight > 0) {
-              llmResultImageDiv.scrollIntoView({ behavior: "smooth", block: "start" });
-            } else if (result.image_urls.length > 0 && imageResultsDiv.offsetHeight > 0) {
-              imageResultsDiv.scrollIntoView({ behavior: "smooth", block: "start" });
-            }
-          } else {
-            imageResultsDiv.innerHTML = "<p>Tidak ada gambar konten ePub yang dihasilkan.</p>";
-          }
-
-          // Muat ulang log kinerja setelah proses selesai
-          if (result.performance_log) {
-            loadPerformanceLogs(result.performance_log);
+            await pollJob(result.status_url);
           }
         } else {
           // Penanganan error dari respons server
-          const errorResult = await response.json();
-          updateStatus(`Error: ${errorResult.error || "Terjadi kesalahan yang tidak diketahui."}`, true, false);
+          updateStatus(`Error: ${result.error || "Terjadi kesalahan yang tidak diketahui."}`, true, false);
           imageResultsDiv.innerHTML = "<p>Gagal mengkonversi file. Silakan coba lagi.</p>";
-          llmResultTextDiv.innerHTML = "";
-          llmResultImageDiv.innerHTML = "";
-          // Muat ulang log kinerja jika ada error
-          if (errorResult.performance_log) {
-            loadPerformanceLogs(errorResult.performance_log);
-          }
         }
       } catch (error) {
         // Penanganan error jaringan atau JavaScript
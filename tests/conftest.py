@@ -0,0 +1,7 @@
+# conftest.py
+# Modul-modul aplikasi berada di root repositori (bukan paket), jadi root ditambahkan ke sys.path.
+
+import os # Untuk path root repositori
+import sys # Untuk sys.path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,44 @@
+# test_profiling.py
+# Pipeline tahapan yang diprofil harus tetap berhasil di semua versi Python (3.12+ memakai sys.monitoring
+# yang global per proses) dan profilnya harus mencakup fungsi yang berjalan di thread tahapan.
+
+import os # Untuk path artefak profil
+import json # Untuk membaca metadata profil
+import pstats # Untuk memeriksa isi profil
+
+import profiling
+from stage_pipeline import StagePipeline
+
+
+def busy_stage_work(n):
+    return sum(i * i for i in range(n))
+
+
+def test_profiled_multi_stage_pipeline(tmp_path):
+    pipeline = StagePipeline(max_workers=3)
+    pipeline.add_stage('a', lambda _: busy_stage_work(20000))
+    pipeline.add_stage('b', lambda _: busy_stage_work(20000))
+    pipeline.add_stage('c', lambda results: results['a'] + results['b'], depends_on=['a', 'b'])
+
+    with profiling.ProfileSession(str(tmp_path), label="uji", reason="test"):
+        results, timings = pipeline.run()
+
+    assert results['c'] == 2 * busy_stage_work(20000)
+    assert set(timings) == {'a', 'b', 'c'}
+    with open(os.path.join(tmp_path, profiling.META_FILE), encoding="utf-8") as f:
+        meta = json.load(f)
+    assert meta["status"] == "done"
+    stats = pstats.Stats(os.path.join(tmp_path, profiling.PROFILE_STATS_FILE))
+    assert any(function_name == "busy_stage_work" for _, _, function_name in stats.stats)
+
+
+def test_pipeline_runs_when_another_profiler_is_active(tmp_path):
+    pipeline = StagePipeline(max_workers=2)
+    pipeline.add_stage('a', lambda _: busy_stage_work(1000))
+    pipeline.add_stage('b', lambda results: results['a'], depends_on=['a'])
+
+    with profiling.ProfileSession(str(tmp_path / "pertama"), label="pertama"):
+        with profiling.ProfileSession(str(tmp_path / "kedua"), label="kedua"):
+            results, _ = pipeline.run()
+
+    assert results['b'] == busy_stage_work(1000)
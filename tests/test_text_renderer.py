@@ -0,0 +1,41 @@
+# test_text_renderer.py
+# Halaman dengan gaya yang tidak digambar Pillow (warna, ukuran, ketebalan font) harus diteruskan ke Playwright.
+
+import pytest
+
+import text_renderer
+
+PLAIN_PAGE = "<html><body><p>Paragraf biasa.</p></body></html>"
+STYLED_PAGES = [
+    '<html><body><p style="color: red">Teks merah.</p></body></html>',
+    '<html><body><p style="background-color: #ffe">Latar kuning.</p></body></html>',
+    '<html><head><style>p { font-size: 2em }</style></head><body><p>Teks besar.</p></body></html>',
+    '<html><head><style>.tebal { font-weight: bold }</style></head><body><p class="tebal">Teks tebal.</p></body></html>',
+]
+
+
+def _render(tmp_path, html_contents):
+    fallback_calls = []
+
+    def fake_playwright(html_list, output_dir, prefix, base_url=None, on_page_rendered=None, page_numbers=None, preset=None):
+        fallback_calls.extend(page_numbers)
+        for page_number in page_numbers:
+            path = str(tmp_path / f"{prefix}_page_{page_number}.png")
+            on_page_rendered(page_number, path)
+        return []
+
+    paths = text_renderer.render_html_to_images(html_contents, str(tmp_path), "buku", fallback=fake_playwright)
+    return paths, fallback_calls
+
+
+@pytest.mark.skipif(text_renderer.resolve_font_path() is None, reason="tidak ada font TrueType untuk renderer Pillow")
+@pytest.mark.parametrize("styled_page", STYLED_PAGES)
+def test_styled_page_falls_back_to_playwright(tmp_path, styled_page):
+    paths, fallback_pages = _render(tmp_path, [PLAIN_PAGE, styled_page])
+    assert fallback_pages == [2]
+    assert len(paths) == 2
+
+
+def test_default_valued_styles_stay_on_pillow():
+    html = '<html><body><p style="color: #000; font-weight: normal; font-size: 100%; background-color: transparent">Teks.</p></body></html>'
+    assert [block.text for block in text_renderer.analyze_document(html)] == ["Teks."]
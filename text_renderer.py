@@ -0,0 +1,479 @@
+# text_renderer.py
+# Modul ini merender halaman ePub sederhana (paragraf, judul, daftar, kutipan, dan CSS RTL dasar)
+# langsung dengan Pillow, arabic_reshaper, dan bidi, tanpa meluncurkan Chromium. Halaman yang
+# memakai fitur di luar itu (gambar, tabel, SVG, CSS tata letak, font kustom, dll.) otomatis
+# diteruskan ke renderer Playwright di image_renderer.
+
+import os # Untuk operasi path
+import re # Untuk membaca deklarasi CSS dan mendeteksi teks Arab
+import logging # Untuk mencatat informasi, peringatan, dan error
+import functools # Untuk cache objek font per ukuran
+
+from PIL import Image, ImageDraw, ImageFont
+
+import metrics # Instrumentasi span dan histogram latensi
+from image_renderer import clean_filename, get_render_preset
+import log_setup # Logging terpusat non-blocking (antrean + JSON dengan ID pekerjaan)
+
+log_setup.configure_logging()
+
+# Ukuran halaman mengikuti preset viewport yang sama dengan Playwright (image_renderer.RENDER_PRESETS).
+# Semua ukuran di bawah dalam piksel CSS dan dikalikan device scale factor preset saat digambar.
+# Margin halaman = lebar viewport / PAGE_MARGIN_DIVISOR, minimal MIN_PAGE_MARGIN
+PAGE_MARGIN_DIVISOR = 20
+MIN_PAGE_MARGIN = 16
+BASE_FONT_SIZE = 24
+LINE_HEIGHT_FACTOR = 1.7
+# Halaman digambar sebagai grayscale ('L'): teks hitam di latar putih, lebih cepat disimpan dan lebih kecil
+BACKGROUND_COLOR = 255
+TEXT_COLOR = 0
+RULE_COLOR = 200
+# Indentasi (piksel) untuk blockquote dan item daftar, dihitung dari sisi awal baris
+INDENT_STEP = 40
+
+# Font yang dicoba jika font_path tidak diberikan atau tidak ada
+FALLBACK_FONTS = [
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fonts', 'NotoSansArabic-Regular.ttf'),
+    "/usr/share/fonts/truetype/noto/NotoSansArabic-Regular.ttf",
+    "/usr/share/fonts/truetype/noto/NotoNaskhArabic-Regular.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "C:/Windows/Fonts/arial.ttf",
+    "/System/Library/Fonts/Supplemental/Arial Unicode.ttf",
+]
+
+# Elemen yang bisa dirender tanpa browser. Elemen lain (img, svg, table, video, script, ...) -> Playwright
+BLOCK_TAGS = {'body', 'div', 'section', 'article', 'header', 'footer', 'main', 'aside', 'nav', 'p',
+              'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'blockquote', 'ul', 'ol', 'li', 'center'}
+INLINE_TAGS = {'span', 'a', 'b', 'strong', 'i', 'em', 'u', 'small', 'big', 'cite', 'q', 'abbr',
+               'bdi', 'bdo', 'font', 'mark', 's', 'del', 'ins', 'dfn', 'var', 'time'}
+HEAD_TAGS = {'html', 'head', 'title', 'meta', 'link', 'style'}
+SUPPORTED_TAGS = BLOCK_TAGS | INLINE_TAGS | HEAD_TAGS | {'br', 'hr'}
+
+# Properti CSS yang aman diabaikan atau didekati oleh renderer ini; properti lain -> Playwright
+SUPPORTED_CSS_PROPERTIES = {
+    'direction', 'unicode-bidi', 'text-align', 'text-indent', 'text-decoration', 'text-transform',
+    'font-family', 'font-style', 'font-variant', 'line-height',
+    'letter-spacing', 'word-spacing', 'margin', 'margin-top',
+    'margin-bottom', 'margin-left', 'margin-right', 'padding', 'padding-top', 'padding-bottom',
+    'padding-left', 'padding-right', 'page-break-before', 'page-break-after', 'page-break-inside',
+    'break-before', 'break-after', 'break-inside', 'widows', 'orphans', 'hyphens', 'display',
+    'list-style', 'list-style-type', 'white-space',
+}
+# Properti yang hanya didukung dengan nilai yang sama dengan hasil renderer ini (teks hitam biasa
+# di latar putih, ukuran dasar). Nilai lain mengubah tampilan halaman -> Playwright
+DEFAULT_ONLY_CSS_VALUES = {
+    'color': {'black', '#000', '#000000', 'rgb(0,0,0)', 'inherit', 'initial', 'currentcolor'},
+    'background-color': {'white', '#fff', '#ffffff', 'rgb(255,255,255)', 'transparent', 'inherit', 'initial'},
+    'font-size': {'1em', '100%', 'medium', '1rem', 'inherit', 'initial'},
+    'font-weight': {'normal', '400', 'inherit', 'initial'},
+}
+# Nilai display yang masih dapat dipetakan ke model blok/inline sederhana
+SUPPORTED_DISPLAY_VALUES = {'block', 'inline', 'inline-block', 'list-item', 'none'}
+# At-rule yang aman diabaikan; @font-face, @media, @import, dll. -> Playwright
+IGNORED_AT_RULES = {'charset', 'namespace', 'page'}
+
+# Skala ukuran font judul terhadap BASE_FONT_SIZE (mirip stylesheet default browser)
+HEADING_SCALE = {'h1': 2.0, 'h2': 1.5, 'h3': 1.17, 'h4': 1.0, 'h5': 0.83, 'h6': 0.75}
+
+ARABIC_PATTERN = re.compile(r'[\u0600-\u06FF\u0750-\u077F\u08A0-\u08FF\uFB50-\uFDFF\uFE70-\uFEFF]')
+CSS_COMMENT_PATTERN = re.compile(r'/\*.*?\*/', re.S)
+CSS_RULE_PATTERN = re.compile(r'([^{}]+)\{([^{}]*)\}')
+CSS_AT_RULE_PATTERN = re.compile(r'@([a-zA-Z-]+)')
+# Penanda baris baru dari <br>, dipisahkan dari whitespace biasa yang akan diringkas
+LINE_BREAK = '\u2028'
+
+
+class UnsupportedDocument(Exception):
+    """Dokumen memakai fitur yang tidak didukung renderer Pillow dan harus dirender dengan Playwright."""
+
+
+class TextBlock:
+    """Satu blok teks hasil tata letak: judul, paragraf, item daftar, atau garis pemisah."""
+
+    def __init__(self, text, font_size, direction, align, indent=0, is_rule=False):
+        self.text = text
+        self.font_size = font_size
+        self.direction = direction # 'rtl' atau 'ltr'
+        self.align = align # 'start', 'center', atau 'end'
+        self.indent = indent
+        self.is_rule = is_rule
+
+
+def _parse_declarations(declarations):
+    # "prop: nilai; prop2: nilai2" -> {prop: nilai}
+    parsed = {}
+    for declaration in declarations.split(';'):
+        if ':' not in declaration:
+            continue
+        prop, value = declaration.split(':', 1)
+        parsed[prop.strip().lower()] = value.replace('!important', '').strip().lower()
+    return parsed
+
+
+def _check_declarations(declarations, source):
+    for prop, value in declarations.items():
+        if prop in DEFAULT_ONLY_CSS_VALUES:
+            if value.replace(' ', '') not in DEFAULT_ONLY_CSS_VALUES[prop]:
+                raise UnsupportedDocument(f"{prop}: {value} di {source}")
+            continue
+        if prop not in SUPPORTED_CSS_PROPERTIES:
+            raise UnsupportedDocument(f"properti CSS '{prop}' di {source}")
+        if prop == 'display' and value not in SUPPORTED_DISPLAY_VALUES:
+            raise UnsupportedDocument(f"display: {value} di {source}")
+
+
+def parse_stylesheet(css_text, source="stylesheet"):
+    """
+    Membaca stylesheet sederhana dan memeriksa apakah semua properti/at-rule didukung.
+
+    Args:
+        css_text (str): Isi stylesheet.
+        source (str): Nama sumber untuk pesan log.
+
+    Returns:
+        list: Tuple (selector, {properti: nilai}) untuk setiap aturan.
+
+    Raises:
+        UnsupportedDocument: Jika stylesheet memakai fitur yang tidak didukung.
+    """
+    css_text = CSS_COMMENT_PATTERN.sub('', css_text)
+    for at_rule in CSS_AT_RULE_PATTERN.findall(css_text):
+        if at_rule.lower() not in IGNORED_AT_RULES:
+            raise UnsupportedDocument(f"@{at_rule} di {source}")
+    # @page berisi deklarasi margin cetak yang tidak relevan untuk gambar layar
+    css_text = re.sub(r'@page[^{]*\{[^{}]*\}', '', css_text, flags=re.I)
+    css_text = re.sub(r'@(charset|namespace)[^;]*;', '', css_text, flags=re.I)
+    rules = []
+    for selectors, declarations in CSS_RULE_PATTERN.findall(css_text):
+        parsed = _parse_declarations(declarations)
+        _check_declarations(parsed, source)
+        for selector in selectors.split(','):
+            rules.append((selector.strip().lower(), parsed))
+    return rules
+
+
+def _selector_matches(selector, tag):
+    # Hanya selector sederhana yang dipakai untuk direction/text-align: "p", ".kelas", "p.kelas", "*".
+    # Selector kompleks (keturunan, pseudo-class, atribut) diabaikan; propertinya sudah dipastikan aman.
+    match = re.fullmatch(r'([a-z0-9]+|\*)?((?:\.[\w-]+)*)', selector)
+    if not match or not selector:
+        return False
+    name, classes = match.group(1), [c for c in match.group(2).split('.') if c]
+    if name and name != '*' and name != tag.name:
+        return False
+    tag_classes = [c.lower() for c in tag.get('class', [])]
+    return all(c in tag_classes for c in classes)
+
+
+def _computed_style(tag, rules, inherited):
+    # Gabungkan direction dan text-align dari induk, aturan stylesheet, atribut, dan style inline.
+    # display tidak diwariskan; elemen display:none sudah dilewati sebelum anaknya ditelusuri.
+    style = {k: v for k, v in inherited.items() if k != 'display'}
+    for selector, declarations in rules:
+        if _selector_matches(selector, tag):
+            style.update({k: v for k, v in declarations.items() if k in ('direction', 'text-align', 'display')})
+    if tag.get('dir') in ('rtl', 'ltr'):
+        style['direction'] = tag['dir']
+    if tag.get('align'):
+        style['text-align'] = tag['align'].lower()
+    if tag.name == 'center':
+        style['text-align'] = 'center'
+    inline = _parse_declarations(tag.get('style', ''))
+    style.update({k: v for k, v in inline.items() if k in ('direction', 'text-align', 'display')})
+    return style
+
+
+def _is_text_node(node):
+    from bs4 import NavigableString # Komentar, CDATA, dan deklarasi XML adalah subclass yang diabaikan
+    return type(node) is NavigableString
+
+
+def _inline_text(tag):
+    parts = []
+    for child in tag.children:
+        if _is_text_node(child):
+            parts.append(str(child))
+        elif getattr(child, 'name', None) == 'br':
+            parts.append(LINE_BREAK)
+        elif getattr(child, 'name', None) in INLINE_TAGS:
+            parts.append(_inline_text(child))
+    return ''.join(parts)
+
+
+def _block_alignment(style, direction):
+    text_align = style.get('text-align', 'start')
+    if text_align in ('center', 'justify'):
+        return 'center' if text_align == 'center' else 'start'
+    if text_align in ('left', 'right'):
+        # left/right adalah posisi fisik; ubah ke start/end sesuai arah teks
+        return 'start' if (text_align == 'left') == (direction == 'ltr') else 'end'
+    return 'end' if text_align == 'end' else 'start'
+
+
+def _collect_blocks(element, rules, inherited, blocks, indent=0, list_marker=None):
+    # Telusuri pohon elemen: teks inline dikumpulkan menjadi paragraf, elemen blok memulai blok baru
+    style = _computed_style(element, rules, inherited)
+    if style.get('display') == 'none':
+        return
+    font_size = int(BASE_FONT_SIZE * HEADING_SCALE.get(element.name, 1.0))
+    pending = [list_marker] if list_marker else []
+
+    def flush():
+        text = re.sub(r'[ \t\r\n\f]+', ' ', ''.join(pending))
+        lines = [line.strip() for line in text.split(LINE_BREAK)]
+        pending.clear()
+        if not any(lines):
+            return
+        joined = '\n'.join(lines)
+        direction = style.get('direction') or ('rtl' if ARABIC_PATTERN.search(joined) else 'ltr')
+        blocks.append(TextBlock(joined, font_size, direction, _block_alignment(style, direction), indent))
+
+    item_number = 0
+    for child in element.children:
+        name = getattr(child, 'name', None)
+        if _is_text_node(child):
+            pending.append(str(child))
+        elif name == 'br':
+            pending.append(LINE_BREAK)
+        elif name in INLINE_TAGS:
+            pending.append(_inline_text(child))
+        elif name == 'hr':
+            flush()
+            blocks.append(TextBlock('', BASE_FONT_SIZE, 'ltr', 'start', indent, is_rule=True))
+        elif name in BLOCK_TAGS:
+            flush()
+            child_indent = indent + (INDENT_STEP if name in ('blockquote', 'ul', 'ol') else 0)
+            marker = None
+            if name == 'li':
+                item_number += 1
+                marker = f"{item_number}. " if element.name == 'ol' else "\u2022 "
+            _collect_blocks(child, rules, style, blocks, child_indent, marker)
+    flush()
+
+
+@metrics.timed("text_renderer.analyze_document")
+def analyze_document(html_string, base_dir=None):
+    """
+    Memeriksa apakah satu dokumen HTML cukup sederhana untuk dirender dengan Pillow dan menyusun blok teksnya.
+
+    Args:
+        html_string (str): Dokumen HTML/XHTML dari ePub.
+        base_dir (str, optional): Folder aset ePub yang diekstrak, untuk membaca stylesheet yang ditautkan.
+
+    Returns:
+        list: TextBlock sesuai urutan dokumen.
+
+    Raises:
+        UnsupportedDocument: Jika dokumen memakai fitur yang harus dirender dengan Playwright.
+    """
+    from bs4 import BeautifulSoup # Diimpor lazy seperti modul lain yang mem-parsing HTML
+    soup = BeautifulSoup(html_string, 'html.parser')
+
+    for tag in soup.find_all(True):
+        if tag.name not in SUPPORTED_TAGS:
+            raise UnsupportedDocument(f"elemen <{tag.name}>")
+        if tag.get('style'):
+            _check_declarations(_parse_declarations(tag['style']), f"style inline <{tag.name}>")
+
+    rules = []
+    for style_tag in soup.find_all('style'):
+        rules.extend(parse_stylesheet(style_tag.get_text(), "<style>"))
+    for link in soup.find_all('link'):
+        rel = [r.lower() for r in link.get('rel', [])]
+        if 'stylesheet' not in rel:
+            continue
+        href = link.get('href', '')
+        css_path = os.path.normpath(os.path.join(base_dir, href)) if base_dir and href and '://' not in href else None
+        if not css_path or not os.path.isfile(css_path):
+            raise UnsupportedDocument(f"stylesheet '{href}' tidak dapat dibaca")
+        with open(css_path, encoding='utf-8', errors='replace') as f:
+            rules.extend(parse_stylesheet(f.read(), href))
+
+    root = soup.find('body') or soup
+    # Direction/text-align pada <html> ikut diwariskan ke body
+    inherited = _computed_style(soup.find('html'), rules, {}) if soup.find('html') else {}
+    blocks = []
+    _collect_blocks(root, rules, inherited, blocks)
+    return blocks
+
+
+def resolve_font_path(font_path=None):
+    """Mengembalikan font_path jika ada, jika tidak font fallback pertama yang tersedia, atau None."""
+    for candidate in [font_path] + FALLBACK_FONTS:
+        if candidate and os.path.exists(candidate):
+            return candidate
+    return None
+
+
+@functools.lru_cache(maxsize=64)
+def _load_font(font_path, size):
+    # Layout BASIC: teks sudah dibentuk (reshape) dan diurutkan (bidi) sebelum digambar,
+    # sehingga Pillow tidak boleh menerapkan bidi lagi meskipun libraqm terpasang
+    return ImageFont.truetype(font_path, size, layout_engine=ImageFont.Layout.BASIC)
+
+
+def _wrap_line(text, font, max_width, word_widths):
+    # Bungkus per kata berdasarkan lebar teks yang sudah dibentuk (urutan tidak mengubah lebar).
+    # Lebar setiap kata diukur sekali (word_widths di-cache per ukuran font) lalu dijumlahkan.
+    # Mengembalikan list (baris, perkiraan lebar baris).
+    space_width = font.getlength(' ')
+    lines = []
+    current = []
+    current_width = 0
+    for word in text.split(' '):
+        width = word_widths.get(word)
+        if width is None:
+            width = word_widths[word] = font.getlength(word)
+        if current and current_width + space_width + width > max_width:
+            lines.append((' '.join(current), current_width))
+            current, current_width = [word], width
+        else:
+            current_width += (space_width if current else 0) + width
+            current.append(word)
+    lines.append((' '.join(current), current_width))
+    return lines
+
+
+def layout_blocks(blocks, font_path, viewport):
+    """
+    Menghitung baris-baris yang akan digambar untuk setiap blok.
+
+    Args:
+        blocks (list): TextBlock dari analyze_document.
+        font_path (str): Font TrueType yang dipakai.
+        viewport (dict): Preset viewport {'width', 'height', 'scale'} dari image_renderer.get_render_preset.
+
+    Returns:
+        tuple: (list operasi gambar (jenis, y, data), (lebar, tinggi) halaman dalam piksel perangkat).
+    """
+    from arabic_reshaper import reshape # Diimpor lazy bersama bidi, seperti di image_renderer
+    from bidi.algorithm import get_display
+
+    scale = viewport["scale"]
+    width = int(viewport["width"] * scale)
+    margin = int(max(MIN_PAGE_MARGIN, viewport["width"] // PAGE_MARGIN_DIVISOR) * scale)
+    operations = []
+    word_widths = {} # ukuran font -> {kata: lebar}
+    y = margin
+    for block in blocks:
+        font_size = int(block.font_size * scale)
+        indent = int(block.indent * scale)
+        font = _load_font(font_path, font_size)
+        line_height = int(font_size * LINE_HEIGHT_FACTOR)
+        if block.is_rule:
+            operations.append(('rule', y + line_height // 2, (margin + indent, width - margin - indent, max(1, int(scale)))))
+            y += line_height
+            continue
+        max_width = width - 2 * margin - indent
+        for source_line in block.text.split('\n'):
+            shaped = reshape(source_line) if ARABIC_PATTERN.search(source_line) else source_line
+            for line, line_width in _wrap_line(shaped, font, max_width, word_widths.setdefault(font_size, {})):
+                display_line = get_display(line, base_dir='R' if block.direction == 'rtl' else 'L')
+                if block.align == 'center':
+                    x = margin + indent + (max_width - line_width) / 2
+                elif (block.align == 'start') == (block.direction == 'rtl'):
+                    # Rata kanan: awal baris teks RTL, atau text-align end pada teks LTR
+                    x = width - margin - indent - line_width
+                else:
+                    x = margin + indent
+                operations.append(('text', y, (x, display_line, font)))
+                y += line_height
+        y += int(font_size * 0.6) # Jarak antar paragraf
+    return operations, (width, max(int(viewport["height"] * scale), y + margin))
+
+
+@metrics.timed("text_renderer.render_blocks")
+def render_blocks(blocks, output_path, font_path, viewport):
+    """Menggambar blok teks ke file PNG dengan ukuran sesuai preset viewport dan mengembalikan path-nya."""
+    operations, size = layout_blocks(blocks, font_path, viewport)
+    image = Image.new('L', size, BACKGROUND_COLOR)
+    draw = ImageDraw.Draw(image)
+    for kind, y, data in operations:
+        if kind == 'rule':
+            x_start, x_end, line_width = data
+            draw.line([(x_start, y), (x_end, y)], fill=RULE_COLOR, width=line_width)
+        else:
+            x, text, font = data
+            draw.text((x, y), text, font=font, fill=TEXT_COLOR)
+    image.save(output_path)
+    return output_path
+
+
+@metrics.timed("text_renderer.render_html_to_images")
+def render_html_to_images(html_contents, output_dir, epub_filename_prefix="epub", base_url=None, on_page_rendered=None, fallback=None, font_path=None, page_numbers=None, preset=None):
+    """
+    Merender halaman ePub dengan Pillow jika halaman cukup sederhana, dan meneruskan sisanya ke Playwright.
+
+    Signature dan nama file output sama dengan image_renderer.render_html_to_images, sehingga fungsi
+    ini dapat dipakai sebagai renderer di conversion.convert_epub. Chromium hanya diluncurkan jika ada
+    halaman yang benar-benar membutuhkannya.
+
+    Args:
+        html_contents (list): List string HTML yang akan dirender.
+        output_dir (str): Direktori tempat gambar akan disimpan.
+        epub_filename_prefix (str): Prefix untuk nama file gambar yang dihasilkan.
+        base_url (str): Base URL folder aset ePub (file:///...), untuk membaca stylesheet yang ditautkan.
+        on_page_rendered (callable, optional): Dipanggil sebagai on_page_rendered(page_number, image_path).
+        fallback (callable, optional): Renderer Playwright untuk halaman yang tidak didukung
+                        (default image_renderer.render_html_to_images), dipanggil dengan page_numbers.
+        font_path (str, optional): Font TrueType yang mendukung aksara Arab.
+        page_numbers (list, optional): Nomor halaman untuk setiap string HTML (default 1..n).
+        preset (str, optional): Nama preset viewport (image_renderer.RENDER_PRESETS), juga diteruskan ke fallback.
+
+    Returns:
+        list: Path lengkap gambar yang dihasilkan, urut sesuai nomor halaman.
+    """
+    if fallback is None:
+        import image_renderer
+        fallback = image_renderer.render_html_to_images
+    os.makedirs(output_dir, exist_ok=True)
+    viewport = get_render_preset(preset)
+
+    resolved_font = resolve_font_path(font_path)
+    if resolved_font is None:
+        logging.warning("Tidak ada font yang mendukung teks Arab untuk renderer Pillow. Semua halaman dirender dengan Playwright.")
+        return fallback(html_contents, output_dir, epub_filename_prefix, base_url=base_url, on_page_rendered=on_page_rendered,
+                        page_numbers=page_numbers, preset=preset)
+
+    base_dir = base_url.replace('file:///', '').replace('/', os.sep) if base_url else None
+    clean_prefix = clean_filename(epub_filename_prefix)
+    rendered = {} # nomor halaman -> path gambar
+    fallback_pages = [] # (nomor halaman, html) untuk Playwright
+
+    for i, html_string in enumerate(html_contents):
+        page_number = page_numbers[i] if page_numbers else i + 1
+        try:
+            blocks = analyze_document(html_string, base_dir)
+        except UnsupportedDocument as e:
+            logging.info(f"Halaman {page_number} dirender dengan Playwright: {e}.")
+            fallback_pages.append((page_number, html_string))
+            continue
+        output_image_path = os.path.join(output_dir, f"{clean_prefix}_page_{page_number}.png")
+        try:
+            with metrics.span("text_renderer.pillow_page"):
+                render_blocks(blocks, output_image_path, resolved_font, viewport)
+        except Exception as e:
+            logging.warning(f"Gagal merender halaman {page_number} dengan Pillow ({e}); dialihkan ke Playwright.")
+            fallback_pages.append((page_number, html_string))
+            continue
+        rendered[page_number] = output_image_path
+        if on_page_rendered:
+            on_page_rendered(page_number, output_image_path)
+
+    logging.info(f"{len(rendered)} halaman dirender dengan Pillow, {len(fallback_pages)} halaman diteruskan ke Playwright.")
+    if fallback_pages:
+        def record_fallback_page(page_number, image_path):
+            rendered[page_number] = image_path
+            if on_page_rendered:
+                on_page_rendered(page_number, image_path)
+
+        fallback(
+            [html for _, html in fallback_pages],
+            output_dir,
+            epub_filename_prefix,
+            base_url=base_url,
+            on_page_rendered=record_fallback_page,
+            page_numbers=[page_number for page_number, _ in fallback_pages],
+            preset=preset
+        )
+    return [rendered[page_number] for page_number in sorted(rendered)]
@@ -0,0 +1,88 @@
+# upload_spool.py
+# Modul ini membuat unggahan file ditulis langsung (per chunk) ke file spool unik di folder
+# unggahan saat request multipart di-parse, sambil menghitung hash kontennya. File yang diunggah
+# hanya ditulis satu kali: tidak ada salinan temp Werkzeug lalu file.save() kedua.
+
+import os # Untuk operasi path dan rename
+import hashlib # Untuk menghitung hash konten secara inkremental
+import logging # Untuk mencatat informasi, peringatan, dan error
+import tempfile # Untuk membuat file spool dengan nama unik
+
+from flask import Request, current_app
+import log_setup # Logging terpusat non-blocking (antrean + JSON dengan ID pekerjaan)
+
+log_setup.configure_logging()
+
+
+class SpoolFile:
+    """
+    File spool yang menghitung SHA-256 dan ukuran konten selama ditulis.
+
+    Parser multipart Werkzeug menulis isi file ke objek ini per chunk, lalu memakai
+    objek yang sama sebagai `FileStorage.stream`. Metode file lain (read, seek, tell,
+    flush, close) diteruskan ke file di disk.
+    """
+
+    def __init__(self, directory):
+        fd, self.path = tempfile.mkstemp(dir=directory, prefix="spool_", suffix=".part")
+        self._file = os.fdopen(fd, "w+b")
+        self._digest = hashlib.sha256()
+        self.size = 0
+        self.claimed = False
+
+    def write(self, data):
+        self._digest.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+
+    def hexdigest(self):
+        """Mengembalikan hash SHA-256 dari semua byte yang sudah ditulis."""
+        return self._digest.hexdigest()
+
+    def claim(self, target_path):
+        """
+        Memindahkan file spool ke path tujuan (rename di folder yang sama, tanpa menyalin isi)
+        dan menandainya agar tidak dihapus saat request selesai.
+
+        Returns:
+            str: Path tujuan.
+        """
+        self._file.close()
+        os.replace(self.path, target_path)
+        self.path = target_path
+        self.claimed = True
+        return target_path
+
+    def discard(self):
+        """Menutup dan menghapus file spool yang tidak dipakai."""
+        self._file.close()
+        if not self.claimed and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+
+class SpoolingRequest(Request):
+    """
+    Request Flask yang men-spool file unggahan langsung ke UPLOAD_FOLDER.
+
+    Batas MAX_CONTENT_LENGTH diperiksa Werkzeug dari header Content-Length sebelum body dibaca
+    (dan saat membaca body jika header tidak ada), sehingga unggahan yang terlalu besar langsung
+    ditolak dengan 413. File spool yang tidak diklaim oleh rute dihapus saat request ditutup.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        spool = SpoolFile(current_app.config['UPLOAD_FOLDER'])
+        if not hasattr(self, "_spool_files"):
+            self._spool_files = []
+        self._spool_files.append(spool)
+        return spool
+
+    def close(self):
+        super().close()
+        for spool in getattr(self, "_spool_files", []):
+            try:
+                spool.discard()
+            except OSError as e:
+                logging.warning(f"Gagal menghapus file spool '{spool.path}': {e}")
@@ -0,0 +1,244 @@
+# workspace.py
+# Modul ini mengelola ruang kerja per pekerjaan konversi: folder scratch privat (sebisa mungkin
+# di tmpfs) untuk aset ePub yang diekstrak, dan folder output unik di generated_images.
+# Modul ini juga mencatat pemakaian disk folder output dan menjalankan penghapusan (eviction)
+# latar belakang berdasarkan TTL dan LRU agar total ukurannya tidak melebihi kuota.
+
+import os # Untuk operasi path dan stat file
+import time # Untuk TTL dan waktu akses terakhir
+import shutil # Untuk menghapus direktori dan memeriksa ruang kosong
+import logging # Untuk mencatat informasi, peringatan, dan error
+import threading # Untuk worker eviction latar belakang
+import log_setup # Logging terpusat non-blocking (antrean + JSON dengan ID pekerjaan)
+from job_queue import pid_is_alive # Pengecekan PID pemilik penanda ruang kerja
+
+log_setup.configure_logging()
+
+# Lokasi tmpfs yang umum di Linux; dipakai untuk scratch jika tersedia dan cukup ruang
+DEFAULT_TMPFS_DIR = "/dev/shm"
+# Ruang kosong minimum di tmpfs agar dipakai sebagai lokasi scratch
+MIN_TMPFS_FREE_BYTES = 256 * 1024 * 1024
+# Interval minimum (detik) untuk memperbarui mtime folder output saat gambar diakses
+TOUCH_INTERVAL_SECONDS = 60
+# File penanda di folder output selama pekerjaan berjalan (berisi PID pemiliknya), agar sweep di proses lain
+# (misalnya worker gunicorn lain) tidak menghapus folder yang sedang ditulis
+IN_USE_MARKER = ".in_use"
+
+
+def _dir_size(path):
+    # Total ukuran semua file di dalam direktori (rekursif)
+    total = 0
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    total += _dir_size(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    total += entry.stat(follow_symlinks=False).st_size
+    except FileNotFoundError:
+        pass
+    return total
+
+
+def _in_use_by_live_process(output_dir):
+    """Mengembalikan True jika folder output memiliki penanda IN_USE_MARKER milik proses yang masih berjalan."""
+    try:
+        with open(os.path.join(output_dir, IN_USE_MARKER)) as f:
+            pid = int(f.read().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return False
+    # Penanda dari proses yang sudah mati (misalnya crash) diabaikan agar foldernya tetap bisa dihapus
+    return pid > 0 and pid_is_alive(pid)
+
+
+def default_scratch_root(fallback_dir):
+    """
+    Memilih lokasi scratch: tmpfs (/dev/shm) jika tersedia, dapat ditulis, dan cukup ruang;
+    jika tidak, `fallback_dir` di disk.
+    """
+    try:
+        if os.path.isdir(DEFAULT_TMPFS_DIR) and os.access(DEFAULT_TMPFS_DIR, os.W_OK) \
+                and shutil.disk_usage(DEFAULT_TMPFS_DIR).free >= MIN_TMPFS_FREE_BYTES:
+            return os.path.join(DEFAULT_TMPFS_DIR, "epub2image")
+    except OSError:
+        pass
+    return fallback_dir
+
+
+class Workspace:
+    """Ruang kerja satu pekerjaan: folder scratch privat dan folder output."""
+
+    def __init__(self, name, scratch_dir, output_dir):
+        self.name = name
+        self.scratch_dir = scratch_dir
+        self.output_dir = output_dir
+
+    def create(self):
+        """Membuat folder scratch (hanya dapat diakses pemilik proses) dan folder output bertanda sedang dipakai."""
+        os.makedirs(self.scratch_dir, mode=0o700, exist_ok=True)
+        os.makedirs(self.output_dir, exist_ok=True)
+        with open(os.path.join(self.output_dir, IN_USE_MARKER), "w") as f:
+            f.write(str(os.getpid()))
+
+    def release_marker(self):
+        """Menghapus penanda sedang dipakai dari folder output."""
+        try:
+            os.remove(os.path.join(self.output_dir, IN_USE_MARKER))
+        except FileNotFoundError:
+            pass
+
+    def release_scratch(self):
+        """Menghapus folder scratch setelah pekerjaan selesai."""
+        if os.path.exists(self.scratch_dir):
+            shutil.rmtree(self.scratch_dir, ignore_errors=True)
+            logging.info(f"Folder scratch '{self.scratch_dir}' dihapus.")
+
+
+class WorkspaceManager:
+    """
+    Membuat ruang kerja unik per pekerjaan dan menjaga ukuran folder output.
+
+    Folder output yang lebih tua dari TTL dihapus lebih dulu; jika total ukuran masih
+    melebihi kuota, folder dengan akses terakhir paling lama (LRU) dihapus hingga di bawah kuota.
+    Folder milik pekerjaan yang sedang berjalan tidak pernah dihapus, termasuk pekerjaan di proses lain
+    yang berbagi output_root (ditandai dengan file IN_USE_MARKER di folder output).
+    """
+
+    def __init__(self, output_root, scratch_root, quota_bytes=0, ttl_seconds=0, sweep_interval=300):
+        """
+        Args:
+            output_root (str): Folder induk output (GENERATED_IMAGES_FOLDER).
+            scratch_root (str): Folder induk scratch (lihat default_scratch_root).
+            quota_bytes (int): Batas total ukuran folder output. 0 berarti tanpa batas.
+            ttl_seconds (int): Umur maksimum folder output sejak akses terakhir. 0 berarti tanpa batas.
+            sweep_interval (float): Interval (detik) pemeriksaan eviction latar belakang.
+        """
+        self.output_root = output_root
+        self.scratch_root = scratch_root
+        self.quota_bytes = quota_bytes
+        self.ttl_seconds = ttl_seconds
+        self.sweep_interval = sweep_interval
+        self._lock = threading.Lock()
+        self._active = set() # Nama ruang kerja yang sedang dipakai pekerjaan
+        self._sizes = {} # Nama folder output -> ukuran (byte) terakhir yang diketahui
+        self._last_touch = {} # Nama folder output -> waktu akses terakhir yang tercatat di memori
+        self._thread = None
+        os.makedirs(self.output_root, exist_ok=True)
+        os.makedirs(self.scratch_root, mode=0o700, exist_ok=True)
+
+    def allocate(self, name):
+        """
+        Menyiapkan ruang kerja untuk satu pekerjaan dan menandainya aktif.
+
+        Args:
+            name (str): Nama unik pekerjaan (juga nama subfolder output).
+
+        Returns:
+            Workspace: Ruang kerja yang folder-foldernya dibuat dengan Workspace.create().
+        """
+        with self._lock:
+            self._active.add(name)
+        return Workspace(name, os.path.join(self.scratch_root, name), os.path.join(self.output_root, name))
+
+    def finish(self, workspace, keep_output=True):
+        """
+        Menutup ruang kerja: menghapus scratch, lalu mencatat ukuran output atau menghapusnya.
+
+        Args:
+            workspace (Workspace): Ruang kerja dari allocate().
+            keep_output (bool): False untuk menghapus output (misalnya jika pekerjaan gagal).
+        """
+        workspace.release_scratch()
+        workspace.release_marker()
+        if not keep_output and os.path.exists(workspace.output_dir):
+            shutil.rmtree(workspace.output_dir, ignore_errors=True)
+        with self._lock:
+            self._active.discard(workspace.name)
+            if keep_output and os.path.isdir(workspace.output_dir):
+                self._sizes[workspace.name] = _dir_size(workspace.output_dir)
+                self._last_touch[workspace.name] = time.time()
+            else:
+                self._sizes.pop(workspace.name, None)
+
+    def touch(self, name):
+        """Mencatat akses ke folder output (untuk LRU). mtime folder diperbarui paling sering sekali per menit."""
+        now = time.time()
+        with self._lock:
+            previous = self._last_touch.get(name, 0)
+            self._last_touch[name] = now
+        if now - previous >= TOUCH_INTERVAL_SECONDS:
+            try:
+                os.utime(os.path.join(self.output_root, name))
+            except OSError:
+                pass
+
+    def usage(self):
+        """Mengembalikan {'total_bytes', 'num_outputs', 'quota_bytes'} berdasarkan ukuran terakhir yang diketahui."""
+        with self._lock:
+            return {
+                "total_bytes": sum(self._sizes.values()),
+                "num_outputs": len(self._sizes),
+                "quota_bytes": self.quota_bytes,
+            }
+
+    def sweep(self):
+        """
+        Menghitung ulang pemakaian disk dan menghapus folder output berdasarkan TTL lalu LRU.
+
+        Returns:
+            list: Nama folder output yang dihapus.
+        """
+        entries = []
+        with os.scandir(self.output_root) as dir_entries:
+            for entry in dir_entries:
+                if not entry.is_dir(follow_symlinks=False):
+                    continue
+                try:
+                    mtime = entry.stat(follow_symlinks=False).st_mtime
+                except FileNotFoundError:
+                    continue
+                with self._lock:
+                    last_access = max(mtime, self._last_touch.get(entry.name, 0))
+                entries.append([entry.name, _dir_size(entry.path), last_access])
+
+        with self._lock:
+            active = set(self._active)
+            self._sizes = {name: size for name, size, _ in entries}
+
+        now = time.time()
+        total = sum(size for _, size, _ in entries)
+        evicted = []
+        # Urutkan dari akses terakhir paling lama (kandidat LRU pertama)
+        for name, size, last_access in sorted(entries, key=lambda e: e[2]):
+            if name in active or _in_use_by_live_process(os.path.join(self.output_root, name)):
+                continue
+            expired = self.ttl_seconds and now - last_access > self.ttl_seconds
+            over_quota = self.quota_bytes and total > self.quota_bytes
+            if not expired and not over_quota:
+                continue
+            shutil.rmtree(os.path.join(self.output_root, name), ignore_errors=True)
+            total -= size
+            evicted.append(name)
+            logging.info(f"Folder output '{name}' dihapus ({'TTL' if expired else 'kuota'}, {size} byte).")
+
+        with self._lock:
+            for name in evicted:
+                self._sizes.pop(name, None)
+                self._last_touch.pop(name, None)
+        return evicted
+
+    def start(self):
+        """Menjalankan worker eviction latar belakang (hanya sekali per proses)."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="workspace-evictor", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.sweep()
+            except Exception as e:
+                logging.error(f"Gagal menjalankan eviction folder output: {e}", exc_info=True)
+            time.sleep(self.sweep_interval)